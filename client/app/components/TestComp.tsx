@@ -8,6 +8,9 @@ import dynamic from 'next/dynamic';
 
 import { debounce } from 'lodash';
 
+import { fetchPackedGeometry } from '../lib/packedGeometry';
+import type { Viewport } from './VesselMap';
+
 // Use dynamic import for ShipMap to disable SSR
 const VesselMap = dynamic(() => import('./VesselMap'), { ssr: false });
 
@@ -22,6 +25,8 @@ const TestComp = () => {
     const [calculationResult, setCalculationResult] = useState<number[]>([0, 0, 0, 0, 0]);
     const [geojsonData, setGeojsonData] = useState<any>(null);
     const [isResultUpdated, setIsResultUpdated] = useState(false);
+    const [viewport, setViewport] = useState<Viewport | null>(null);
+    const [showingVessels, setShowingVessels] = useState(false);
 
     // Ref to prevent initial fetch on mount
     const initialRender = useRef(true);
@@ -82,18 +87,19 @@ const TestComp = () => {
         const utcDateTime = new Date(dateTime.getTime() - (dateTime.getTimezoneOffset() * 60000)).toISOString();
 
         try {
-            const response = await axios.get('http://127.0.0.1:8080/load_geojson_data_selected', { 
-                params: { 
-                    shipType, 
-                    datetime: utcDateTime 
-                } 
+            // Only the vessels in view are sent, clustered when zoomed out
+            const data = await fetchPackedGeometry('get', 'http://127.0.0.1:8080/load_geojson_data_selected', undefined, { 
+                shipType, 
+                datetime: utcDateTime,
+                ...(viewport ? { bbox: viewport.bbox, zoom: viewport.zoom } : {}),
             });
             console.log("fetching GeoJSON data");
             
-            if (response.data) {
-                setGeojsonData(response.data);  // Set the fetched GeoJSON data to state
+            if (data) {
+                setGeojsonData(data);  // Set the fetched GeoJSON data to state
+                setShowingVessels(true);
                 console.log("GeoJSON data set:");
-                console.log(response.data);
+                console.log(data);
             } else {
                 console.log("No data received from backend.");
             }
@@ -102,6 +108,13 @@ const TestComp = () => {
         }
     };
 
+    // Panning or zooming reloads the displayed vessels for the new view
+    useEffect(() => {
+        if (showingVessels) {
+            handleDisplay();
+        }
+    }, [viewport]);
+
     const handleCheckShipDomain = async () => {
         if (!dateTime) {
             console.error("No datetime selected.");
@@ -112,16 +125,18 @@ const TestComp = () => {
         const utcDateTime = new Date(dateTime.getTime() - (dateTime.getTimezoneOffset() * 60000)).toISOString();
         
         try {
-            const response = await axios.post('http://127.0.0.1:8080/os_domain', {
+            const data = await fetchPackedGeometry('post', 'http://127.0.0.1:8080/os_domain', {
                 shipType,
                 shipId,
                 datetime: utcDateTime,
                 timeLength,
+                zoom: viewport?.zoom,
             });
-            console.log("OS Calculation result:", response.data);
+            console.log("OS Calculation result:", data);
 
-            if (response.data) {
-                setGeojsonData(response.data);
+            if (data) {
+                setGeojsonData(data);
+                setShowingVessels(false);
             } else {
                 console.log("No data received from backend.");
             }
@@ -141,43 +156,32 @@ const TestComp = () => {
         const utcDateTime = new Date(dateTime.getTime() - (dateTime.getTimezoneOffset() * 60000)).toISOString();
 
         try {
-            const response = await axios.post('http://127.0.0.1:8080/computation', {
+            // CRI, TCR, TCPA, areas and both regions come from a single computation
+            const response = await axios.post('http://127.0.0.1:8080/risk_assessment', {
                 shipType,
                 shipId,
                 selectedTsIds,
                 datetime: utcDateTime,
                 timeLength,
+                zoom: viewport?.zoom,
             });
             console.log("Computation result:", response.data);
             
             if (response.data) {
-                setCalculationResult(response.data);  // Set the fetched GeoJSON data to state
+                const risk = response.data;
+                setCalculationResult([risk.vo_area, risk.v_area, risk.cri, risk.tcr, risk.tcpa, risk.dcpa]);
                 console.log("Calculation Result set:");
-                console.log(response.data);
+                console.log(risk);
                 setIsResultUpdated(true); // Set flag to true when result is updated
 
-                // Fetch GeoJSON data for VO and V regions
-                const voResponse = await axios.post('http://127.0.0.1:8080/computation_vo', {
-                    shipType,
-                    selectedTsIds,
-                    datetime: utcDateTime,
-                    timeLength,
-                });
-
-                const vResponse = await axios.post('http://127.0.0.1:8080/computation_v', {
-                    shipType,
-                    shipId,
-                    datetime: utcDateTime,
-                    timeLength,
-                });
-
-                console.log("VO Region Data:", voResponse.data);
-                console.log("V Region Data:", vResponse.data);
+                console.log("VO Region Data:", risk.vo);
+                console.log("V Region Data:", risk.v);
                 
                 setGeojsonData({
-                    vo: voResponse.data,
-                    v: vResponse.data,
+                    vo: risk.vo,
+                    v: risk.v,
                 });
+                setShowingVessels(false);
                 console.log("VO & V region data set")
 
             } else {
@@ -302,6 +306,7 @@ const TestComp = () => {
                     geojsonData={geojsonData}
                     tileLayerUrl={currentTileLayer.url}
                     tileLayerAttribution={currentTileLayer.attribution}
+                    onViewportChange={setViewport}
                 />
             </div>
 
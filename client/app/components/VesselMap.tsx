@@ -5,6 +5,7 @@ import { MapContainer } from 'react-leaflet/MapContainer'
 import { useMap, useMapEvents, useMapEvent } from 'react-leaflet/hooks'
 import { GeoJSON } from 'react-leaflet/GeoJSON'
 import { Marker } from 'react-leaflet/Marker'
+import { CircleMarker } from 'react-leaflet/CircleMarker'
 import { Popup } from 'react-leaflet/Popup'
 import { Tooltip } from 'react-leaflet/Tooltip'
 import { TileLayer } from 'react-leaflet/TileLayer'
@@ -34,6 +35,8 @@ interface GeoJSONFeature {
       port_name?: string;
       angle?: number;
       MODE?: string;
+      cluster?: boolean;
+      count?: number;
   };
   geometry: {
       type: string;
@@ -48,12 +51,39 @@ interface GeoJSONData {
   v?: GeoJsonObject;
 }
 
+// Visible area as the server's bbox parameter (minLon,minLat,maxLon,maxLat) and the map zoom
+export interface Viewport {
+  bbox: string;
+  zoom: number;
+}
+
 interface VesselMapProps {
   geojsonData: GeoJSONData | null;
   tileLayerUrl: string;
   tileLayerAttribution: string;
+  onViewportChange?: (viewport: Viewport) => void;
 }
 
+const ViewportWatcher: React.FC<{ onViewportChange: (viewport: Viewport) => void }> = ({ onViewportChange }) => {
+  const report = (map: L.Map) => {
+    const bounds = map.getBounds();
+    onViewportChange({
+      bbox: [bounds.getWest(), bounds.getSouth(), bounds.getEast(), bounds.getNorth()].map((value) => value.toFixed(5)).join(','),
+      zoom: map.getZoom(),
+    });
+  };
+
+  const map = useMapEvents({
+    moveend: () => report(map),
+  });
+
+  useEffect(() => {
+    report(map);
+  }, []);
+
+  return null;
+};
+
 // Fix the default icon issue with React Leaflet
 delete (L.Icon.Default.prototype as any)._getIconUrl;
 
@@ -70,7 +100,7 @@ const vesselIcon = L.icon({
   popupAnchor: [0, -5] // Point from which the popup should open relative to the iconAnchor
 });
 
-const VesselMap: React.FC<VesselMapProps> = ({ geojsonData, tileLayerUrl, tileLayerAttribution }) => {
+const VesselMap: React.FC<VesselMapProps> = ({ geojsonData, tileLayerUrl, tileLayerAttribution, onViewportChange }) => {
 
   useEffect(() => {
       console.log("GeoJSON Data Updated:", geojsonData);
@@ -114,8 +144,23 @@ const VesselMap: React.FC<VesselMapProps> = ({ geojsonData, tileLayerUrl, tileLa
               attribution={tileLayerAttribution}
           />
 
+          {onViewportChange && <ViewportWatcher onViewportChange={onViewportChange} />}
+
           {geojsonData && geojsonData.features && geojsonData.features.map((feature, idx) => (
-              feature.geometry.type === 'Point' ? (
+              feature.properties.cluster ? (
+                // Grid cluster of vessels at low zoom
+                <CircleMarker
+                  key={idx}
+                  center={[
+                      feature.geometry.coordinates[1] as number,
+                      feature.geometry.coordinates[0] as number
+                  ]}
+                  radius={10 + Math.min(20, Math.log2(feature.properties.count || 1) * 3)}
+                  pathOptions={{ color: '#1d4ed8', fillOpacity: 0.5 }}
+                >
+                  <Tooltip permanent direction="center">{feature.properties.count}</Tooltip>
+                </CircleMarker>
+              ) : feature.geometry.type === 'Point' ? (
                 <Marker
                   key={idx}
                   position={[
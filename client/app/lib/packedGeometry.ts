@@ -0,0 +1,132 @@
+import axios from 'axios';
+
+// Decoder for the server's packed geometry encoding (server/binary_geometry.py).
+// Layout: 'FPG1' | uint32 header length | JSON header | typed arrays, each at
+// an 8-byte aligned offset listed in the header.
+
+export const PACKED_MIME_TYPE = 'application/vnd.furious.geometry';
+
+interface ArraySpec {
+  dtype: string;
+  offset: number;
+  length: number;
+}
+
+interface PropertySpec {
+  kind: 'boolean' | 'integer' | 'number' | 'string' | 'json';
+  dictionary?: string[];
+}
+
+interface PackedHeader {
+  root: 'Feature' | 'FeatureCollection';
+  count: number;
+  origin: [number, number];
+  geometry_types: string[];
+  properties: Record<string, PropertySpec>;
+  arrays: Record<string, ArraySpec>;
+}
+
+type TypedArray = Uint8Array | Uint32Array | Int32Array | Float32Array | Float64Array;
+
+const MISSING_BOOLEAN = 255;
+
+const ARRAY_TYPES: Record<string, new (buffer: ArrayBuffer, byteOffset: number, length: number) => TypedArray> = {
+  '|u1': Uint8Array,
+  '<u4': Uint32Array,
+  '<i4': Int32Array,
+  '<f4': Float32Array,
+  '<f8': Float64Array,
+};
+
+export function decodePackedGeometry(buffer: ArrayBuffer): any {
+  const view = new DataView(buffer);
+  const magic = String.fromCharCode(...new Uint8Array(buffer, 0, 4));
+  if (magic !== 'FPG1') {
+    throw new Error('Not a packed geometry payload');
+  }
+  const headerLength = view.getUint32(4, true);
+  const header: PackedHeader = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 8, headerLength)));
+  const bodyOffset = 8 + headerLength;
+
+  const array = (name: string): TypedArray => {
+    const spec = header.arrays[name];
+    const ArrayType = ARRAY_TYPES[spec.dtype];
+    return new ArrayType(buffer, bodyOffset + spec.offset, spec.length);
+  };
+
+  const geometryType = array('geometry_type');
+  const geometryOffsets = array('geometry_offsets');
+  const partOffsets = array('part_offsets');
+  const ringOffsets = array('ring_offsets');
+  const coords = array('coords');
+  const [lon0, lat0] = header.origin;
+  const columns = Object.entries(header.properties).map(([key, spec]) => [key, spec, array(`property:${key}`)] as const);
+
+  const ring = (r: number): number[][] => {
+    const points: number[][] = [];
+    for (let c = ringOffsets[r]; c < ringOffsets[r + 1]; c++) {
+      points.push([lon0 + coords[2 * c], lat0 + coords[2 * c + 1]]);
+    }
+    return points;
+  };
+
+  const part = (p: number): number[][][] => {
+    const rings: number[][][] = [];
+    for (let r = partOffsets[p]; r < partOffsets[p + 1]; r++) {
+      rings.push(ring(r));
+    }
+    return rings;
+  };
+
+  const features = [];
+  for (let i = 0; i < header.count; i++) {
+    const parts: number[][][][] = [];
+    for (let p = geometryOffsets[i]; p < geometryOffsets[i + 1]; p++) {
+      parts.push(part(p));
+    }
+
+    const type = header.geometry_types[geometryType[i]];
+    let coordinates: any;
+    switch (type) {
+      case 'Point': coordinates = parts[0][0][0]; break;
+      case 'LineString': coordinates = parts[0][0]; break;
+      case 'Polygon': coordinates = parts[0]; break;
+      case 'MultiPoint': coordinates = parts.map((points) => points[0][0]); break;
+      case 'MultiLineString': coordinates = parts.map((lines) => lines[0]); break;
+      default: coordinates = parts;
+    }
+
+    // Missing and null properties are both left out
+    const properties: Record<string, any> = {};
+    for (const [key, spec, values] of columns) {
+      const value = values[i];
+      if (spec.kind === 'boolean') {
+        if (value !== MISSING_BOOLEAN) properties[key] = value === 1;
+      } else if (spec.kind === 'string') {
+        if (value >= 0) properties[key] = spec.dictionary![value];
+      } else if (spec.kind === 'json') {
+        // Mixed columns keep each value's type: entries are JSON text
+        if (value >= 0) properties[key] = JSON.parse(spec.dictionary![value]);
+      } else if (!Number.isNaN(value)) {
+        properties[key] = value;
+      }
+    }
+
+    features.push({ type: 'Feature', geometry: { type, coordinates }, properties });
+  }
+
+  return header.root === 'Feature' ? features[0] : { type: 'FeatureCollection', features };
+}
+
+// Request packed geometry from an endpoint and decode it to GeoJSON
+export async function fetchPackedGeometry(method: 'get' | 'post', url: string, data?: any, params?: any): Promise<any> {
+  const response = await axios.request({
+    method,
+    url,
+    data,
+    params,
+    responseType: 'arraybuffer',
+    headers: { Accept: PACKED_MIME_TYPE },
+  });
+  return decodePackedGeometry(response.data);
+}
@@ -0,0 +1,533 @@
+import os
+import json
+import hashlib
+import logging
+import shutil
+import threading
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from metrics import stage
+
+log = logging.getLogger(__name__)
+
+DATA_DIR = './testdata'
+
+BINARY_SUFFIX = '.aisb'
+BINARY_FORMAT_VERSION = 1
+
+CORE_PROPERTIES = ('SHIP_ID', 'RECPTN_DT', 'SOG', 'COG', 'LEN_PRED')
+COLUMNS = ('ship_code', 'timestamp', 'lon', 'lat', 'sog', 'cog', 'len_pred', 'ship_offsets')
+TIME_INDEX_COLUMNS = ('time_order', 'time_keys', 'time_offsets')
+# Columns save(float32=True) may narrow; coordinates always stay float64
+FLOAT32_COLUMNS = ('sog', 'cog', 'len_pred')
+MAX_FLOAT32_DECIMALS = 6
+
+
+def to_epoch(recptn_dt_str):
+    if isinstance(recptn_dt_str, (int, np.integer)):
+        return int(recptn_dt_str)
+    if isinstance(recptn_dt_str, datetime):
+        recptn_dt = recptn_dt_str
+    else:
+        if recptn_dt_str.endswith('Z'):
+            recptn_dt_str = recptn_dt_str[:-1]
+        try:
+            recptn_dt = datetime.fromisoformat(recptn_dt_str)
+        except ValueError as e:
+            raise ValueError(f"Invalid datetime format: {e}")
+    if recptn_dt.tzinfo is not None:
+        recptn_dt = recptn_dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return int(np.datetime64(recptn_dt.replace(microsecond=0), 's').astype(np.int64))
+
+
+def canonical_datetime(recptn_dt_str):
+    return str(format_epoch(to_epoch(recptn_dt_str)))
+
+
+def from_epoch(ts):
+    return datetime(1970, 1, 1) + timedelta(seconds=int(ts))
+
+
+def format_epoch(ts):
+    return np.datetime_as_string(np.asarray(ts, dtype=np.int64).astype('datetime64[s]'), unit='s')
+
+
+def float32_decimals(values):
+    """Fewest decimals that round the float32 copy of values back to the same float32, or None beyond MAX_FLOAT32_DECIMALS.
+
+    Rounding to these on the way out serves e.g. SOG 10.56 stored as float32
+    as 10.56 and not 10.5600004196167.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    narrowed = values.astype(np.float32)
+    for decimals in range(MAX_FLOAT32_DECIMALS + 1):
+        if np.array_equal(np.round(values, decimals).astype(np.float32), narrowed, equal_nan=True):
+            return decimals
+    return None
+
+
+class EncodedColumn:
+    """Dictionary-encoded column: integer codes into a small table of values."""
+
+    def __init__(self, codes, table):
+        self.codes = codes
+        self.table = table
+
+    @classmethod
+    def encode(cls, values):
+        lookup = {}
+        codes = np.fromiter((lookup.setdefault(value, len(lookup)) for value in values), dtype=np.int32, count=len(values))
+        table = np.empty(len(lookup), dtype=object)
+        table[:] = list(lookup)
+        return cls(codes, table)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            return self.table[self.codes[index]]
+        return EncodedColumn(self.codes[index], self.table)
+
+    def values(self):
+        return self.table[self.codes]
+
+
+def _column(values):
+    if all(isinstance(v, (int, np.integer)) and not isinstance(v, bool) for v in values):
+        return np.asarray(values, dtype=np.int64)
+    if all(isinstance(v, (int, float, np.number)) and not isinstance(v, bool) for v in values):
+        return np.asarray(values, dtype=np.float64)
+    return EncodedColumn.encode(values)
+
+
+class AISDataset:
+    """Columnar view of one resampled AIS file, rows sorted by (ship, timestamp).
+
+    Snapshots use a separate time-bucket index: ``time_order`` lists the rows
+    sorted by (timestamp, ship) and ``time_offsets[i]:time_offsets[i + 1]`` is
+    the slice of it holding the tick ``time_keys[i]``. ``decimals`` maps each
+    column stored as float32 to the decimals its source values had.
+    """
+
+    def __init__(self, name, ship_table, ship_code, timestamp, lon, lat, sog, cog, len_pred,
+                 extra=None, property_names=CORE_PROPERTIES, collection=None, version=None, ship_offsets=None,
+                 time_index=None, decimals=None):
+        self.name = name
+        self.ship_table = ship_table
+        self.ship_code = ship_code
+        self.timestamp = timestamp
+        self.lon = lon
+        self.lat = lat
+        self.sog = sog
+        self.cog = cog
+        self.len_pred = len_pred
+        self.extra = extra or {}
+        self.decimals = dict(decimals or {})
+        self.property_names = tuple(property_names)
+        self.collection = collection or {"type": "FeatureCollection"}
+        self.version = version
+        self.data_dir = None
+        self._fingerprint = None
+
+        self._code_lookup = {str(ship_id): code for code, ship_id in enumerate(ship_table)}
+        if ship_offsets is None:
+            ship_offsets = np.searchsorted(ship_code, np.arange(len(ship_table) + 1), side='left')
+        self.ship_offsets = ship_offsets
+        self._time_index = time_index
+
+    @classmethod
+    def from_geojson(cls, name, data, version=None):
+        features = data['features']
+        collection = {key: value for key, value in data.items() if key != 'features'}
+
+        property_names = list(CORE_PROPERTIES)
+        if features:
+            property_names = list(features[0]['properties'].keys())
+            property_names += [key for key in CORE_PROPERTIES if key not in property_names]
+
+        properties = [feature['properties'] for feature in features]
+        raw_ids = [props['SHIP_ID'] for props in properties]
+        ship_table = sorted(set(raw_ids))
+        code_lookup = {ship_id: code for code, ship_id in enumerate(ship_table)}
+        ship_code = np.fromiter((code_lookup[ship_id] for ship_id in raw_ids), dtype=np.int32, count=len(raw_ids))
+
+        timestamp = np.array([props['RECPTN_DT'] for props in properties], dtype='datetime64[s]').astype(np.int64)
+        coords = np.array([feature['geometry']['coordinates'][:2] for feature in features], dtype=np.float64).reshape(-1, 2)
+
+        order = np.lexsort((timestamp, ship_code))
+        extra = {
+            key: _column([props.get(key) for props in properties])[order]
+            for key in property_names if key not in CORE_PROPERTIES
+        }
+
+        table = np.empty(len(ship_table), dtype=object)
+        table[:] = ship_table
+
+        return cls(
+            name,
+            table,
+            ship_code[order],
+            timestamp[order],
+            coords[order, 0],
+            coords[order, 1],
+            np.array([props['SOG'] for props in properties], dtype=np.float64)[order],
+            np.array([props['COG'] for props in properties], dtype=np.float64)[order],
+            np.array([props.get('LEN_PRED', np.nan) for props in properties], dtype=np.float64)[order],
+            extra=extra,
+            property_names=property_names,
+            collection=collection,
+            version=version,
+        )
+
+    @classmethod
+    def open(cls, path, version=None, mmap=True):
+        with open(os.path.join(path, 'meta.json'), 'r') as file:
+            meta = json.load(file)
+        if meta.get('format_version') != BINARY_FORMAT_VERSION:
+            raise ValueError(f"Unsupported binary AIS format version in {path}: {meta.get('format_version')}")
+
+        def load(column):
+            return np.load(os.path.join(path, column + '.npy'), mmap_mode='r' if mmap else None)
+
+        columns = {column: load(column) for column in COLUMNS}
+        time_index = None
+        if all(os.path.exists(os.path.join(path, column + '.npy')) for column in TIME_INDEX_COLUMNS):
+            time_index = tuple(load(column) for column in TIME_INDEX_COLUMNS)
+        extra = {}
+        for key, spec in meta['extra'].items():
+            extra[key] = load('extra_' + key)
+            if spec['kind'] == 'encoded':
+                table = np.empty(len(spec['table']), dtype=object)
+                table[:] = spec['table']
+                extra[key] = EncodedColumn(extra[key], table)
+
+        ship_table = np.empty(len(meta['ship_table']), dtype=object)
+        ship_table[:] = meta['ship_table']
+
+        return cls(
+            meta['name'],
+            ship_table,
+            columns['ship_code'],
+            columns['timestamp'],
+            columns['lon'],
+            columns['lat'],
+            columns['sog'],
+            columns['cog'],
+            columns['len_pred'],
+            extra=extra,
+            property_names=meta['property_names'],
+            collection=meta['collection'],
+            version=version,
+            ship_offsets=columns['ship_offsets'],
+            time_index=time_index,
+            decimals=meta.get('decimals'),
+        )
+
+    def save(self, path, float32=False, source=None):
+        """Write the binary copy; with float32, SOG/COG/LEN_PRED are narrowed where their decimals survive it."""
+        columns = {
+            'ship_code': np.asarray(self.ship_code, dtype=np.int32),
+            'timestamp': np.asarray(self.timestamp, dtype=np.int64),
+            'lon': np.asarray(self.lon, dtype=np.float64),
+            'lat': np.asarray(self.lat, dtype=np.float64),
+            'ship_offsets': np.asarray(self.ship_offsets, dtype=np.int64),
+        }
+        decimals = {}
+        for column in FLOAT32_COLUMNS:
+            values = self.values(column)
+            digits = float32_decimals(values) if float32 else None
+            if digits is None:
+                # Values with more decimals than float32 keeps stay float64 rather than lose precision
+                columns[column] = values
+            else:
+                columns[column] = values.astype(np.float32)
+                decimals[column] = digits
+        columns.update(zip(TIME_INDEX_COLUMNS, self.time_index))
+        meta = {
+            'format_version': BINARY_FORMAT_VERSION,
+            'name': self.name,
+            'rows': len(self),
+            'ship_table': self.ship_ids(),
+            'property_names': list(self.property_names),
+            'collection': self.collection,
+            'extra': {},
+            'decimals': decimals,
+            'source': source,
+        }
+        for key, column in self.extra.items():
+            if isinstance(column, EncodedColumn):
+                columns['extra_' + key] = np.asarray(column.codes, dtype=np.int32)
+                meta['extra'][key] = {'kind': 'encoded', 'table': column.table.tolist()}
+            else:
+                columns['extra_' + key] = np.asarray(column)
+                meta['extra'][key] = {'kind': 'numeric'}
+
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        for column, values in columns.items():
+            np.save(os.path.join(tmp_path, column + '.npy'), values)
+        # meta.json is written last: its mtime marks the binary copy as complete
+        with open(os.path.join(tmp_path, 'meta.json'), 'w') as file:
+            json.dump(meta, file)
+
+        if os.path.exists(path):
+            old_path = f"{path}.old-{os.getpid()}"
+            os.replace(path, old_path)
+            os.replace(tmp_path, path)
+            shutil.rmtree(old_path, ignore_errors=True)
+        else:
+            os.replace(tmp_path, path)
+
+    def __len__(self):
+        return len(self.timestamp)
+
+    def fingerprint(self):
+        """Content hash of the rows and their positions and motion, used to match derived files to this data.
+
+        Float32-stored columns are hashed at their source values, so a narrowed
+        binary copy matches the GeoJSON it was made from.
+        """
+        if self._fingerprint is None:
+            digest = hashlib.sha1()
+            digest.update(json.dumps([str(ship_id) for ship_id in self.ship_table]).encode('utf-8'))
+            digest.update(np.ascontiguousarray(self.ship_code, dtype=np.int32).tobytes())
+            digest.update(np.ascontiguousarray(self.timestamp, dtype=np.int64).tobytes())
+            for column in ('lon', 'lat', 'sog', 'cog', 'len_pred'):
+                digest.update(np.ascontiguousarray(self.values(column)).tobytes())
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def ship_ids(self):
+        return [ship_id.item() if isinstance(ship_id, np.generic) else ship_id for ship_id in self.ship_table]
+
+    def code_of(self, ship_id):
+        return self._code_lookup.get(str(ship_id))
+
+    def ship_rows(self, ship_id, start=None, end=None):
+        code = self.code_of(ship_id)
+        if code is None:
+            return np.empty(0, dtype=np.int64)
+        lo, hi = self.ship_offsets[code], self.ship_offsets[code + 1]
+        if start is not None:
+            end = start if end is None else end
+            track = self.timestamp[lo:hi]
+            lo, hi = lo + np.searchsorted(track, start, side='left'), lo + np.searchsorted(track, end, side='right')
+        return np.arange(lo, hi)
+
+    @property
+    def time_index(self):
+        if self._time_index is None:
+            time_order = np.lexsort((self.ship_code, self.timestamp))
+            time_keys, time_offsets = np.unique(self.timestamp[time_order], return_index=True)
+            time_offsets = np.append(time_offsets, len(time_order)).astype(np.int64)
+            self._time_index = (time_order.astype(np.int64), time_keys.astype(np.int64), time_offsets)
+        return self._time_index
+
+    def timestamps(self):
+        return self.time_index[1]
+
+    def rows_at(self, ts):
+        time_order, time_keys, time_offsets = self.time_index
+        i = np.searchsorted(time_keys, ts)
+        if i == len(time_keys) or time_keys[i] != ts:
+            return np.empty(0, dtype=np.int64)
+        return time_order[time_offsets[i]:time_offsets[i + 1]]
+
+    def row_of(self, ship_id, ts):
+        rows = self.ship_rows(ship_id, ts, ts)
+        return int(rows[0]) if len(rows) else None
+
+    def values(self, column, rows=slice(None)):
+        """A column (or its rows) as float64, rounded back to the source decimals when it is stored as float32."""
+        values = np.asarray(np.asarray(getattr(self, column))[rows], dtype=np.float64)
+        digits = self.decimals.get(column)
+        return values if digits is None else np.round(values, digits)
+
+    def feature(self, row):
+        values = {
+            'SHIP_ID': self.ship_table[self.ship_code[row]],
+            'RECPTN_DT': str(format_epoch(self.timestamp[row])),
+            'SOG': self.sog[row],
+            'COG': self.cog[row],
+            'LEN_PRED': self.len_pred[row],
+        }
+        for key, column in (('SOG', 'sog'), ('COG', 'cog'), ('LEN_PRED', 'len_pred')):
+            if column in self.decimals:
+                values[key] = round(float(values[key]), self.decimals[column])
+        properties = {}
+        for key in self.property_names:
+            value = values[key] if key in values else self.extra[key][row]
+            properties[key] = value.item() if isinstance(value, np.generic) else value
+
+        return {
+            "type": "Feature",
+            "properties": properties,
+            "geometry": {
+                "type": "Point",
+                "coordinates": [float(self.lon[row]), float(self.lat[row])]
+            }
+        }
+
+    def features(self, rows):
+        return [self.feature(row) for row in rows]
+
+    def feature_collection(self, rows):
+        return {**self.collection, "features": self.features(rows)}
+
+    def take(self, rows, name=None, version=None):
+        """New dataset of the given rows (in row order), with a ship table of only the ships they hold."""
+        rows = np.asarray(rows, dtype=np.int64)
+        codes, local_code = np.unique(np.asarray(self.ship_code)[rows], return_inverse=True)
+        return AISDataset(
+            name or self.name,
+            self.ship_table[codes],
+            local_code.astype(np.int32),
+            np.asarray(self.timestamp)[rows],
+            np.asarray(self.lon)[rows],
+            np.asarray(self.lat)[rows],
+            np.asarray(self.sog)[rows],
+            np.asarray(self.cog)[rows],
+            np.asarray(self.len_pred)[rows],
+            extra={key: column[rows] for key, column in self.extra.items()},
+            property_names=self.property_names,
+            collection=self.collection,
+            version=version,
+            decimals=self.decimals,
+        )
+
+
+def _merge_encoded(columns):
+    lookup = {}
+    codes = [np.array([lookup.setdefault(value, len(lookup)) for value in column.table], dtype=np.int32)[column.codes]
+             for column in columns]
+    table = np.empty(len(lookup), dtype=object)
+    table[:] = list(lookup)
+    return EncodedColumn(np.concatenate(codes), table)
+
+
+def concat_datasets(parts, name, version=None):
+    """One dataset holding the rows of all parts, re-sorted by (ship, timestamp) over a merged ship table."""
+    ship_table = sorted({ship_id for part in parts for ship_id in part.ship_ids()})
+    code_lookup = {str(ship_id): code for code, ship_id in enumerate(ship_table)}
+    ship_code = np.concatenate([
+        np.array([code_lookup[str(ship_id)] for ship_id in part.ship_table], dtype=np.int32)[np.asarray(part.ship_code)]
+        for part in parts
+    ])
+    timestamp = np.concatenate([np.asarray(part.timestamp, dtype=np.int64) for part in parts])
+    order = np.lexsort((timestamp, ship_code))
+
+    def column(attribute):
+        return np.concatenate([np.asarray(getattr(part, attribute)) for part in parts])[order]
+
+    # float32 columns stay float32 when every part has them so; otherwise they are widened to their source values
+    decimals, kinematic = {}, {}
+    for attribute in FLOAT32_COLUMNS:
+        digits = [part.decimals.get(attribute) for part in parts]
+        if None in digits:
+            kinematic[attribute] = np.concatenate([part.values(attribute) for part in parts])[order]
+        else:
+            kinematic[attribute] = column(attribute)
+            decimals[attribute] = max(digits)
+
+    extra = {}
+    for key, first in parts[0].extra.items():
+        columns = [part.extra[key] for part in parts]
+        if isinstance(first, EncodedColumn):
+            extra[key] = _merge_encoded(columns)[order]
+        else:
+            extra[key] = np.concatenate([np.asarray(values) for values in columns])[order]
+
+    table = np.empty(len(ship_table), dtype=object)
+    table[:] = ship_table
+    return AISDataset(
+        name, table, ship_code[order], timestamp[order], column('lon'), column('lat'), kinematic['sog'], kinematic['cog'],
+        kinematic['len_pred'], extra=extra, property_names=parts[0].property_names, collection=parts[0].collection,
+        version=version, decimals=decimals,
+    )
+
+
+_datasets = {}
+_datasets_lock = threading.Lock()
+
+
+def dataset_path(filename, data_dir=DATA_DIR):
+    return os.path.join(data_dir, filename + '.geojson')
+
+
+def binary_path(filename, data_dir=DATA_DIR):
+    return os.path.join(data_dir, filename + BINARY_SUFFIX)
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _resolve_source(filename, data_dir):
+    geojson_path = dataset_path(filename, data_dir)
+    geojson_mtime = _mtime(geojson_path)
+    binary = binary_path(filename, data_dir)
+    binary_mtime = _mtime(os.path.join(binary, 'meta.json'))
+
+    # A binary copy older than its GeoJSON is stale; fall back until it is reconverted
+    if binary_mtime is not None and (geojson_mtime is None or binary_mtime >= geojson_mtime):
+        return binary, 'binary', binary_mtime
+    if geojson_mtime is None:
+        raise FileNotFoundError(f"No AIS data found for {filename} in {data_dir}")
+    return geojson_path, 'geojson', geojson_mtime
+
+
+def load_geojson_dataset(path, filename, version=None):
+    with open(path, 'r') as file:
+        data = json.load(file)
+    return AISDataset.from_geojson(filename, data, version=version)
+
+
+def get_dataset(filename, data_dir=DATA_DIR, start=None, end=None, bbox=None):
+    """The dataset of a file, loaded once and reloaded when the file changes.
+
+    A file converted to a partitioned store (see partitions.py) is instead
+    served as a view of only the partitions overlapping [start, end] (epoch
+    seconds; end defaults to start) and the optional (min_lon, min_lat,
+    max_lon, max_lat) bbox. Without start, the view covers every partition.
+    """
+    from partitions import get_partitioned_store
+
+    store = get_partitioned_store(filename, data_dir)
+    if store is not None:
+        return store.view(start, end, bbox)
+
+    path, kind, mtime = _resolve_source(filename, data_dir)
+    version = (filename, kind, mtime)
+    key = os.path.join(data_dir, filename)
+
+    dataset = _datasets.get(key)
+    if dataset is not None and dataset.version == version:
+        return dataset
+
+    with _datasets_lock:
+        dataset = _datasets.get(key)
+        if dataset is None or dataset.version != version:
+            with stage('load'):
+                if kind == 'binary':
+                    dataset = AISDataset.open(path, version=version)
+                else:
+                    dataset = load_geojson_dataset(path, filename, version=version)
+            dataset.data_dir = data_dir
+            _datasets[key] = dataset
+            log.info("Loaded dataset %s from %s: %d rows, %d ships", filename, kind, len(dataset), len(dataset.ship_table))
+    return dataset
+
+
+def get_catalog(filename, data_dir=DATA_DIR):
+    """Whole-file facts without loading rows of a partitioned store: version, ship ids, row count."""
+    from partitions import get_partitioned_store
+
+    store = get_partitioned_store(filename, data_dir)
+    return store if store is not None else get_dataset(filename, data_dir)
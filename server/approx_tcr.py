@@ -0,0 +1,310 @@
+"""Approximate TCR by point sampling.
+
+The exact TCR (calculation_cri.compute_tcr) intersects polygons: the V
+half-ellipse and each target's VO piece, the union of its domain ellipses
+over the window (their convex hull when they are disjoint) buffered by
+about 0.004 degrees. Both shapes are analytic, so here the V region is
+covered with low-discrepancy points instead, and the TCR is the share of
+points within the buffer distance of a target's ellipses or hull.
+
+Each result carries tcr_error, a heuristic scale for the sampling error:
+the binomial standard error at the 95% normal quantile. It is not a
+confidence bound. The points are a deterministic sequence, not random
+draws, and the model differs from the polygons in ways sampling does not
+see: shares are taken in degrees (compute_tcr projects areas), the hulls
+come from 64 boundary points per ellipse, and the buffer is a distance in
+degrees. Run this module to measure the error against compute_tcr.
+"""
+import argparse
+import os
+import time
+from functools import lru_cache
+
+import numpy as np
+from scipy.spatial import ConvexHull
+
+from ais_store import DATA_DIR, get_dataset, get_catalog, to_epoch, format_epoch
+from encounters import resolve_encounters
+from logs import configure_logging
+from metrics import stage
+from ship_domain import domain_axes
+
+DEFAULT_SAMPLES = int(os.environ.get('FURIOUS_TCR_SAMPLES', 4096))
+MAX_TCR_SAMPLES = 1 << 20
+# Two-sided 95% normal quantile, scaling the heuristic tcr_error
+CONFIDENCE_Z = 1.96
+# merge_vo_piece buffers every VO piece by +0.005 then -0.001 degrees
+VO_BUFFER_DEG = 0.004
+METERS_PER_DEGREE_LON = 111319.9
+METERS_PER_DEGREE_LAT = 110574.0
+WGS84_A = 6378137.0
+WGS84_E2 = 6.69437999014e-3
+# Boundary points per ellipse for the connectivity test and the convex hull
+BOUNDARY_POINTS = 64
+NEWTON_STEPS = 4
+# Points tested against the ellipses per block, bounding the (points, ellipses) temporaries
+BLOCK_POINTS = 16384
+
+
+def ellipse_boundary(ellipses, num_points=BOUNDARY_POINTS):
+    """Boundary points of every ellipse, shape (len(ellipses) * num_points, 2)."""
+    cx, cy, a, b, rotation = (column[:, np.newaxis] for column in ellipses.T)
+    theta = 2.0 * np.pi * np.arange(num_points) / num_points
+    x, y = a * np.cos(theta), b * np.sin(theta)
+    return np.column_stack((
+        (cx + x * np.cos(rotation) - y * np.sin(rotation)).ravel(),
+        (cy + x * np.sin(rotation) + y * np.cos(rotation)).ravel(),
+    ))
+
+
+def inside_ellipses(x, y, ellipses, buffer_deg=0.0):
+    """(len(x), len(ellipses)) mask of the points inside each ellipse grown by buffer_deg.
+
+    Outside points are measured to their closest boundary point, found with
+    a few Newton steps on the ellipse angle.
+    """
+    cx, cy, a, b, rotation = (column[np.newaxis, :] for column in ellipses.T)
+    dx, dy = x[:, np.newaxis] - cx, y[:, np.newaxis] - cy
+    u = dx * np.cos(rotation) + dy * np.sin(rotation)
+    w = dy * np.cos(rotation) - dx * np.sin(rotation)
+    inside = (u / a) ** 2 + (w / b) ** 2 <= 1.0
+    if not buffer_deg:
+        return inside
+
+    # Only points within buffer_deg of the bounding box can be near the boundary
+    near = ~inside & (np.abs(u) <= a + buffer_deg) & (np.abs(w) <= b + buffer_deg)
+    u, w = u[near], w[near]
+    a, b = np.broadcast_to(a, near.shape)[near], np.broadcast_to(b, near.shape)[near]
+    theta = np.arctan2(w * a, u * b)
+    for _ in range(NEWTON_STEPS):
+        sin, cos = np.sin(theta), np.cos(theta)
+        f = (a * a - b * b) * sin * cos - u * a * sin + w * b * cos
+        df = (a * a - b * b) * (cos * cos - sin * sin) - u * a * cos - w * b * sin
+        theta = theta - np.divide(f, df, out=np.zeros_like(f), where=df != 0)
+    inside[near] = np.hypot(u - a * np.cos(theta), w - b * np.sin(theta)) <= buffer_deg
+    return inside
+
+
+def vo_piece(ellipses):
+    """One target's VO piece as (ellipses, hull, bounds).
+
+    hull is None or the half-planes (normals, offsets) of the convex hull,
+    bounds the (min_x, min_y, max_x, max_y) of the piece grown by the buffer.
+
+    Like vo_builder.merge_vo_piece, a piece whose ellipses do not form one
+    connected shape is replaced by their convex hull. Two ellipses are taken
+    as connected when a boundary point of one lies inside the other.
+    """
+    boundary = ellipse_boundary(ellipses)
+    bounds = (*(boundary.min(axis=0) - VO_BUFFER_DEG), *(boundary.max(axis=0) + VO_BUFFER_DEG)) if len(boundary) else None
+    if len(ellipses) < 2:
+        return ellipses, None, bounds
+    owner = np.repeat(np.arange(len(ellipses)), BOUNDARY_POINTS)
+    point, other = np.nonzero(inside_ellipses(boundary[:, 0], boundary[:, 1], ellipses))
+    reach = np.eye(len(ellipses), dtype=np.int64)
+    reach[owner[point], other] = reach[other, owner[point]] = 1
+    # Transitive closure by squaring: ellipse 0 reaches every other one iff the union is connected
+    for _ in range(int(np.ceil(np.log2(len(ellipses))))):
+        reach = np.minimum(reach @ reach, 1)
+    if reach[0].all():
+        return ellipses, None, bounds
+    hull = ConvexHull(boundary)
+    return ellipses, (hull.equations[:, :2], hull.equations[:, 2]), bounds
+
+
+def target_piece(dataset, ship_id, start, end):
+    """VO piece of a target over [start, end], as in vo_piece.
+
+    Ellipses are (cx, cy, a, b, rotation) rows with the centre and rotation
+    of ship_domain.ellipse_rings.
+    """
+    encounters = resolve_encounters(dataset, ship_id, start, end)
+    own_rows, target_rows = encounters['own_rows'], encounters['target_rows']
+    lat = np.asarray(dataset.lat[own_rows], dtype=np.float64)
+    a, b, delta_a, delta_b = domain_axes(
+        dataset.len_pred[own_rows], dataset.sog[own_rows], lat, dataset.sog[target_rows], encounters['alpha'], encounters['mode'],
+    )
+    ellipses = np.column_stack((
+        np.asarray(dataset.lon[own_rows], dtype=np.float64) - delta_a, lat - delta_b,
+        np.abs(a), np.abs(b), np.radians(np.asarray(dataset.cog[own_rows], dtype=np.float64)),
+    ))
+    return vo_piece(ellipses[np.all(np.isfinite(ellipses), axis=1)])
+
+
+@lru_cache(maxsize=1024)
+def _cached_target_piece(filename, data_dir, ship_id, start, end, dataset_version):
+    return target_piece(get_dataset(filename, data_dir, start=start, end=end), ship_id, start, end)
+
+
+def v_half_ellipse(lon, lat, sog, cog, time_length):
+    """V region of calculation_cri.compute_v_region as (cx, cy, rx, ry, rotation) in degrees and radians."""
+    distance_m = time_length * 60 * np.log(sog) * 0.51444
+    return lon, lat, distance_m / METERS_PER_DEGREE_LON, distance_m / METERS_PER_DEGREE_LAT, np.radians(cog - 90)
+
+
+def km_per_degree(lat):
+    """(km per degree of longitude, km per degree of latitude) on the WGS84 ellipsoid at lat."""
+    sin2 = np.sin(np.radians(lat)) ** 2
+    prime_vertical = WGS84_A / np.sqrt(1 - WGS84_E2 * sin2)
+    meridian = WGS84_A * (1 - WGS84_E2) / (1 - WGS84_E2 * sin2) ** 1.5
+    return np.radians(prime_vertical * np.cos(np.radians(lat))) / 1000, np.radians(meridian) / 1000
+
+
+def r2_sequence(n):
+    """First n points of the R2 low-discrepancy sequence in the unit square."""
+    g = 1.32471795724474602596  # plastic number
+    i = np.arange(1, n + 1, dtype=np.float64)[:, np.newaxis]
+    return np.mod(0.5 + i * np.array([1 / g, 1 / g ** 2]), 1.0)
+
+
+@lru_cache(maxsize=16)
+def unit_half_disc(samples):
+    """Points evenly covering the upper half of the unit disc: sqrt-radius keeps the density uniform over the area."""
+    u = r2_sequence(samples)
+    radius, theta = np.sqrt(u[:, 0]), np.pi * u[:, 1]
+    x, y = radius * np.cos(theta), radius * np.sin(theta)
+    x.flags.writeable = y.flags.writeable = False
+    return x, y
+
+
+def sample_half_ellipse(v_region, samples):
+    """Points evenly covering the half-ellipse."""
+    cx, cy, rx, ry, rotation = v_region
+    x, y = unit_half_disc(samples)
+    x, y = rx * x, ry * y
+    return (
+        cx + x * np.cos(rotation) - y * np.sin(rotation),
+        cy + x * np.sin(rotation) + y * np.cos(rotation),
+    )
+
+
+def inside_vo(x, y, pieces):
+    """Mask of the points inside any VO piece grown by the VO buffer."""
+    inside = np.zeros(len(x), dtype=bool)
+    for ellipses, hull, bounds in pieces:
+        if bounds is None:
+            continue
+        min_x, min_y, max_x, max_y = bounds
+        candidates = np.flatnonzero(~inside & (x >= min_x) & (x <= max_x) & (y >= min_y) & (y <= max_y))
+        for lo in range(0, len(candidates), BLOCK_POINTS):
+            block = candidates[lo:lo + BLOCK_POINTS]
+            if hull is not None:
+                normals, offsets = hull
+                distance = np.column_stack((x[block], y[block])) @ normals.T + offsets
+                inside[block] = distance.max(axis=1) <= VO_BUFFER_DEG
+            else:
+                inside[block] = np.any(inside_ellipses(x[block], y[block], ellipses, VO_BUFFER_DEG), axis=1)
+    return inside
+
+
+def sampling_error(tcr, samples):
+    """Heuristic sampling error of a share from samples points: 1.96 binomial standard errors (at least one point's worth).
+
+    Not a confidence bound (see the module docstring); validate() measures the actual error.
+    """
+    return CONFIDENCE_Z * np.sqrt(max(tcr * (1 - tcr), 1.0 / samples) / samples)
+
+
+@stage('tcr')
+def approximate_tcr(filename, own_ship_id, target_ship_ids, recptn_dt_str, time_length=30, samples=DEFAULT_SAMPLES,
+                    data_dir=DATA_DIR):
+    """Sampled TCR of the own ship against the targets: {'tcr', 'tcr_error', 'v_area', 'samples'}.
+
+    v_area is the analytic area of the V region in km^2.
+    """
+    from calculation_cri import load_geojson_selected_time
+
+    if samples <= 0:
+        raise ValueError("The sample budget must be positive")
+    features = load_geojson_selected_time(filename, own_ship_id, recptn_dt_str, 0, data_dir)['features']
+    if not features:
+        raise ValueError("Own ship not found at the given datetime")
+    own = features[0]
+    lon, lat = own['geometry']['coordinates'][:2]
+    v_region = v_half_ellipse(lon, lat, own['properties']['SOG'], own['properties']['COG'], time_length)
+
+    start = to_epoch(recptn_dt_str)
+    end = start + time_length * 60
+    version = get_catalog(filename, data_dir).version
+    pieces = [_cached_target_piece(filename, data_dir, ship_id, start, end, version) for ship_id in target_ship_ids]
+
+    x, y = sample_half_ellipse(v_region, samples)
+    tcr = float(np.count_nonzero(inside_vo(x, y, pieces))) / samples
+
+    _, _, rx, ry, _ = v_region
+    km_lon, km_lat = km_per_degree(lat)
+    return {
+        'tcr': tcr,
+        'tcr_error': float(sampling_error(tcr, samples)),
+        'v_area': float(np.pi * abs(rx) * km_lon * abs(ry) * km_lat / 2),
+        'samples': samples,
+    }
+
+
+def validate(filename, data_dir=DATA_DIR, samples=DEFAULT_SAMPLES, max_pairs=200, time_length=30, seed=0):
+    """Measure the approximate TCR's error against the exact compute_tcr on (own ship, closest target) pairs at random ticks.
+
+    within_tcr_error is the share of pairs whose error the heuristic tcr_error covered.
+    """
+    from calculation_cri import compute_tcr, compute_v_region, compute_vo_region, find_three_closest_ships
+
+    dataset = get_dataset(filename, data_dir)
+    rng = np.random.default_rng(seed)
+    rows = rng.permutation(len(dataset))
+    errors, within, exact_seconds, approx_seconds = [], 0, 0.0, 0.0
+
+    for row in rows.tolist():
+        if len(errors) >= max_pairs:
+            break
+        own_ship_id = dataset.ship_table[dataset.ship_code[row]]
+        recptn_dt_str = str(format_epoch(dataset.timestamp[row]))
+        try:
+            targets = tuple(ship['properties']['SHIP_ID'] for ship in find_three_closest_ships(filename, own_ship_id, recptn_dt_str, k=1, data_dir=data_dir))
+            started = time.perf_counter()
+            vo_region, vo_geojson = compute_vo_region(filename, targets, recptn_dt_str, time_length, data_dir)
+            v_region, v_geojson = compute_v_region(filename, own_ship_id, recptn_dt_str, time_length, data_dir)
+            exact, _, _ = compute_tcr(vo_region, v_region, vo_geojson, v_geojson)
+            exact_seconds += time.perf_counter() - started
+
+            started = time.perf_counter()
+            approx = approximate_tcr(filename, own_ship_id, targets, recptn_dt_str, time_length, samples, data_dir)
+            approx_seconds += time.perf_counter() - started
+        except ValueError:
+            # Ships without data or targets in the window
+            continue
+        if not np.isfinite(exact):
+            continue
+        errors.append(abs(approx['tcr'] - exact))
+        within += errors[-1] <= approx['tcr_error']
+
+    errors = np.asarray(errors)
+    return {
+        'pairs': len(errors),
+        'samples': samples,
+        'mean_abs_error': float(errors.mean()) if len(errors) else None,
+        'p95_abs_error': float(np.percentile(errors, 95)) if len(errors) else None,
+        'max_abs_error': float(errors.max()) if len(errors) else None,
+        'within_tcr_error': within / len(errors) if len(errors) else None,
+        'exact_ms_per_pair': 1000 * exact_seconds / max(len(errors), 1),
+        'approx_ms_per_pair': 1000 * approx_seconds / max(len(errors), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate the sampled TCR against the exact geometry on random pairs.")
+    parser.add_argument('filename', help="File name without extension, e.g. cargo_resample10T_ver04")
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    parser.add_argument('--samples', type=int, action='append', help=f"Sample budget (repeatable, default {DEFAULT_SAMPLES})")
+    parser.add_argument('--pairs', type=int, default=200)
+    parser.add_argument('--time-length', type=int, default=30)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    configure_logging('WARNING')
+    for samples in args.samples or [DEFAULT_SAMPLES]:
+        report = validate(args.filename, args.data_dir, samples, args.pairs, args.time_length, args.seed)
+        print(' '.join(f"{key}={value:.4g}" if isinstance(value, float) else f"{key}={value}" for key, value in report.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+os.environ.setdefault('FURIOUS_LOG_LEVEL', 'WARNING')
+
+import numpy as np
+import shapely
+
+from generate_ais import generate
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+WORK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.work')
+FILE_NAME = 'synthetic_resample10T_bench'
+
+# Synthetic scenes: (ships, hours); seeds are fixed so every run sees the same data
+PROFILES = {
+    'small': (200, 24),
+    'medium': (2000, 24),
+    'large': (20000, 48),
+}
+TIME_LENGTH = 30
+
+
+def prepare(profile):
+    """Generate the profile's dataset (once) and make it the working directory's ./testdata."""
+    num_ships, hours = PROFILES[profile]
+    work_dir = os.path.join(WORK_DIR, profile)
+    data_dir = os.path.join(work_dir, 'testdata')
+    if not os.path.exists(os.path.join(data_dir, FILE_NAME + '.geojson')):
+        generate(FILE_NAME, num_ships, hours, data_dir, seed=0, binary=True)
+    os.chdir(work_dir)
+
+
+def scenario(dataset):
+    """Own ship (the first scripted encounter pair), a tick in the middle of its track and its 3 closest targets."""
+    from calculation_cri import find_three_closest_ships
+    from ais_store import format_epoch
+
+    own_ship_id = dataset.ship_table[0]
+    rows = dataset.ship_rows(own_ship_id)
+    date_time = str(format_epoch(dataset.timestamp[rows[len(rows) // 2 - TIME_LENGTH // 10]]))
+    targets = tuple(ship['properties']['SHIP_ID'] for ship in find_three_closest_ships(FILE_NAME, own_ship_id, date_time))
+    end_time = str(format_epoch(dataset.timestamp[rows[min(len(rows) - 1, len(rows) // 2 + 6)]]))
+    return own_ship_id, date_time, end_time, targets
+
+
+def benchmarks(dataset):
+    import approx_tcr
+    import calculation_cri as cc
+    import server
+    import trajectory
+    from ais_store import AISDataset, binary_path, dataset_path, load_geojson_dataset, to_epoch
+
+    own, dt, end, targets = scenario(dataset)
+    # Halfway between two ticks, so snapshots go through interpolation
+    off_grid = to_epoch(dt) + 300
+    server.file_mapping['synthetic'] = FILE_NAME
+    client = server.app.test_client()
+    body = {'shipType': 'synthetic', 'shipId': own, 'datetime': dt, 'timeLength': TIME_LENGTH}
+
+    vo_region, vo_geojson = cc.compute_vo_region(FILE_NAME, targets, dt, TIME_LENGTH)
+    v_region, v_geojson = cc.compute_v_region(FILE_NAME, own, dt, TIME_LENGTH)
+
+    def endpoint(method, url, **kwargs):
+        def call():
+            response = getattr(client, method)(url, **kwargs)
+            data = response.get_data()
+            if response.status_code != 200:
+                raise RuntimeError(f"{url} answered {response.status_code}: {data[:200]!r}")
+        return call
+
+    return {
+        'load_geojson_dataset': lambda: load_geojson_dataset(dataset_path(FILE_NAME), FILE_NAME),
+        'open_binary_dataset': lambda: AISDataset.open(binary_path(FILE_NAME)),
+        'ship_ids': lambda: cc.ship_ids(FILE_NAME),
+        'load_geojson_selected': lambda: cc.load_geojson_selected(FILE_NAME, dt),
+        'find_three_closest_ships': lambda: cc.find_three_closest_ships(FILE_NAME, own, dt),
+        'ownship_ellipses': lambda: cc.ownship_ellipses(FILE_NAME, own, dt, TIME_LENGTH),
+        'compute_vo_region': lambda: cc.compute_vo_region(FILE_NAME, targets, dt, TIME_LENGTH),
+        'compute_tcr': lambda: cc.compute_tcr(vo_region, v_region, vo_geojson, v_geojson),
+        'approximate_tcr': lambda: approx_tcr.approximate_tcr(FILE_NAME, own, targets, dt, TIME_LENGTH),
+        'compute_tcpa': lambda: cc.compute_tcpa(FILE_NAME, own, dt),
+        'interpolated_snapshot': lambda: trajectory.interpolated_snapshot(dataset, off_grid),
+        'resample_track': lambda: trajectory.resample_track(dataset, own, to_epoch(dt), to_epoch(end), 60),
+        'GET /get_ship_ids': endpoint('get', '/get_ship_ids?shipType=synthetic'),
+        'GET /load_geojson_data_selected': endpoint('get', f'/load_geojson_data_selected?shipType=synthetic&datetime={dt}'),
+        'POST /os_domain': endpoint('post', '/os_domain', json=body),
+        'POST /computation': endpoint('post', '/computation', json=body),
+        'POST /computation_vo': endpoint('post', '/computation_vo', json=body),
+        'POST /computation_v': endpoint('post', '/computation_v', json=body),
+        'POST /risk_assessment': endpoint('post', '/risk_assessment', json=body),
+        'POST /maneuver_advisory': endpoint('post', '/maneuver_advisory', json=body),
+        'POST /cri_series': endpoint('post', '/cri_series', json={**body, 'startDatetime': dt, 'endDatetime': end}),
+        'GET /trajectory': endpoint('get', f'/trajectory?shipType=synthetic&shipId={own}&startDatetime={dt}&endDatetime={end}&stepSeconds=60'),
+        'GET /playback': endpoint('get', f'/playback?shipType=synthetic&startDatetime={dt}&endDatetime={end}&format=ndjson'),
+    }
+
+
+def clear_caches():
+    from result_cache import result_cache
+    from vo_builder import vo_builder
+    from trajectory import track_cache
+    from approx_tcr import _cached_target_piece
+    result_cache.clear()
+    vo_builder.clear()
+    track_cache.clear()
+    _cached_target_piece.cache_clear()
+
+
+def run(profile, repeats, only=None):
+    from ais_store import get_dataset
+
+    prepare(profile)
+    dataset = get_dataset(FILE_NAME)
+    results = {}
+    for name, function in benchmarks(dataset).items():
+        if only and not any(pattern in name for pattern in only):
+            continue
+        function()  # warm-up: imports, snapshot indexes, transformers
+        timings = []
+        for _ in range(repeats):
+            # Result caches are cleared so every repeat measures the computation, not a cache hit
+            clear_caches()
+            started = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - started)
+        results[name] = {'median_s': statistics.median(timings), 'min_s': min(timings), 'repeats': repeats}
+    return results
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'shapely': shapely.__version__,
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def compare(profile, results, baseline, threshold):
+    """Print results against the stored baseline; returns the names that regressed beyond threshold."""
+    reference = baseline.get('profiles', {}).get(profile, {})
+    regressions = []
+    print(f"{'benchmark':36} {'median ms':>10} {'min ms':>10} {'baseline ms':>12} {'ratio':>7}")
+    for name, result in results.items():
+        median_ms = result['median_s'] * 1000
+        base = reference.get(name)
+        if base is None:
+            print(f"{name:36} {median_ms:10.2f} {result['min_s'] * 1000:10.2f} {'-':>12} {'-':>7}")
+            continue
+        base_ms = base['median_s'] * 1000
+        ratio = median_ms / base_ms if base_ms else float('inf')
+        # Sub-millisecond differences are timer noise, not regressions
+        regressed = ratio > threshold and median_ms - base_ms > 1.0
+        if regressed:
+            regressions.append(name)
+        print(f"{name:36} {median_ms:10.2f} {result['min_s'] * 1000:10.2f} {base_ms:12.2f} {ratio:7.2f}{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the risk pipeline on seeded synthetic AIS data.")
+    parser.add_argument('--profile', choices=PROFILES, action='append', dest='profiles',
+                        help="Scene size (repeatable, default small)")
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--only', action='append', help="Run only benchmarks whose name contains this text (repeatable)")
+    parser.add_argument('--threshold', type=float, default=1.5, help="Median ratio to the baseline counted as a regression")
+    parser.add_argument('--save-baseline', action='store_true', help=f"Store these results as the baseline ({BASELINE_PATH})")
+    parser.add_argument('--output', help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH, 'r') as file:
+            baseline = json.load(file)
+
+    all_results, regressions = {}, []
+    for profile in args.profiles or ['small']:
+        print(f"== {profile}: {PROFILES[profile][0]} ships over {PROFILES[profile][1]} h")
+        results = run(profile, args.repeats, args.only)
+        all_results[profile] = results
+        regressions += [f"{profile}/{name}" for name in compare(profile, results, baseline, args.threshold)]
+
+    report = {'environment': environment(), 'profiles': all_results}
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+    if args.save_baseline:
+        baseline.setdefault('profiles', {}).update(all_results)
+        baseline['environment'] = report['environment']
+        with open(BASELINE_PATH, 'w') as file:
+            json.dump(baseline, file, indent=2)
+        print(f"Baseline saved to {BASELINE_PATH}")
+
+    if regressions:
+        print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
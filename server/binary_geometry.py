@@ -0,0 +1,180 @@
+import json
+import struct
+
+import numpy as np
+
+# Packed geometry layout (little-endian):
+#   b'FPG1' | uint32 header length | JSON header | padding to 8 bytes | arrays
+# Each array starts on an 8-byte boundary at header['arrays'][name]['offset'].
+#
+# Geometries are flattened GeoArrow style: feature -> parts -> rings -> coords.
+# A Point is one part with a one-coordinate ring, a LineString one part with
+# one ring, a Polygon one part with its rings; Multi* types have several parts.
+# Coordinates are float32 offsets from header['origin'] (float64), which keeps
+# them within a few millimetres over a scene instead of ~1 m for raw degrees.
+# Properties become one column each, typed by the values present in it:
+#   boolean         uint8 0/1 (255 when missing)
+#   integer/number  float64 (NaN when missing)
+#   string          int32 codes into a dictionary of the strings (-1 when missing)
+#   json            as string, but each dictionary entry is the JSON text of the
+#                   value, so a mixed column keeps True, 1 and "1" apart
+# Missing and null properties are both left out when decoding.
+MIME_TYPE = 'application/vnd.furious.geometry'
+MAGIC = b'FPG1'
+ALIGNMENT = 8
+
+GEOMETRY_TYPES = ['Point', 'LineString', 'Polygon', 'MultiPoint', 'MultiLineString', 'MultiPolygon']
+GEOMETRY_CODES = {name: code for code, name in enumerate(GEOMETRY_TYPES)}
+
+
+def _parts(geometry):
+    """Parts of a GeoJSON geometry, each a list of rings of (x, y) coordinates."""
+    kind, coordinates = geometry['type'], geometry['coordinates']
+    if kind == 'Point':
+        return [[[coordinates]]]
+    if kind in ('LineString', 'MultiPoint'):
+        return [[coordinates]] if kind == 'LineString' else [[[point]] for point in coordinates]
+    if kind in ('Polygon', 'MultiLineString'):
+        return [coordinates] if kind == 'Polygon' else [[line] for line in coordinates]
+    if kind == 'MultiPolygon':
+        return coordinates
+    raise ValueError(f"Unsupported geometry type for packed encoding: {kind}")
+
+
+MISSING_BOOLEAN = 255
+
+
+def _property_column(values):
+    present = [value for value in values if value is not None]
+    if present and all(isinstance(value, bool) for value in present):
+        return {'kind': 'boolean'}, np.array([MISSING_BOOLEAN if value is None else value for value in values], dtype=np.uint8)
+    if all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in present):
+        kind = 'integer' if all(isinstance(value, int) for value in present) else 'number'
+        return {'kind': kind}, np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+
+    # Anything else is dictionary encoded, -1 marking a missing value. Unless every
+    # value is a string, entries are JSON text so each keeps its type.
+    kind = 'string' if all(isinstance(value, str) for value in present) else 'json'
+    dictionary, codes = {}, np.empty(len(values), dtype=np.int32)
+    for i, value in enumerate(values):
+        codes[i] = -1 if value is None else dictionary.setdefault(value if kind == 'string' else json.dumps(value), len(dictionary))
+    return {'kind': kind, 'dictionary': list(dictionary)}, codes
+
+
+def pack_geojson(obj):
+    """Encode a GeoJSON Feature or FeatureCollection into the packed layout above."""
+    if obj.get('type') == 'Feature':
+        root, features = 'Feature', [obj]
+    elif obj.get('type') == 'FeatureCollection':
+        root, features = 'FeatureCollection', obj['features']
+    else:
+        raise ValueError(f"Cannot pack GeoJSON object of type {obj.get('type')}")
+
+    geometry_type = np.empty(len(features), dtype=np.uint8)
+    geometry_offsets, part_offsets, ring_offsets = [0], [0], [0]
+    rings = []
+    for i, feature in enumerate(features):
+        geometry = feature['geometry']
+        geometry_type[i] = GEOMETRY_CODES[geometry['type']]
+        for part in _parts(geometry):
+            for ring in part:
+                rings.append(np.asarray(ring, dtype=np.float64).reshape(-1, 2))
+                ring_offsets.append(ring_offsets[-1] + len(rings[-1]))
+            part_offsets.append(len(rings))
+        geometry_offsets.append(len(part_offsets) - 1)
+
+    coords = np.concatenate(rings) if rings else np.empty((0, 2))
+    origin = ((coords.min(axis=0) + coords.max(axis=0)) / 2).tolist() if len(coords) else [0.0, 0.0]
+
+    arrays = {
+        'geometry_type': geometry_type,
+        'geometry_offsets': np.asarray(geometry_offsets, dtype=np.uint32),
+        'part_offsets': np.asarray(part_offsets, dtype=np.uint32),
+        'ring_offsets': np.asarray(ring_offsets, dtype=np.uint32),
+        'coords': (coords - origin).astype(np.float32).ravel(),
+    }
+
+    properties = {}
+    keys = list(dict.fromkeys(key for feature in features for key in (feature.get('properties') or {})))
+    for key in keys:
+        column, values = _property_column([(feature.get('properties') or {}).get(key) for feature in features])
+        properties[key] = column
+        arrays['property:' + key] = values
+
+    layout, offset = {}, 0
+    for name, array in arrays.items():
+        layout[name] = {'dtype': array.dtype.str, 'offset': offset, 'length': len(array)}
+        offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+
+    header = json.dumps({
+        'root': root,
+        'count': len(features),
+        'origin': origin,
+        'geometry_types': GEOMETRY_TYPES,
+        'properties': properties,
+        'arrays': layout,
+    }, separators=(',', ':')).encode('utf-8')
+    header += b' ' * (-(len(MAGIC) + 4 + len(header)) % ALIGNMENT)
+
+    body = bytearray(offset)
+    for name, array in arrays.items():
+        start = layout[name]['offset']
+        body[start:start + array.nbytes] = array.tobytes()
+
+    return MAGIC + struct.pack('<I', len(header)) + header + bytes(body)
+
+
+def unpack_geojson(data):
+    """Decode packed geometry back to GeoJSON (mirrors the client decoder; used for checks and tooling)."""
+    if data[:4] != MAGIC:
+        raise ValueError("Not a packed geometry payload")
+    (header_length,) = struct.unpack_from('<I', data, 4)
+    header = json.loads(data[8:8 + header_length])
+    body = memoryview(data)[8 + header_length:]
+
+    def array(name):
+        spec = header['arrays'][name]
+        return np.frombuffer(body, dtype=spec['dtype'], count=spec['length'], offset=spec['offset'])
+
+    coords = array('coords').astype(np.float64).reshape(-1, 2) + header['origin']
+    geometry_offsets, part_offsets, ring_offsets = array('geometry_offsets'), array('part_offsets'), array('ring_offsets')
+    columns = {key: (spec, array('property:' + key)) for key, spec in header['properties'].items()}
+
+    features = []
+    for i, code in enumerate(array('geometry_type').tolist()):
+        kind = header['geometry_types'][code]
+        parts = [
+            [coords[ring_offsets[r]:ring_offsets[r + 1]].tolist() for r in range(part_offsets[p], part_offsets[p + 1])]
+            for p in range(geometry_offsets[i], geometry_offsets[i + 1])
+        ]
+        if kind == 'Point':
+            coordinates = parts[0][0][0]
+        elif kind == 'LineString':
+            coordinates = parts[0][0]
+        elif kind == 'Polygon':
+            coordinates = parts[0]
+        elif kind == 'MultiPoint':
+            coordinates = [part[0][0] for part in parts]
+        elif kind == 'MultiLineString':
+            coordinates = [part[0] for part in parts]
+        else:
+            coordinates = parts
+
+        properties = {}
+        for key, (spec, values) in columns.items():
+            value = values[i]
+            if spec['kind'] == 'boolean' and value != MISSING_BOOLEAN:
+                properties[key] = bool(value)
+            elif spec['kind'] == 'integer' and not np.isnan(value):
+                properties[key] = int(value)
+            elif spec['kind'] == 'number' and not np.isnan(value):
+                properties[key] = float(value)
+            elif spec['kind'] == 'string' and value >= 0:
+                properties[key] = spec['dictionary'][value]
+            elif spec['kind'] == 'json' and value >= 0:
+                properties[key] = json.loads(spec['dictionary'][value])
+        features.append({'type': 'Feature', 'geometry': {'type': kind, 'coordinates': coordinates}, 'properties': properties})
+
+    if header['root'] == 'Feature':
+        return features[0]
+    return {'type': 'FeatureCollection', 'features': features}
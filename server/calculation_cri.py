@@ -1,340 +1,234 @@
-import json
+import logging
 from geojson import Feature, FeatureCollection
-from datetime import datetime, timedelta
-from geopy.distance import geodesic
+from datetime import timedelta
 import numpy as np
-from shapely.geometry import Point, mapping, shape, Polygon, GeometryCollection
+from shapely.geometry import mapping, shape, Polygon
 from shapely.ops import unary_union
 from shapely.affinity import rotate
-from shapely.ops import transform
-from pyproj import Transformer
+import shapely
+
+from ais_store import DATA_DIR, get_dataset, get_catalog, to_epoch, from_epoch
+from spatial_index import snapshot_index, haversine_m
+from encounters import ship_domain_rings
+from vo_builder import vo_builder
+from domain_store import get_domain_store
+from projection import project
+from cpa import compute_cpa, tcpa_prime
+from ship_domain import (
+    MODES, encounter_modes, mode_names, calculate_alpha, build_ellipses, ellipse_feature,
+)
+from metrics import stage
+from trajectory import MAX_GAP_SECONDS, interpolated_dataset, interpolated_snapshot, interpolated_ship
+
+log = logging.getLogger(__name__)
 
 def ship_ids(filename):
-    geojson_data_path = './testdata/' + filename + '.geojson'
     try:
-        with open(geojson_data_path, 'r') as file:
-            data = json.load(file)
-            ship_ids = sorted({feature['properties']['SHIP_ID'] for feature in data['features']})
-        return ship_ids
+        return get_catalog(filename).ship_ids()
     except Exception as e:
         raise ValueError(f"An error occurred while loading the GeoJSON data and retrieving ids: {e}")
     
 def load_geojson_selected(filename, recptn_dt_str):
-    geojson_data_path = './testdata/' + filename + '.geojson'
     try:
-        with open(geojson_data_path, 'r') as file:
-            data = json.load(file)
-            if recptn_dt_str:
-                try:
-                    if recptn_dt_str.endswith('Z'):
-                        recptn_dt_str = recptn_dt_str[:-5]
-                    recptn_dt = datetime.fromisoformat(recptn_dt_str)
-                    time_filtered_features = [
-                        feature for feature in data['features']
-                        if datetime.fromisoformat(feature['properties']['RECPTN_DT']) == recptn_dt
-                    ]
-                    data['features'] = time_filtered_features
-                    print(f"Filtered features count: {len(time_filtered_features)}")
-                except ValueError as e:
-                    raise ValueError(f"Invalid datetime format: {e}")
-        return data
-    except ValueError as e:
+        if not recptn_dt_str:
+            dataset = get_dataset(filename)
+            return dataset.feature_collection(range(len(dataset)))
+
+        ts = to_epoch(recptn_dt_str)
+        dataset = get_dataset(filename, start=ts)
+        rows = dataset.rows_at(ts)
+        log.debug("Filtered features count: %d", len(rows))
+        if not len(rows):
+            # Between reported ticks: interpolate every ship whose track covers ts
+            dataset = get_dataset(filename, start=ts - MAX_GAP_SECONDS, end=ts + MAX_GAP_SECONDS)
+            return {**dataset.collection, "features": interpolated_snapshot(dataset, ts)}
+        return dataset.feature_collection(rows)
+    except (OSError, ValueError) as e:
         raise ValueError(f"An error occurred while loading the GeoJSON data: {e}")
 
 def load_geojson_timewindow(filename, ship_id, recptn_dt_str, time_length):
-    geojson_data_path = './testdata/' + filename + '.geojson'
     try:
-        with open(geojson_data_path, 'r') as file:
-            geojson_data = json.load(file)
-        print("GeoJSON file loaded!")
-
-        if recptn_dt_str.endswith('Z'):
-            recptn_dt_str = recptn_dt_str[:-5]
-        recptn_dt = datetime.fromisoformat(recptn_dt_str)
-        end_time = recptn_dt + timedelta(minutes=time_length)
-        print("time window: ", recptn_dt, " ~ ", end_time)
-
-        time_window_features = [
-            feature for feature in geojson_data['features']
-            if str(feature['properties']['SHIP_ID']) == str(ship_id)
-            and recptn_dt <= datetime.fromisoformat(feature['properties']['RECPTN_DT']) <= end_time
-        ]
-        print(f"Filtered features count: {len(time_window_features)}")
-
-        if not time_window_features:
-            return {"error": f"No data found for Ship ID {ship_id} within the time window {recptn_dt} to {end_time}."}
-        
-        return time_window_features
+        start = to_epoch(recptn_dt_str)
+        end = start + time_length * 60
+        dataset = get_dataset(filename, start=start, end=end)
+        log.debug("time window: %s ~ %s min", recptn_dt_str, time_length)
+
+        rows = dataset.ship_rows(ship_id, start, end)
+        log.debug("Filtered features count: %d", len(rows))
+
+        if not len(rows):
+            recptn_dt = from_epoch(start)
+            return {"error": f"No data found for Ship ID {ship_id} within the time window {recptn_dt} to {recptn_dt + timedelta(minutes=time_length)}."}
+
+        return dataset.features(rows)
 
     except Exception as e:
         raise ValueError(f"An error occurred while loading the GeoJSON data: {e}")
     
-def load_geojson_selected_time(filename, ship_id, recptn_dt_str, time_length):
-    geojson_data_path = '../server/testdata/' + filename + '.geojson'
+def load_geojson_selected_time(filename, ship_id, recptn_dt_str, time_length, data_dir=DATA_DIR):
     try:
-        with open(geojson_data_path, 'r') as file:
-            data = json.load(file)
-            if recptn_dt_str:
-                try:
-                    if recptn_dt_str.endswith('Z'):
-                        recptn_dt_str = recptn_dt_str[:-5]
-                    recptn_dt = datetime.fromisoformat(recptn_dt_str)
-                    end_time = recptn_dt + timedelta(minutes=time_length)
-                    time_filtered_features = [
-                        feature for feature in data['features']
-                        if str(feature['properties']['SHIP_ID']) == str(ship_id)
-                        and datetime.fromisoformat(feature['properties']['RECPTN_DT']) == end_time
-                    ]
-                    data['features'] = time_filtered_features
-                    print(f"Filtered features count: {len(time_filtered_features)}")
-                except ValueError as e:
-                    raise ValueError(f"Invalid datetime format: {e}")
-        return data
-    except ValueError as e:
+        if not recptn_dt_str:
+            dataset = get_dataset(filename, data_dir)
+            return dataset.feature_collection(range(len(dataset)))
+
+        end = to_epoch(recptn_dt_str) + time_length * 60
+        dataset = get_dataset(filename, data_dir, start=end)
+        rows = dataset.ship_rows(ship_id, end, end)
+        log.debug("Filtered features count: %d", len(rows))
+        if not len(rows):
+            dataset = get_dataset(filename, data_dir, start=end - MAX_GAP_SECONDS, end=end + MAX_GAP_SECONDS)
+            feature = interpolated_ship(dataset, ship_id, end)
+            return {**dataset.collection, "features": [feature] if feature else []}
+        return dataset.feature_collection(rows)
+    except (OSError, ValueError) as e:
         raise ValueError(f"An error occurred while loading the GeoJSON data: {e}")
 
-def find_closest_ship(filename, own_ship_id, recptn_dt, target_ship_ids=None):
-    geojson_data = load_geojson_selected(filename, recptn_dt)
-    print("GeoJSON data loaded!")
-
-    own_ship = None
-    target_ships = []
-
-    recptn_dt = datetime.strptime(recptn_dt, '%Y-%m-%dT%H:%M:%S')
+def snapshot_dataset(filename, recptn_dt, data_dir=DATA_DIR):
+    """Dataset holding every ship at the datetime: the reported tick, or one interpolated between ticks."""
+    ts = to_epoch(recptn_dt)
+    dataset = get_dataset(filename, data_dir, start=ts)
+    if len(dataset.rows_at(ts)):
+        return dataset
+    return interpolated_dataset(get_dataset(filename, data_dir, start=ts - MAX_GAP_SECONDS, end=ts + MAX_GAP_SECONDS), ts)
 
-    for feature in geojson_data['features']:
-        ship_id = feature['properties']['SHIP_ID']
-        timestamp = datetime.strptime(feature['properties']['RECPTN_DT'], '%Y-%m-%dT%H:%M:%S')
+def split_snapshot(dataset, own_ship_id, recptn_dt):
+    rows = dataset.rows_at(to_epoch(recptn_dt))
+    own_code = dataset.code_of(own_ship_id)
+    is_own = dataset.ship_code[rows] == own_code
 
-        if str(ship_id) == str(own_ship_id) and timestamp == recptn_dt:
-            own_ship = feature
-        elif not target_ship_ids or str(ship_id) in map(str, target_ship_ids):
-            target_ships.append(feature)
-
-    if not own_ship:
+    if own_code is None or not is_own.any():
         raise ValueError("Own ship not found at the given datetime")
 
-    own_ship_coords = (own_ship['geometry']['coordinates'][1], own_ship['geometry']['coordinates'][0])  # (latitude, longitude)
-    print("Own ship coordinates:", own_ship_coords)
+    return int(rows[is_own][0]), rows[~is_own]
+
+@stage('target_search')
+def find_closest_ship(filename, own_ship_id, recptn_dt, target_ship_ids=None):
+    dataset = snapshot_dataset(filename, recptn_dt)
+    own_row, target_rows = split_snapshot(dataset, own_ship_id, recptn_dt)
 
-    closest_ship = None
+    own_lon, own_lat = dataset.lon[own_row], dataset.lat[own_row]
+    log.debug("Own ship coordinates: (%s, %s)", own_lat, own_lon)
 
     # Case 1: No target ship IDs provided, find the closest ship among all target_ships
     if not target_ship_ids:
-        if target_ships:
-            closest_ship = min(
-                target_ships,
-                key=lambda s: geodesic(own_ship_coords, (s['geometry']['coordinates'][1], s['geometry']['coordinates'][0])).meters
-            )
-        else:
-            print("Error: No target ships found in the dataset.")
+        closest_rows, _ = snapshot_index(dataset, to_epoch(recptn_dt)).nearest(own_lon, own_lat, k=1, exclude_rows=[own_row])
+        if not len(closest_rows):
+            log.warning("No target ships found in the dataset.")
             raise ValueError("No target ships found.")
+        closest_row = closest_rows[0]
 
-    # Case 2: Exactly one target ship ID provided, retrieve its feature
-    elif len(target_ship_ids) == 1:
-        target_ship_id = str(target_ship_ids[0])
-        closest_ship = next(
-            (ship for ship in target_ships if str(ship['properties']['SHIP_ID']) == target_ship_id),
-            None
-        )
-        if closest_ship is None:
-            print(f"Error: Target ship with ID {target_ship_id} not found in the dataset.")
-            raise ValueError(f"Target ship with ID {target_ship_id} not found.")
-
-    # Case 3: Multiple target ship IDs provided, find the closest one
     else:
-        filtered_ships = [ship for ship in target_ships if str(ship['properties']['SHIP_ID']) in map(str, target_ship_ids)]
-        
-        if not filtered_ships:
-            print("Error: None of the provided target ship IDs exist in the dataset.")
-            raise ValueError("No matching target ships found for the given target_ship_ids.")
+        target_codes = [dataset.code_of(ship_id) for ship_id in target_ship_ids]
+        target_rows = target_rows[np.isin(dataset.ship_code[target_rows], [code for code in target_codes if code is not None])]
 
-        closest_ship = min(
-            filtered_ships,
-            key=lambda s: geodesic(own_ship_coords, (s['geometry']['coordinates'][1], s['geometry']['coordinates'][0])).meters
-        )
+        # Case 2: Exactly one target ship ID provided, retrieve its feature
+        if len(target_ship_ids) == 1 and not len(target_rows):
+            log.warning("Target ship with ID %s not found in the dataset.", target_ship_ids[0])
+            raise ValueError(f"Target ship with ID {target_ship_ids[0]} not found.")
 
-    print("Selected target ship coordinates:", closest_ship['geometry']['coordinates'])
-    return own_ship, closest_ship
+        # Case 3: Multiple target ship IDs provided, find the closest one
+        if not len(target_rows):
+            log.warning("None of the provided target ship IDs exist in the dataset.")
+            raise ValueError("No matching target ships found for the given target_ship_ids.")
 
-def find_three_closest_ships(filename, own_ship_id, recptn_dt_str):
-    if recptn_dt_str.endswith('Z'):
-        recptn_dt_str = recptn_dt_str[:-5]
+        distances = haversine_m(own_lon, own_lat, dataset.lon[target_rows], dataset.lat[target_rows])
+        closest_row = target_rows[np.argmin(distances)]
 
-    geojson_data = load_geojson_selected(filename, recptn_dt_str)
-    print("GeoJSON data loaded!")
+    own_ship, closest_ship = dataset.feature(own_row), dataset.feature(closest_row)
+    log.debug("Selected target ship coordinates: %s", closest_ship['geometry']['coordinates'])
+    return own_ship, closest_ship
 
-    own_ship = None
-    target_ships = []
+@stage('target_search')
+def find_three_closest_ships(filename, own_ship_id, recptn_dt_str, k=3, max_range_m=None, data_dir=DATA_DIR):
+    dataset = snapshot_dataset(filename, recptn_dt_str, data_dir)
+    own_row, _ = split_snapshot(dataset, own_ship_id, recptn_dt_str)
 
-    recptn_dt = datetime.strptime(recptn_dt_str, '%Y-%m-%dT%H:%M:%S')
+    own_lon, own_lat = dataset.lon[own_row], dataset.lat[own_row]
+    log.debug("Own ship coordinates: (%s, %s)", own_lat, own_lon)
 
-    for feature in geojson_data['features']:
-        ship_id = feature['properties']['SHIP_ID']
-        timestamp = datetime.strptime(feature['properties']['RECPTN_DT'], '%Y-%m-%dT%H:%M:%S')
-        
-        if str(ship_id) == str(own_ship_id) and timestamp == recptn_dt:
-            own_ship = feature
-        else:
-            target_ships.append(feature)
+    index = snapshot_index(dataset, to_epoch(recptn_dt_str))
+    closest_rows, _ = index.nearest(own_lon, own_lat, k=k, max_range_m=max_range_m, exclude_rows=[own_row])
 
-    if not own_ship:
-        raise ValueError("Own ship not found at the given datetime")
+    three_closest_ships = dataset.features(closest_rows)
+    log.debug("Three closest ships found.")
 
-    own_ship_coords = (own_ship['geometry']['coordinates'][1], own_ship['geometry']['coordinates'][0])  # (latitude, longitude)
-    print("Own ship coordinates:", own_ship_coords)
-
-    sorted_ships = sorted(
-        target_ships,
-        key=lambda s: geodesic(
-            own_ship_coords,
-            (s['geometry']['coordinates'][1], s['geometry']['coordinates'][0])
-        ).meters
-    )
+    return three_closest_ships
 
-    three_closest_ships = sorted_ships[:3]
-    print("Three closest ships found.")
+@stage('target_search')
+def find_ships_within(filename, own_ship_id, recptn_dt_str, range_m):
+    dataset = snapshot_dataset(filename, recptn_dt_str)
+    own_row, _ = split_snapshot(dataset, own_ship_id, recptn_dt_str)
 
-    return three_closest_ships
+    index = snapshot_index(dataset, to_epoch(recptn_dt_str))
+    rows, _ = index.within(dataset.lon[own_row], dataset.lat[own_row], range_m, exclude_rows=[own_row])
+    return dataset.features(rows)
 
 def determine_encounter_mode(own_ship, target_ship):
-    own_cog = own_ship['properties']['COG']
-    relative_bearing = (own_cog - target_ship['properties']['COG']) % 360
-    
-    if 112.5 <= relative_bearing < 247.5:
-        return 'overtaking'
-    elif 5 <= relative_bearing < 112.5 or 247.5 <= relative_bearing < 355:
-        return 'crossing'
-    else:
-        return 'head_on'
-
-def compute_k_factors(L, v):
-    k_AD = L * np.exp(0.3591 * np.log(v) + 0.0952)
-    k_DT = L * np.exp(0.5441 * np.log(v) - 0.0795)
-    return k_AD, k_DT
-
-def compute_R_factors(L, k_AD, k_DT, s):
-    R_fore = (L + (1 + s) * 0.67 * np.sqrt(k_AD**2 + (k_DT / 2)**2))
-    R_aft = (L + 0.67 * np.sqrt(k_AD**2 + (k_DT / 2)**2))
-    R_starb = (0.2 + k_DT) * L
-    R_port = (0.2 + 0.75 * k_DT) * L
-    return R_fore, R_aft, R_starb, R_port
-
-def calculate_alpha(own_ship_position, target_ship_position, own_ship_cog):
-    dx = target_ship_position[0] - own_ship_position[0]
-    dy = target_ship_position[1] - own_ship_position[1]
-    relative_bearing = np.arctan2(dy, dx)
-    
-    own_ship_cog_rad = np.deg2rad(own_ship_cog)
-    alpha = relative_bearing - own_ship_cog_rad
-    return alpha
+    return MODES[int(encounter_modes(own_ship['properties']['COG'], target_ship['properties']['COG']))]
+
+def domain_ellipses(own_ship_features, target_ship_features):
+    own = np.array([
+        [*feature['geometry']['coordinates'][:2], feature['properties']['COG'], feature['properties']['SOG'], feature['properties']['LEN_PRED']]
+        for feature in own_ship_features
+    ], dtype=np.float64).reshape(-1, 5)
+    target = np.array([
+        [*feature['geometry']['coordinates'][:2], feature['properties']['COG'], feature['properties']['SOG']]
+        for feature in target_ship_features
+    ], dtype=np.float64).reshape(-1, 4)
+
+    lon, lat, cog, sog, L = own.T
+    target_lon, target_lat, target_cog, target_sog = target.T
+
+    modes = encounter_modes(cog, target_cog)
+    alpha = calculate_alpha((lon, lat), (target_lon, target_lat), cog)
+    rings = build_ellipses(L, sog, cog, lon, lat, target_sog, alpha, modes)
+
+    ellipses = [
+        ellipse_feature(ring, feature['properties']['COG'], mode)
+        for ring, feature, mode in zip(rings, own_ship_features, mode_names(modes))
+    ]
+    return ellipses, rings
 
 def create_ellipse(filename, own_ship_id, recptn_dt, target_ship_ids=None, mode=None):
-    KNOTS_TO_MPS = 0.514444
-    METER_TO_DEGREES = 1 / 111320
-
-    target_ship_ids = target_ship_ids
     own_ship_feature, target_ship_feature = find_closest_ship(filename, own_ship_id, recptn_dt, target_ship_ids)
-
-    own_ship_position = own_ship_feature['geometry']['coordinates']
-    own_ship_cog = own_ship_feature['properties']['COG']
-    target_ship_position = target_ship_feature['geometry']['coordinates']
-
-    L = own_ship_feature['properties']['LEN_PRED']
-    v = own_ship_feature['properties']['SOG'] * KNOTS_TO_MPS
-    vt = target_ship_feature['properties']['SOG'] * KNOTS_TO_MPS
-    
-    k_AD, k_DT = compute_k_factors(L, v)
-    
-    alpha = calculate_alpha(own_ship_position, target_ship_position, own_ship_cog)
-    
-    mode = determine_encounter_mode(own_ship_feature, target_ship_feature)
-    print(mode)
-    
-    if mode == 'head_on':
-        s = 2 - (v - vt) / v
-    elif mode == 'crossing':
-        s = 2 - alpha / np.pi
-    elif mode == 'overtaking':
-        s = 1
+    ellipses, _ = domain_ellipses([own_ship_feature], [target_ship_feature])
+    return ellipses[0]
+
+@stage('ellipse')
+def window_ellipses(filename, ship_id, recptn_dt_str, time_length=30):
+    start = to_epoch(recptn_dt_str)
+    end = start + time_length * 60
+    dataset = get_dataset(filename, start=start, end=end)
+
+    store = get_domain_store(dataset)
+    own_rows = dataset.ship_rows(ship_id, start, end)
+    precomputed = store.ellipses(own_rows) if store is not None else None
+    if precomputed is not None:
+        rings, modes = precomputed
     else:
-        raise ValueError("Invalid mode. Choose from 'head_on', 'crossing', or 'overtaking'.")
-    
-    R_fore, R_aft, R_starb, R_port = compute_R_factors(L, k_AD, k_DT, s)
-    print("fore: ", R_fore, ", aft: ", R_aft, ", starb: ", R_starb, ", port: ", R_port)
-
-    a = (abs(R_fore) + abs(R_aft)) / 2
-    b = (abs(R_starb) + abs(R_port)) / 2
-    
-    delta_a = abs(R_fore) - a
-    delta_b = abs(R_starb) - b
-    
-    lat = own_ship_position[1]
-    a_deg = a * METER_TO_DEGREES / np.cos(np.radians(lat))
-    b_deg = b * METER_TO_DEGREES / np.cos(np.radians(lat))
-    delta_a_deg = delta_a * METER_TO_DEGREES / np.cos(np.radians(lat))
-    delta_b_deg = delta_b * METER_TO_DEGREES / np.cos(np.radians(lat))
-
-    v_deg = v * METER_TO_DEGREES / np.cos(np.radians(lat))
-    vt_deg = vt * METER_TO_DEGREES / np.cos(np.radians(lat))
-
-    ellipse = {
-        "type": "Feature",
-        "geometry": {
-            "type": "Polygon",
-            "coordinates": [[]]
-        },
-        "properties": {
-            "angle": own_ship_cog,
-            "mode": mode
-        }
-    }
-    
-    num_points = 100
-    cog_rad = np.radians(own_ship_cog)
-
-
-    for i in range(num_points):
-        theta = 2.0 * np.pi * float(i) / float(num_points)
-        x = a_deg * np.cos(theta)
-        y = b_deg * np.sin(theta)
-        
-        x_rot = x * np.cos(cog_rad) - y * np.sin(cog_rad)
-        y_rot = x * np.sin(cog_rad) + y * np.cos(cog_rad)
-
-        ellipse["geometry"]["coordinates"][0].append([
-            own_ship_position[0] + x_rot - delta_a_deg,
-            own_ship_position[1] + y_rot - delta_b_deg
-        ])
-    
-    ellipse["geometry"]["coordinates"][0].append(ellipse["geometry"]["coordinates"][0][0])
-    
-    return ellipse
+        encounters, rings = ship_domain_rings(dataset, ship_id, start, end)
+        own_rows, modes = encounters['own_rows'], encounters['mode']
 
+    ellipses = [
+        ellipse_feature(ring, cog, mode)
+        for ring, cog, mode in zip(rings, dataset.cog[own_rows].tolist(), mode_names(modes))
+    ]
+    return dataset.features(own_rows), ellipses, rings
 
 def ownship_ellipses(filename, ship_id, recptn_dt_str, time_length=30):
-    timewindow_features = load_geojson_timewindow(filename, ship_id, recptn_dt_str, time_length)
+    timewindow_features, ellipses, _ = window_ellipses(filename, ship_id, recptn_dt_str, time_length)
 
     features = []
-    own_ship_id = ship_id
 
-    for feature in timewindow_features:
-        recptn_dt = feature['properties']['RECPTN_DT']
-        ship_position = Point(feature['geometry']['coordinates'])
-        cog = feature['properties']['COG']
-
-        ellipse = create_ellipse(filename, own_ship_id, recptn_dt, target_ship_ids=None, mode=None)
+    for feature, ellipse in zip(timewindow_features, ellipses):
         features.append(ellipse)
-
-        encounter_mode = ellipse['properties']['mode']
-
         features.append({
             "type": "Feature",
-            "geometry": mapping(ship_position),
+            "geometry": feature['geometry'],
             "properties": {
                 "SHIP_ID": ship_id,
-                "COG": cog,
-                "MODE": encounter_mode
+                "COG": feature['properties']['COG'],
+                "MODE": ellipse['properties']['mode']
             }
         })
 
@@ -343,57 +237,41 @@ def ownship_ellipses(filename, ship_id, recptn_dt_str, time_length=30):
         "features": features
     }
 
-    print(output)
+    log.debug("Own ship domain: %d ellipses", len(ellipses))
 
     return output
 
-def compute_vo_region(filename, ship_ids, recptn_dt_str, time_length=30):
-    vo_regions = []
-    features = []
-
-    if recptn_dt_str.endswith('Z'):
-        recptn_dt_str = recptn_dt_str[:-5]
+def vo_from_pieces(ship_ids, vo_pieces):
+    features = [
+        Feature(geometry=mapping(vo_region_single), properties={"ship_id": ship_id})
+        for ship_id, vo_region_single in zip(ship_ids, vo_pieces)
+    ]
 
-    for ship_id in ship_ids:
-        timewindow_features = load_geojson_timewindow(filename, ship_id, recptn_dt_str, time_length)
-
-        ellipses = []
-
-        for feature in timewindow_features:
-            print(f"Feature: {feature}")
-            print(f"Feature Type: {type(feature)}")
+    if vo_pieces:
+        with stage('union'):
+            vo_region = unary_union(vo_pieces)
+        log.debug("Convex Hull: Make multiple ships VO region")
+    else:
+        vo_region = None
 
-            recptn_dt = feature['properties']['RECPTN_DT']
-            ellipse_data = create_ellipse(filename, ship_id, recptn_dt, target_ship_ids=None, mode=None)
-            ellipse = shape(ellipse_data['geometry'])
-            ellipses.append(ellipse)
+    vo_geojson = FeatureCollection(features)
 
-        merged_shape = unary_union(ellipses)
+    return vo_region, vo_geojson
 
-        if merged_shape.geom_type == 'MultiPolygon':
-            merged_shape = merged_shape.convex_hull
-            print("Convex Hull: Make single ship VO region")
+@stage('vo_region')
+def compute_vo_region(filename, ship_ids, recptn_dt_str, time_length=30, data_dir=DATA_DIR):
+    start = to_epoch(recptn_dt_str)
+    end = start + time_length * 60
+    dataset = get_dataset(filename, data_dir, start=start, end=end)
 
-        vo_region_single = merged_shape.buffer(0.005).buffer(-0.001)
-        vo_regions.append(vo_region_single)
+    vo_regions = [vo_builder.ship_piece(dataset, ship_id, start, end) for ship_id in ship_ids]
 
-        feature_with_id = Feature(geometry=mapping(vo_region_single), properties={"ship_id": ship_id})
-        print("Single VO region feature: ", feature_with_id)
-        features.append(feature_with_id)
+    return vo_from_pieces(ship_ids, vo_regions)
 
-    if vo_regions:
-        vo_region = unary_union(vo_regions)
-        print("Convex Hull: Make multiple ships VO region")
-    else:
-        vo_region = None
-    
-    vo_geojson = FeatureCollection(features)
-        
-    return vo_region, vo_geojson
-
-def compute_v_region(filename, own_ship_id, recptn_dt_str, time_length=30):
-    geojson_data = load_geojson_selected_time(filename, own_ship_id, recptn_dt_str, 0)
-    print("geojson data loaded!")
+@stage('v_region')
+def compute_v_region(filename, own_ship_id, recptn_dt_str, time_length=30, data_dir=DATA_DIR):
+    geojson_data = load_geojson_selected_time(filename, own_ship_id, recptn_dt_str, 0, data_dir)
+    log.debug("geojson data loaded!")
 
     METER_TO_DEGREES = 1 / 111320
     
@@ -427,92 +305,73 @@ def compute_v_region(filename, own_ship_id, recptn_dt_str, time_length=30):
     
     return v_region, v_geojson
 
-def compute_tcr(vo_region, v_region, vo_geojson, v_geojson):
-    transformer = Transformer.from_crs("epsg:4326", "epsg:3857", always_xy=True)
-    
-    def transform_to_meters(geometry):
-        return transform(transformer.transform, geometry)
-    
-    def calculate_area_km2(geojson_obj):
-        if geojson_obj['type'] == 'FeatureCollection':
-            geometries = [shape(feature['geometry']) for feature in geojson_obj['features']]
-            geometry = GeometryCollection(geometries)
-        elif geojson_obj['type'] == 'Feature':
-            geometry = shape(geojson_obj['geometry'])
-        else:
-            geometry = shape(geojson_obj)
-
-        geometry_meters = transform_to_meters(geometry)
-        area_m2 = geometry_meters.area
-        return area_m2 / 1e6
-    
-    vo_area = calculate_area_km2(vo_geojson)
-    v_area = calculate_area_km2(v_geojson)
-    
-    intersection_geometry = vo_region.intersection(v_region)
-    intersection_geometry_meters = transform_to_meters(intersection_geometry)
-    intersection_area = intersection_geometry_meters.area / 1e6
-    
-    if intersection_area > v_area:
-        print("Warning: Intersection area is greater than V area, which indicates a precision issue.")
-        intersection_area = min(intersection_area, v_area)
-    
-    tcr = intersection_area / v_area
-    return tcr, vo_area, v_area
+def geojson_geometries(geojson_obj):
+    if geojson_obj['type'] == 'FeatureCollection':
+        return [shape(feature['geometry']) for feature in geojson_obj['features']]
+    elif geojson_obj['type'] == 'Feature':
+        return [shape(geojson_obj['geometry'])]
+    else:
+        return [shape(geojson_obj)]
 
-def compute_tcpa(filename, own_ship_id, recptn_dt_str, target_ship_ids=None):
-    KNOTS_TO_MPS = 0.514444
-    DEGREES_TO_METERS = 111139
+@stage('tcr')
+def compute_tcr(vo_region, v_region, vo_geojson, v_geojson, origin=None):
+    # Areas are measured in a Lambert azimuthal equal-area projection centred on the own ship
+    if origin is None:
+        origin = v_region.centroid.coords[0]
 
-    if recptn_dt_str.endswith('Z'):
-        recptn_dt_str = recptn_dt_str[:-5]
-    
-    target_ship_ids = target_ship_ids
-    own_ship_feature, target_ship_feature = find_closest_ship(filename, own_ship_id, recptn_dt_str, target_ship_ids)
+    vo_geometries = geojson_geometries(vo_geojson)
+    v_geometries = geojson_geometries(v_geojson)
+    projected = project([*vo_geometries, *v_geometries, vo_region, v_region], *origin)
 
-    own_ship_position = own_ship_feature['geometry']['coordinates']
-    own_ship_cog = own_ship_feature['properties']['COG']
-    target_ship_position = target_ship_feature['geometry']['coordinates']
-    target_ship_cog = target_ship_feature['properties']['COG']
+    vo_area = float(shapely.area(projected[:len(vo_geometries)]).sum()) / 1e6
+    v_area = float(shapely.area(projected[len(vo_geometries):-2]).sum()) / 1e6
 
-    v = own_ship_feature['properties']['SOG'] * KNOTS_TO_MPS
-    vt = target_ship_feature['properties']['SOG'] * KNOTS_TO_MPS
+    intersection_area = shapely.intersection(projected[-2], projected[-1]).area / 1e6
+
+    if intersection_area > v_area:
+        log.warning("Intersection area is greater than V area, which indicates a precision issue.")
+        intersection_area = min(intersection_area, v_area)
+
+    tcr = intersection_area / v_area
+    return tcr, vo_area, v_area
 
-    dx = target_ship_position[0] - own_ship_position[0]
-    dy = target_ship_position[1] - own_ship_position[1]
-    distance = np.sqrt(dx**2 + dy**2)
+@stage('tcpa')
+def compute_target_cpa(filename, own_ship_id, recptn_dt_str, target_ship_ids=None):
+    """CPA values of every target at the timestamp, closest first (the 3 closest when none are given)."""
+    dataset = snapshot_dataset(filename, recptn_dt_str)
+    own_row, target_rows = split_snapshot(dataset, own_ship_id, recptn_dt_str)
 
-    distance_m = distance * DEGREES_TO_METERS
+    if target_ship_ids:
+        target_codes = [dataset.code_of(ship_id) for ship_id in target_ship_ids]
+        target_rows = target_rows[np.isin(dataset.ship_code[target_rows], [code for code in target_codes if code is not None])]
+    else:
+        index = snapshot_index(dataset, to_epoch(recptn_dt_str))
+        target_rows, _ = index.nearest(dataset.lon[own_row], dataset.lat[own_row], k=3, exclude_rows=[own_row])
 
-    v_x = v * np.cos(np.deg2rad(own_ship_cog))
-    v_y = v * np.sin(np.deg2rad(own_ship_cog))
-    vt_x = vt * np.cos(np.deg2rad(target_ship_cog))
-    vt_y = vt * np.sin(np.deg2rad(target_ship_cog))
+    if not len(target_rows):
+        raise ValueError("No target ships found.")
 
-    relative_velocity_x = v_x - vt_x
-    relative_velocity_y = v_y - vt_y
-    relative_velocity = np.sqrt(relative_velocity_x**2 + relative_velocity_y**2)
+    cpa = compute_cpa(
+        (dataset.lon[own_row], dataset.lat[own_row]), dataset.sog[own_row], dataset.cog[own_row],
+        dataset.lon[target_rows], dataset.lat[target_rows], dataset.sog[target_rows], dataset.cog[target_rows],
+    )
+    order = np.argsort(haversine_m(dataset.lon[own_row], dataset.lat[own_row], dataset.lon[target_rows], dataset.lat[target_rows]), kind='stable')
 
-    alpha = calculate_alpha(own_ship_position, target_ship_position, own_ship_cog)
-    tcpa_sec = distance_m * np.cos(alpha - np.pi) / relative_velocity
+    cpa = {key: values[order] for key, values in cpa.items()}
+    cpa['ship_ids'] = [dataset.ship_table[code] for code in dataset.ship_code[target_rows[order]]]
+    return cpa
 
-    tcpa = tcpa_sec / 60
+def compute_tcpa(filename, own_ship_id, recptn_dt_str, target_ship_ids=None):
+    own_ship_feature, target_ship_feature = find_closest_ship(filename, own_ship_id, recptn_dt_str, target_ship_ids)
 
-    return tcpa
+    cpa = compute_cpa(
+        own_ship_feature['geometry']['coordinates'], own_ship_feature['properties']['SOG'], own_ship_feature['properties']['COG'],
+        [target_ship_feature['geometry']['coordinates'][0]], [target_ship_feature['geometry']['coordinates'][1]],
+        [target_ship_feature['properties']['SOG']], [target_ship_feature['properties']['COG']],
+    )
+    return cpa['tcpa'][0]
 
 def compute_vo_cri(tcr, tcpa, t1, time_length=30):
-    if t1.endswith('Z'):
-        t1 = t1[:-5]
-    t1 = datetime.fromisoformat(t1)
-    t2 = t1 + timedelta(minutes=time_length)
-    
-    tcpa_seconds = tcpa * 60
-    
-    if tcpa_seconds < 0:
-        tcpa_prime = 1
-    elif tcpa_seconds > (t2 - t1).total_seconds():
-        tcpa_prime = 0
-    else:
-        tcpa_prime = (t2 - t1 - timedelta(seconds=tcpa_seconds)) / (t2 - t1)
-    
-    return tcr * tcpa_prime
+    # tcpa may hold one value per target; the most urgent one drives the CRI.
+    # Only the window length matters for the weighting, t1 is kept for callers.
+    return float(tcr * np.max(tcpa_prime(tcpa, time_length)))
@@ -0,0 +1,47 @@
+import argparse
+import glob
+import os
+import time
+
+from ais_store import DATA_DIR, binary_path, dataset_path, load_geojson_dataset
+
+
+def convert(filename, data_dir=DATA_DIR, float32=False):
+    source = dataset_path(filename, data_dir)
+    target = binary_path(filename, data_dir)
+
+    started = time.perf_counter()
+    dataset = load_geojson_dataset(source, filename)
+    loaded = time.perf_counter()
+
+    stat = os.stat(source)
+    dataset.save(target, float32=float32, source={
+        'path': os.path.basename(source),
+        'mtime_ns': stat.st_mtime_ns,
+        'size': stat.st_size,
+    })
+    print(f"{filename}: {len(dataset)} rows, {len(dataset.ship_table)} ships "
+          f"(parsed in {loaded - started:.2f}s, written in {time.perf_counter() - loaded:.2f}s) -> {target}")
+    return target
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert resampled AIS GeoJSON files into the memory-mappable binary format.")
+    parser.add_argument('files', nargs='*', help="File names without extension (default: every *_resample10T_* file in the data directory)")
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    parser.add_argument('--float32', action='store_true', help="Store SOG/COG/LEN_PRED as float32 (coordinates stay float64)")
+    args = parser.parse_args()
+
+    files = args.files or sorted(
+        os.path.basename(path)[:-len('.geojson')]
+        for path in glob.glob(os.path.join(args.data_dir, '*_resample10T_*.geojson'))
+    )
+    if not files:
+        parser.error(f"No GeoJSON files found in {args.data_dir}")
+
+    for filename in files:
+        convert(filename, args.data_dir, args.float32)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import numpy as np
+
+from ship_domain import KNOTS_TO_MPS
+
+DEGREES_TO_METERS = 111139
+# Relative speeds below this (m/s) are treated as no relative motion
+MIN_RELATIVE_SPEED = 1e-6
+
+
+def compute_cpa(own_position, own_sog, own_cog, target_lon, target_lat, target_sog, target_cog):
+    """TCPA (minutes), DCPA (m), range (m) and relative bearing (degrees) of many targets in one call.
+
+    Positions are placed in a local east/north frame in meters around the
+    own ship. COG is clockwise from north and the bearing clockwise from the
+    own heading. With r the target's relative position and w its velocity
+    relative to the own ship, TCPA = -(r . w) / |w|^2 and DCPA = |r + w * TCPA|;
+    a negative TCPA means the closest approach has passed. Ships with (nearly) equal velocities
+    keep their range, so their TCPA is 0 and their DCPA the current range.
+    Every argument broadcasts, e.g. (candidates, 1) own courses against
+    (targets,) target arrays.
+    """
+    target_lon, target_lat, target_sog, target_cog = (
+        np.asarray(value, dtype=np.float64) for value in (target_lon, target_lat, target_sog, target_cog)
+    )
+    own_sog, own_cog = np.asarray(own_sog, dtype=np.float64), np.asarray(own_cog, dtype=np.float64)
+
+    east = (target_lon - own_position[0]) * DEGREES_TO_METERS * np.cos(np.radians(own_position[1]))
+    north = (target_lat - own_position[1]) * DEGREES_TO_METERS
+    distance_m = np.hypot(east, north)
+
+    v = own_sog * KNOTS_TO_MPS
+    vt = target_sog * KNOTS_TO_MPS
+    relative_east = vt * np.sin(np.radians(target_cog)) - v * np.sin(np.radians(own_cog))
+    relative_north = vt * np.cos(np.radians(target_cog)) - v * np.cos(np.radians(own_cog))
+    relative_speed2 = relative_east ** 2 + relative_north ** 2
+
+    moving = relative_speed2 > MIN_RELATIVE_SPEED ** 2
+    tcpa_sec = np.divide(-(east * relative_east + north * relative_north), relative_speed2,
+                         out=np.zeros(np.broadcast(east, relative_speed2).shape), where=moving)
+    dcpa = np.hypot(east + relative_east * tcpa_sec, north + relative_north * tcpa_sec)
+
+    return {
+        'tcpa': tcpa_sec / 60,
+        'dcpa': dcpa,
+        'range_m': distance_m,
+        'bearing': np.mod(np.degrees(np.arctan2(east, north)) - own_cog, 360),
+    }
+
+
+def tcpa_prime(tcpa, time_length=30):
+    """TCPA weight in [0, 1]: 1 at the closest point now, falling to 0 at the window's end.
+
+    A negative TCPA means the closest point has passed and the range is
+    opening, so a receding target weighs 0 like one beyond the window.
+    """
+    window = time_length * 60
+    tcpa_seconds = np.asarray(tcpa, dtype=np.float64) * 60
+    return np.where(tcpa_seconds < 0, 0.0, np.where(tcpa_seconds > window, 0.0, (window - tcpa_seconds) / window))
+
+
+def governing_target(tcpa, time_length=30):
+    """Index of the target whose TCPA weighs most in the CRI (the first one on ties)."""
+    return int(np.argmax(np.atleast_1d(tcpa_prime(tcpa, time_length))))
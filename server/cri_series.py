@@ -0,0 +1,54 @@
+from ais_store import get_dataset, to_epoch, format_epoch
+from calculation_cri import (
+    find_three_closest_ships, vo_from_pieces, compute_v_region, compute_tcr, compute_target_cpa, compute_vo_cri,
+)
+from cpa import governing_target
+from vo_builder import vo_builder
+
+
+def tick_cri(filename, ship_id, ts, time_length=30, target_ship_ids=None):
+    """CRI, TCR, TCPA, VO area and V area of the own ship at one tick (an 'error' entry when it fails)."""
+    window = time_length * 60
+    dataset = get_dataset(filename, start=ts, end=ts + window)
+    recptn_dt_str = str(format_epoch(ts))
+    try:
+        targets = target_ship_ids
+        if not targets:
+            targets = [ship['properties']['SHIP_ID'] for ship in find_three_closest_ships(filename, ship_id, recptn_dt_str)]
+        targets = tuple(targets)
+
+        pieces = [vo_builder.ship_piece(dataset, target, ts, ts + window) for target in targets]
+        vo_region, vo_geojson = vo_from_pieces(targets, pieces)
+        v_region, v_geojson = compute_v_region(filename, ship_id, recptn_dt_str, time_length)
+
+        tcr, vo_area, v_area = compute_tcr(vo_region, v_region, vo_geojson, v_geojson)
+        cpa = compute_target_cpa(filename, ship_id, recptn_dt_str, targets)
+        tcpa = cpa['tcpa'][governing_target(cpa['tcpa'], time_length)]
+        cri = compute_vo_cri(tcr, cpa['tcpa'], recptn_dt_str, time_length)
+    except Exception as e:
+        return {'datetime': recptn_dt_str, 'error': str(e)}
+
+    return {
+        'datetime': recptn_dt_str,
+        'targets': list(targets),
+        'cri': round(float(cri), 5),
+        'tcr': round(float(tcr), 7),
+        'tcpa': round(float(tcpa), 5),
+        'vo_area': round(float(vo_area), 5),
+        'v_area': round(float(v_area), 5),
+    }
+
+
+def cri_series(filename, ship_id, start_str, end_str, time_length=30, target_ship_ids=None):
+    """CRI, TCR, TCPA, VO area and V area for every tick of the own ship between start and end.
+
+    Per-step ellipses and window unions come from the shared VO builder, so
+    consecutive, overlapping windows reuse each other's work.
+    """
+    start, end = to_epoch(start_str), to_epoch(end_str)
+    if end < start:
+        raise ValueError("End datetime must not be before start datetime")
+    dataset = get_dataset(filename, start=start, end=end)
+
+    own_rows = dataset.ship_rows(ship_id, start, end)
+    return [tick_cri(filename, ship_id, ts, time_length, target_ship_ids) for ts in dataset.timestamp[own_rows].tolist()]
@@ -0,0 +1,136 @@
+import json
+import logging
+import os
+import shutil
+import threading
+
+import numpy as np
+import shapely
+
+from ais_store import DATA_DIR
+from partitions import PARTITIONED
+
+log = logging.getLogger(__name__)
+
+STORE_SUFFIX = '.precomputed'
+STORE_FORMAT_VERSION = 1
+
+
+def store_path(filename, data_dir=DATA_DIR):
+    return os.path.join(data_dir, filename + STORE_SUFFIX)
+
+
+class DomainStore:
+    """Precomputed ship domains and VO pieces, indexed by dataset row.
+
+    ``rings[row]`` / ``modes[row]`` hold the domain ellipse of the ship at
+    that row (valid where ``has_ellipse[row]``). For each precomputed window
+    length L, the VO piece of the window starting at ``row`` is the WKB slice
+    ``vo[L].blob[offsets[row]:offsets[row + 1]]`` (empty when missing).
+    """
+
+    def __init__(self, path):
+        with open(os.path.join(path, 'meta.json'), 'r') as file:
+            self.meta = json.load(file)
+        if self.meta.get('format_version') != STORE_FORMAT_VERSION:
+            raise ValueError(f"Unsupported precomputed store version in {path}")
+
+        def load(name):
+            return np.load(os.path.join(path, name + '.npy'), mmap_mode='r')
+
+        self.path = path
+        self.fingerprint = self.meta['fingerprint']
+        self.has_ellipse = load('has_ellipse')
+        self.rings = load('rings')
+        self.modes = load('modes')
+        self.vo = {}
+        for time_length in self.meta['time_lengths']:
+            offsets = load(f'vo_{time_length}_offsets')
+            blob = np.memmap(os.path.join(path, f'vo_{time_length}.wkb'), dtype=np.uint8, mode='r') if offsets[-1] else np.empty(0, np.uint8)
+            self.vo[int(time_length)] = (offsets, blob)
+
+    def ellipses(self, rows):
+        """(rings, modes) for rows, or None unless every row was precomputed."""
+        rows = np.asarray(rows, dtype=np.int64)
+        if not len(rows) or not np.all(self.has_ellipse[rows]):
+            return None
+        return np.asarray(self.rings[rows], dtype=np.float64), np.asarray(self.modes[rows])
+
+    def vo_piece(self, row, time_length):
+        entry = self.vo.get(int(time_length))
+        if entry is None:
+            return None
+        offsets, blob = entry
+        lo, hi = offsets[row], offsets[row + 1]
+        if lo == hi:
+            return None
+        return shapely.from_wkb(bytes(blob[lo:hi]))
+
+    @staticmethod
+    def write(path, dataset, has_ellipse, rings, modes, vo, num_points):
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+
+        np.save(os.path.join(tmp_path, 'has_ellipse.npy'), has_ellipse)
+        np.save(os.path.join(tmp_path, 'rings.npy'), rings)
+        np.save(os.path.join(tmp_path, 'modes.npy'), modes)
+        for time_length, pieces in vo.items():
+            sizes = np.array([len(piece) for piece in pieces], dtype=np.int64)
+            np.save(os.path.join(tmp_path, f'vo_{time_length}_offsets.npy'), np.concatenate(([0], np.cumsum(sizes))))
+            with open(os.path.join(tmp_path, f'vo_{time_length}.wkb'), 'wb') as file:
+                for piece in pieces:
+                    file.write(piece)
+
+        with open(os.path.join(tmp_path, 'meta.json'), 'w') as file:
+            json.dump({
+                'format_version': STORE_FORMAT_VERSION,
+                'name': dataset.name,
+                'fingerprint': dataset.fingerprint(),
+                'rows': len(dataset),
+                'num_points': num_points,
+                'time_lengths': sorted(vo),
+            }, file)
+
+        if os.path.exists(path):
+            old_path = f"{path}.old-{os.getpid()}"
+            os.replace(path, old_path)
+            os.replace(tmp_path, path)
+            shutil.rmtree(old_path, ignore_errors=True)
+        else:
+            os.replace(tmp_path, path)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_domain_store(dataset):
+    """Precomputed store matching this dataset, or None when there is none (or it is stale).
+
+    Stores are indexed by the rows of a whole file, so views of a
+    partitioned file (see partitions.py) never use one and are not checked.
+    """
+    if dataset.version and dataset.version[1] == PARTITIONED:
+        return None
+    path = store_path(dataset.name, dataset.data_dir or DATA_DIR)
+    meta_path = os.path.join(path, 'meta.json')
+    try:
+        mtime = os.stat(meta_path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+    version = (dataset.version, mtime)
+    with _stores_lock:
+        cached = _stores.get(path)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+    store = DomainStore(path)
+    if store.fingerprint != dataset.fingerprint():
+        log.warning("Ignoring stale precomputed store %s: it was built for different data", path)
+        store = None
+
+    with _stores_lock:
+        _stores[path] = (version, store)
+    return store
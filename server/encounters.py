@@ -0,0 +1,88 @@
+import numpy as np
+
+from ais_store import from_epoch
+from ship_domain import KNOTS_TO_MPS, encounter_modes, calculate_alpha, build_ellipses
+from spatial_index import haversine_m
+
+
+def window_candidates(dataset, timestamps, target_ship_ids=None):
+    """Rows of every ship reported at each timestamp, with the step each row belongs to."""
+    time_order, time_keys, time_offsets = dataset.time_index
+    idx = np.searchsorted(time_keys, timestamps)
+    idx = np.minimum(idx, len(time_keys) - 1)
+    present = time_keys[idx] == timestamps
+
+    lo = np.where(present, time_offsets[idx], 0)
+    hi = np.where(present, time_offsets[idx + 1], 0)
+    rows = np.concatenate([time_order[a:b] for a, b in zip(lo, hi)]) if len(lo) else np.empty(0, dtype=np.int64)
+    steps = np.repeat(np.arange(len(timestamps)), hi - lo)
+
+    if target_ship_ids:
+        target_codes = [dataset.code_of(ship_id) for ship_id in target_ship_ids]
+        keep = np.isin(dataset.ship_code[rows], [code for code in target_codes if code is not None])
+        rows, steps = rows[keep], steps[keep]
+    return rows, steps
+
+
+def resolve_encounters(dataset, ship_id, start, end, target_ship_ids=None):
+    """Pair the own ship with its closest target at every step of [start, end].
+
+    Returns a dict of arrays with one entry per own-ship report in the window:
+    timestamp, own_rows, target_rows, distance_m, relative_bearing (degrees,
+    own COG minus target COG), alpha (radians), speed_ratio (target SOG over
+    own SOG) and mode (ship_domain mode codes).
+    """
+    own_rows = dataset.ship_rows(ship_id, start, end)
+    if not len(own_rows):
+        raise ValueError(f"No data found for Ship ID {ship_id} within the time window {from_epoch(start)} to {from_epoch(end)}.")
+    timestamps = np.asarray(dataset.timestamp[own_rows], dtype=np.int64)
+
+    rows, steps = window_candidates(dataset, timestamps, target_ship_ids)
+    distances = haversine_m(dataset.lon[own_rows][steps], dataset.lat[own_rows][steps], dataset.lon[rows], dataset.lat[rows])
+    distances[dataset.ship_code[rows] == dataset.ship_code[own_rows[0]]] = np.inf
+
+    order = np.lexsort((distances, steps))
+    first = np.r_[True, steps[order][1:] != steps[order][:-1]] if len(order) else np.empty(0, dtype=bool)
+    closest = order[first]
+    closest = closest[np.isfinite(distances[closest])]
+
+    target_rows = np.full(len(own_rows), -1, dtype=np.int64)
+    target_rows[steps[closest]] = rows[closest]
+    distance_m = np.full(len(own_rows), np.inf)
+    distance_m[steps[closest]] = distances[closest]
+
+    if (target_rows < 0).any():
+        if target_ship_ids:
+            raise ValueError("No matching target ships found for the given target_ship_ids.")
+        raise ValueError("No target ships found.")
+
+    own_cog = np.asarray(dataset.cog[own_rows], dtype=np.float64)
+    target_cog = np.asarray(dataset.cog[target_rows], dtype=np.float64)
+    own_position = (dataset.lon[own_rows], dataset.lat[own_rows])
+    target_position = (dataset.lon[target_rows], dataset.lat[target_rows])
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        speed_ratio = (dataset.sog[target_rows] * KNOTS_TO_MPS) / (dataset.sog[own_rows] * KNOTS_TO_MPS)
+
+    return {
+        'timestamp': timestamps,
+        'own_rows': own_rows,
+        'target_rows': target_rows,
+        'distance_m': distance_m,
+        'relative_bearing': np.mod(own_cog - target_cog, 360),
+        'alpha': calculate_alpha(own_position, target_position, own_cog),
+        'speed_ratio': speed_ratio,
+        'mode': encounter_modes(own_cog, target_cog),
+    }
+
+
+def ship_domain_rings(dataset, ship_id, start, end):
+    encounters = resolve_encounters(dataset, ship_id, start, end)
+
+    own_rows, target_rows = encounters['own_rows'], encounters['target_rows']
+    rings = build_ellipses(
+        dataset.len_pred[own_rows], dataset.sog[own_rows], dataset.cog[own_rows],
+        dataset.lon[own_rows], dataset.lat[own_rows],
+        dataset.sog[target_rows], encounters['alpha'], encounters['mode'],
+    )
+    return encounters, rings
@@ -0,0 +1,149 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+
+from ais_store import get_dataset, get_catalog, to_epoch, format_epoch
+from approx_tcr import DEFAULT_SAMPLES, approximate_tcr
+from calculation_cri import compute_vo_region, compute_v_region, compute_tcr, compute_tcpa, compute_vo_cri
+from spatial_index import snapshot_index
+
+DEFAULT_RANGE_M = 9260  # 5 nautical miles
+DEFAULT_MAX_TARGETS = 3
+DEFAULT_TOP_N = 50
+CHUNKS_PER_WORKER = 4
+FLEET_WORKERS = int(os.environ.get('FURIOUS_FLEET_WORKERS', os.cpu_count() or 1))
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """The process's fleet pool of FLEET_WORKERS processes, shared by every request and never shut down per call.
+
+    Workers are started by a forkserver (spawn where there is none) rather
+    than forked from the calling process, which runs request threads.
+    """
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            context = multiprocessing.get_context(method)
+            if method == 'forkserver':
+                context.set_forkserver_preload([__name__])
+            _executor = ProcessPoolExecutor(max_workers=FLEET_WORKERS, mp_context=context)
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def candidate_pairs(filename, recptn_dt_str, range_m=DEFAULT_RANGE_M, max_targets=DEFAULT_MAX_TARGETS):
+    """(own ship, target ship, distance) for every ship at the tick and its nearest targets within range_m."""
+    ts = to_epoch(recptn_dt_str)
+    dataset = get_dataset(filename, start=ts)
+    index = snapshot_index(dataset, ts)
+
+    pairs = []
+    for own_row in index.rows:
+        target_rows, distances = index.nearest(
+            dataset.lon[own_row], dataset.lat[own_row],
+            k=max_targets, max_range_m=range_m, exclude_rows=[own_row],
+        )
+        own_ship_id = dataset.ship_table[dataset.ship_code[own_row]]
+        for target_row, distance in zip(target_rows, distances):
+            pairs.append((own_ship_id, dataset.ship_table[dataset.ship_code[target_row]], float(distance)))
+    return pairs
+
+
+@lru_cache(maxsize=1024)
+def _target_vo_region(filename, target_ship_id, recptn_dt_str, time_length, dataset_version):
+    return compute_vo_region(filename, (target_ship_id,), recptn_dt_str, time_length)
+
+
+def pair_risk(filename, own_ship_id, target_ship_id, recptn_dt_str, time_length=30, approximate=False, samples=DEFAULT_SAMPLES):
+    if approximate:
+        return approximate_pair_risk(filename, own_ship_id, target_ship_id, recptn_dt_str, time_length, samples)
+
+    version = get_catalog(filename).version
+    vo_region, vo_geojson = _target_vo_region(filename, target_ship_id, recptn_dt_str, time_length, version)
+    v_region, v_geojson = compute_v_region(filename, own_ship_id, recptn_dt_str, time_length)
+
+    tcr, vo_area, v_area = compute_tcr(vo_region, v_region, vo_geojson, v_geojson)
+    tcpa = compute_tcpa(filename, own_ship_id, recptn_dt_str, [target_ship_id])
+    cri = compute_vo_cri(tcr, tcpa, recptn_dt_str, time_length)
+    return {
+        'cri': float(cri),
+        'tcr': float(tcr),
+        'tcpa': float(tcpa),
+        'vo_area': float(vo_area),
+        'v_area': float(v_area),
+    }
+
+
+def approximate_pair_risk(filename, own_ship_id, target_ship_id, recptn_dt_str, time_length=30, samples=DEFAULT_SAMPLES):
+    """pair_risk with a sampled TCR (see approx_tcr); tcr_error is its heuristic sampling error, and there is no vo_area."""
+    sampled = approximate_tcr(filename, own_ship_id, (target_ship_id,), recptn_dt_str, time_length, samples)
+    tcpa = compute_tcpa(filename, own_ship_id, recptn_dt_str, [target_ship_id])
+    cri = compute_vo_cri(sampled['tcr'], tcpa, recptn_dt_str, time_length)
+    return {
+        'cri': float(cri),
+        'tcr': sampled['tcr'],
+        'tcr_error': sampled['tcr_error'],
+        'tcpa': float(tcpa),
+        'v_area': sampled['v_area'],
+    }
+
+
+def _evaluate_pairs(filename, recptn_dt_str, time_length, pairs, approximate=False, samples=DEFAULT_SAMPLES):
+    results, skipped = [], []
+    for own_ship_id, target_ship_id, distance_m in pairs:
+        try:
+            risk = pair_risk(filename, own_ship_id, target_ship_id, recptn_dt_str, time_length, approximate, samples)
+        except Exception as e:
+            skipped.append({'own_ship_id': own_ship_id, 'target_ship_id': target_ship_id, 'error': str(e)})
+            continue
+        if not np.isfinite(risk['cri']):
+            skipped.append({'own_ship_id': own_ship_id, 'target_ship_id': target_ship_id, 'error': "CRI is not finite"})
+            continue
+        results.append({'own_ship_id': own_ship_id, 'target_ship_id': target_ship_id, 'distance_m': distance_m, **risk})
+    return results, skipped
+
+
+def fleet_cri(filename, recptn_dt_str, time_length=30, range_m=DEFAULT_RANGE_M, max_targets=DEFAULT_MAX_TARGETS,
+              top_n=DEFAULT_TOP_N, workers=None, approximate=False, samples=DEFAULT_SAMPLES):
+    """Rank the highest-risk (own ship, target) pairs of the whole fleet at one tick.
+
+    With approximate, TCRs are sampled with samples points per pair instead
+    of intersected exactly; each pair then carries its tcr_error.
+    """
+    pairs = candidate_pairs(filename, recptn_dt_str, range_m, max_targets)
+
+    # Sorting keeps each own ship's pairs adjacent, so they mostly land in the same worker
+    pairs.sort(key=lambda pair: (str(pair[0]), pair[2]))
+    # The pool has a fixed size: workers only sets how finely the scan is chunked (1 runs it in this process)
+    workers = min(workers or FLEET_WORKERS, FLEET_WORKERS)
+    chunk_count = min(len(pairs), workers * CHUNKS_PER_WORKER) or 1
+    chunks = [chunk.tolist() for chunk in np.array_split(np.array(pairs, dtype=object), chunk_count) if len(chunk)]
+
+    if workers == 1 or len(chunks) <= 1:
+        outcomes = [_evaluate_pairs(filename, recptn_dt_str, time_length, chunk, approximate, samples) for chunk in chunks]
+    else:
+        executor = get_executor()
+        futures = [executor.submit(_evaluate_pairs, filename, recptn_dt_str, time_length, chunk, approximate, samples) for chunk in chunks]
+        outcomes = [future.result() for future in futures]
+
+    results = [result for chunk_results, _ in outcomes for result in chunk_results]
+    skipped = [skip for _, chunk_skipped in outcomes for skip in chunk_skipped]
+    results.sort(key=lambda result: result['cri'], reverse=True)
+
+    return {
+        'datetime': str(format_epoch(to_epoch(recptn_dt_str))),
+        'range_m': range_m,
+        'pairs_evaluated': len(pairs),
+        'pairs_skipped': len(skipped),
+        'approximate': approximate,
+        'pairs': results[:top_n],
+    }
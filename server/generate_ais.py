@@ -0,0 +1,154 @@
+import argparse
+import os
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from ais_store import DATA_DIR, dataset_path
+from convert_geojson import convert
+
+METERS_PER_DEGREE_LAT = 110574.0
+METERS_PER_DEGREE_LON = 111319.9
+KNOTS_TO_MPS = 0.514444
+
+# COG offset of the target relative to the own ship (degrees) for each scripted encounter
+ENCOUNTER_COURSES = {
+    'head_on': (170, 190),
+    'crossing': (45, 112.5),
+    'overtaking': (-10, 10),
+}
+
+
+def _advance(lon, lat, sog, cog, seconds):
+    distance_m = sog * KNOTS_TO_MPS * seconds
+    heading = np.radians(cog)
+    lat_next = lat + distance_m * np.cos(heading) / METERS_PER_DEGREE_LAT
+    lon_next = lon + distance_m * np.sin(heading) / (METERS_PER_DEGREE_LON * np.cos(np.radians(lat)))
+    return lon_next, lat_next
+
+
+def generate_tracks(num_ships, num_steps, step_minutes=10, seed=0, center=(126.0, 35.0), box_deg=1.0,
+                    encounter_fraction=0.3):
+    """Seeded synthetic traffic as (lon, lat, sog, cog, present) arrays of shape (num_ships, num_steps), plus lengths.
+
+    Free ships start anywhere in the box with a random course and speed, wander
+    a few degrees of COG per step and are present for a random part of the
+    period. A fraction of the fleet is paired up so each pair meets at a
+    common point and time, in a head-on, crossing or overtaking geometry.
+    """
+    rng = np.random.default_rng(seed)
+    step_seconds = step_minutes * 60
+
+    lon = np.empty((num_ships, num_steps))
+    lat = np.empty((num_ships, num_steps))
+    sog = np.empty((num_ships, num_steps))
+    cog = np.empty((num_ships, num_steps))
+    length = np.round(rng.uniform(20, 300, num_ships), 1)
+
+    # Presence: each ship reports over a contiguous random stretch of at least 6 steps
+    duration = np.minimum(num_steps, rng.integers(min(6, num_steps), num_steps + 1, num_ships))
+    first = rng.integers(0, num_steps - duration + 1)
+    steps = np.arange(num_steps)
+    present = (steps >= first[:, None]) & (steps < (first + duration)[:, None])
+
+    lon[:, 0] = center[0] + rng.uniform(-box_deg / 2, box_deg / 2, num_ships)
+    lat[:, 0] = center[1] + rng.uniform(-box_deg / 2, box_deg / 2, num_ships)
+    sog[:, 0] = rng.uniform(3, 20, num_ships)
+    cog[:, 0] = rng.uniform(0, 360, num_ships)
+    for k in range(1, num_steps):
+        lon[:, k], lat[:, k] = _advance(lon[:, k - 1], lat[:, k - 1], sog[:, k - 1], cog[:, k - 1], step_seconds)
+        sog[:, k] = np.clip(sog[:, k - 1] + rng.normal(0, 0.3, num_ships), 2, 25)
+        cog[:, k] = (cog[:, k - 1] + rng.uniform(-5, 5, num_ships)) % 360
+
+    # Scripted encounters: straight tracks through a meeting point at step `meet`
+    num_pairs = int(num_ships * encounter_fraction) // 2
+    kinds = list(ENCOUNTER_COURSES)
+    for pair in range(num_pairs):
+        own, target = 2 * pair, 2 * pair + 1
+        kind = kinds[pair % len(kinds)]
+        meet = int(rng.integers(0, num_steps))
+        meet_lon = center[0] + rng.uniform(-box_deg / 2, box_deg / 2)
+        meet_lat = center[1] + rng.uniform(-box_deg / 2, box_deg / 2)
+
+        own_cog = rng.uniform(0, 360)
+        low, high = ENCOUNTER_COURSES[kind]
+        offset = rng.uniform(low, high) * (rng.choice([-1, 1]) if kind == 'crossing' else 1)
+        own_sog = rng.uniform(8, 18)
+        target_sog = own_sog * rng.uniform(0.4, 0.7) if kind == 'overtaking' else rng.uniform(6, 18)
+
+        for ship, ship_cog, ship_sog in ((own, own_cog, own_sog), (target, (own_cog + offset) % 360, target_sog)):
+            seconds = (steps - meet) * step_seconds
+            lon[ship], lat[ship] = _advance(meet_lon, meet_lat, ship_sog, ship_cog, seconds)
+            sog[ship] = ship_sog
+            cog[ship] = ship_cog
+            present[ship] = np.abs(steps - meet) <= max(6, num_steps // 4)
+
+    return lon, lat, np.round(sog, 2), np.round(cog, 1), present, length
+
+
+def write_geojson(path, lon, lat, sog, cog, present, length, start, step_minutes=10, first_ship_id=100000):
+    """Write tracks as a *_resample10T_* style FeatureCollection, streamed tick by tick."""
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    num_ships, num_steps = present.shape
+    count = 0
+    with open(tmp_path, 'w') as file:
+        file.write('{"type": "FeatureCollection", "features": [')
+        for k in range(num_steps):
+            recptn_dt = (start + timedelta(minutes=step_minutes * k)).strftime('%Y-%m-%dT%H:%M:%S')
+            ships = np.flatnonzero(present[:, k])
+            # Formatted directly rather than through json.dumps: this loop writes millions of features at scale
+            features = [
+                '{"type":"Feature","properties":{"SHIP_ID":%d,"RECPTN_DT":"%s","SOG":%r,"COG":%r,"LEN_PRED":%r},'
+                '"geometry":{"type":"Point","coordinates":[%r,%r]}}' % (first_ship_id + ship, recptn_dt, ship_sog, ship_cog, ship_length, ship_lon, ship_lat)
+                for ship, ship_sog, ship_cog, ship_length, ship_lon, ship_lat in zip(
+                    ships.tolist(), sog[ships, k].tolist(), cog[ships, k].tolist(), length[ships].tolist(),
+                    lon[ships, k].tolist(), lat[ships, k].tolist(),
+                )
+            ]
+            if features:
+                file.write((',' if count else '') + ','.join(features))
+                count += len(features)
+        file.write(']}')
+    os.replace(tmp_path, path)
+    return count
+
+
+def generate(filename, num_ships, hours, data_dir=DATA_DIR, step_minutes=10, seed=0, center=(126.0, 35.0),
+             box_deg=1.0, encounter_fraction=0.3, start=datetime(2023, 5, 1), binary=False):
+    started = time.perf_counter()
+    num_steps = max(1, int(hours * 60 // step_minutes))
+    tracks = generate_tracks(num_ships, num_steps, step_minutes, seed, center, box_deg, encounter_fraction)
+
+    os.makedirs(data_dir, exist_ok=True)
+    path = dataset_path(filename, data_dir)
+    count = write_geojson(path, *tracks, start, step_minutes)
+    print(f"{filename}: {count} positions of {num_ships} ships over {num_steps} ticks "
+          f"({time.perf_counter() - started:.1f}s) -> {path}")
+
+    if binary:
+        convert(filename, data_dir)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate seeded synthetic AIS data in the resampled GeoJSON schema.")
+    parser.add_argument('filename', help="File name without extension, e.g. cargo_resample10T_synth")
+    parser.add_argument('--ships', type=int, default=200)
+    parser.add_argument('--hours', type=float, default=24)
+    parser.add_argument('--step-minutes', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--center', type=float, nargs=2, default=(126.0, 35.0), metavar=('LON', 'LAT'))
+    parser.add_argument('--box-deg', type=float, default=1.0, help="Side of the square area ships start in, in degrees")
+    parser.add_argument('--encounters', type=float, default=0.3, help="Fraction of ships placed in scripted encounter pairs")
+    parser.add_argument('--start', default='2023-05-01T00:00:00')
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    parser.add_argument('--binary', action='store_true', help="Also write the .aisb binary copy")
+    args = parser.parse_args()
+
+    generate(args.filename, args.ships, args.hours, args.data_dir, args.step_minutes, args.seed, tuple(args.center),
+             args.box_deg, args.encounters, datetime.fromisoformat(args.start), args.binary)
+
+
+if __name__ == "__main__":
+    main()
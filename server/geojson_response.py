@@ -0,0 +1,176 @@
+import json
+import logging
+import os
+import time
+import zlib
+
+from flask import Response, request
+
+from binary_geometry import MIME_TYPE as PACKED_MIME_TYPE, pack_geojson
+from metrics import stage
+
+log = logging.getLogger(__name__)
+
+# Decimal places kept in coordinates; 6 is ~0.1 m, well below AIS position accuracy
+COORD_PRECISION = int(os.environ.get('FURIOUS_COORD_PRECISION', 6))
+GZIP_LEVEL = int(os.environ.get('FURIOUS_GZIP_LEVEL', 5))
+CHUNK_BYTES = 64 * 1024
+
+_encoder = json.JSONEncoder(separators=(',', ':'))
+
+
+def quantize_coordinates(coordinates, precision):
+    if isinstance(coordinates, (list, tuple)):
+        return [quantize_coordinates(value, precision) for value in coordinates]
+    if isinstance(coordinates, float):
+        return round(coordinates, precision)
+    return coordinates
+
+
+def quantize(obj, precision):
+    """Copy of a GeoJSON object with every coordinate rounded to precision decimals; properties are left as is."""
+    if isinstance(obj, dict):
+        return {
+            key: quantize_coordinates(value, precision) if key == 'coordinates' else quantize(value, precision)
+            for key, value in obj.items()
+        }
+    if isinstance(obj, (list, tuple)):
+        return [quantize(value, precision) for value in obj]
+    return obj
+
+
+def encode_geojson(obj, precision=COORD_PRECISION):
+    """Compact JSON text of a GeoJSON object, yielded piece by piece (one feature at a time for collections)."""
+    def quantize_obj(value):
+        return value if precision is None else quantize(value, precision)
+
+    if not (isinstance(obj, dict) and obj.get('type') == 'FeatureCollection'):
+        yield _encoder.encode(quantize_obj(obj))
+        return
+
+    header = {key: value for key, value in obj.items() if key != 'features'}
+    yield _encoder.encode(header)[:-1] + (',' if header else '') + '"features":['
+    for i, feature in enumerate(obj['features']):
+        yield (',' if i else '') + _encoder.encode(quantize_obj(feature))
+    yield ']}'
+
+
+def _chunked(pieces):
+    buffer, size = [], 0
+    for piece in pieces:
+        data = piece.encode('utf-8') if isinstance(piece, str) else piece
+        buffer.append(data)
+        size += len(data)
+        if size >= CHUNK_BYTES:
+            yield b''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def _gzipped(chunks):
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def accepts_gzip():
+    return 'gzip' in request.accept_encodings
+
+
+def request_precision():
+    """Coordinate precision for this request: ?precision=N (0-15), or 'full' to disable rounding."""
+    value = request.args.get('precision')
+    if value is None:
+        return COORD_PRECISION
+    if value == 'full':
+        return None
+    return min(max(int(value), 0), 15)
+
+
+def wants_packed():
+    """True when the client asked for packed geometry (?format=binary or an Accept header preferring it)."""
+    if request.args.get('format') == 'binary':
+        return True
+    return request.accept_mimetypes.best_match(['application/json', PACKED_MIME_TYPE]) == PACKED_MIME_TYPE
+
+
+def stream_response(pieces, status=200, mimetype='application/json'):
+    """Send text/bytes pieces in large chunks, gzipped when the client accepts it.
+
+    The chunks are encoded and compressed here, while the view runs, so the
+    work is under the compute timeout and in the 'encode' stage; only sending
+    them is left to after the view returns.
+    """
+    headers = {'Vary': 'Accept, Accept-Encoding'}
+    with stage('encode'):
+        chunks = _chunked([pieces] if isinstance(pieces, (str, bytes)) else pieces)
+        if accepts_gzip():
+            chunks = _gzipped(chunks)
+            headers['Content-Encoding'] = 'gzip'
+        chunks = list(chunks)
+    return Response(chunks, status=status, headers=headers, mimetype=mimetype)
+
+
+def json_response(pieces, status=200):
+    return stream_response(pieces, status)
+
+
+def packed_response(body, status=200):
+    return stream_response(body, status, PACKED_MIME_TYPE)
+
+
+def geojson_response(obj, status=200):
+    if wants_packed():
+        return packed_response(pack_geojson(obj), status)
+    return json_response(encode_geojson(obj, request_precision()), status)
+
+
+def wants_event_stream():
+    """SSE unless the client asks for NDJSON (?format=ndjson or Accept: application/x-ndjson)."""
+    if request.args.get('format') in ('ndjson', 'sse'):
+        return request.args['format'] == 'sse'
+    return request.accept_mimetypes.best_match(['text/event-stream', 'application/x-ndjson']) != 'application/x-ndjson'
+
+
+def frame_stream_response(frames, precision=COORD_PRECISION, event_stream=True, deadline=None):
+    """Stream frames as they are produced, as Server-Sent Events or NDJSON.
+
+    Frames are flushed one by one (gzip included, via Z_SYNC_FLUSH), so a
+    client sees each frame as soon as it is computed. Frames are produced
+    after the view has returned, so past deadline (a perf_counter time) the
+    stream ends with a 'timeout' frame instead of computing the next one.
+    """
+    def encode(frame):
+        text = ''.join(encode_geojson(frame, precision))
+        if event_stream:
+            return f"event: {frame.get('type', 'message')}\ndata: {text}\n\n".encode('utf-8')
+        return (text + '\n').encode('utf-8')
+
+    def encoded():
+        last = None
+        for frame in frames:
+            yield encode(frame)
+            last = frame.get('datetime', last)
+            if deadline is not None and time.perf_counter() >= deadline:
+                log.warning("Frame stream stopped at its compute deadline after %s", last)
+                yield encode({'type': 'timeout', 'error': "Stream stopped at the compute time limit", 'datetime': last})
+                return
+        yield b"event: end\ndata: {}\n\n" if event_stream else b''
+
+    def gzipped(chunks):
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        for chunk in chunks:
+            yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
+
+    chunks = encoded()
+    headers = {'Vary': 'Accept, Accept-Encoding', 'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    if accepts_gzip():
+        chunks = gzipped(chunks)
+        headers['Content-Encoding'] = 'gzip'
+    mimetype = 'text/event-stream' if event_stream else 'application/x-ndjson'
+    return Response(chunks, headers=headers, mimetype=mimetype)
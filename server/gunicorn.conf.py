@@ -0,0 +1,17 @@
+import os
+
+wsgi_app = 'wsgi:app'
+bind = os.environ.get('FURIOUS_BIND', '0.0.0.0:8080')
+
+# Datasets are loaded in the master and shared with the forked workers
+preload_app = True
+workers = int(os.environ.get('FURIOUS_WORKERS', 2))
+worker_class = 'gthread'
+threads = int(os.environ.get('FURIOUS_THREADS', 4))
+
+# With gthread this only restarts a worker whose main loop stops answering the arbiter;
+# it does not stop a computation thread. Those are bounded by COMPUTE_TIMEOUT (504) and
+# the compute queue (503) in serving.py.
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
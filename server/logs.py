@@ -0,0 +1,53 @@
+import logging
+import os
+import threading
+import time
+
+LOG_LEVEL = os.environ.get('FURIOUS_LOG_LEVEL', 'INFO').upper()
+# At most RATE_LIMIT_BURST records of the same message per RATE_LIMIT_INTERVAL seconds
+RATE_LIMIT_BURST = int(os.environ.get('FURIOUS_LOG_BURST', 20))
+RATE_LIMIT_INTERVAL = float(os.environ.get('FURIOUS_LOG_INTERVAL', 10))
+
+
+class RateLimitFilter(logging.Filter):
+    """Drop repeats of the same message template beyond a burst per interval.
+
+    The first record let through after a suppressed stretch notes how many
+    were dropped.
+    """
+
+    def __init__(self, burst=RATE_LIMIT_BURST, interval=RATE_LIMIT_INTERVAL):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        key = (record.name, record.levelno, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            started, count, suppressed = self._windows.get(key, (now, 0, 0))
+            if now - started >= self.interval:
+                started, count = now, 0
+            if count >= self.burst:
+                self._windows[key] = (started, count, suppressed + 1)
+                return False
+            self._windows[key] = (started, count + 1, 0)
+
+        if suppressed:
+            record.msg = f"{record.msg} ({suppressed} similar messages suppressed)"
+        return True
+
+
+def configure_logging(level=LOG_LEVEL):
+    """Leveled, rate-limited logging to stderr for the server modules (idempotent)."""
+    root = logging.getLogger()
+    if any(getattr(handler, '_furious', False) for handler in root.handlers):
+        return
+    handler = logging.StreamHandler()
+    handler._furious = True
+    handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s [%(process)d] %(name)s: %(message)s'))
+    handler.addFilter(RateLimitFilter())
+    root.addHandler(handler)
+    root.setLevel(level)
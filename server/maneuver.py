@@ -0,0 +1,140 @@
+"""Maneuver advisory: the own-ship courses and speeds that lower the CRI.
+
+Candidates form a grid of course and speed changes around the current
+COG/SOG. For each one, the V half-ellipse is rebuilt for that speed and
+turned with the course change, and its TCR against the current VO region
+is estimated by sampling.
+Every candidate shares the same unit points (approx_tcr.unit_half_disc),
+so a whole batch is a single vectorized point-in-polygon test against the
+exact VO polygon. The TCPA of every target is recomputed for the candidate
+velocity, and the CRI follows as in compute_vo_cri.
+
+Candidates are evaluated from the smallest change outwards, in batches,
+until the grid is done or the latency budget is spent.
+"""
+import os
+import time
+
+import numpy as np
+import shapely
+
+from approx_tcr import DEFAULT_SAMPLES, sampling_error, unit_half_disc, v_half_ellipse
+from cpa import compute_cpa, tcpa_prime
+from metrics import stage
+
+ADVISORY_BUDGET_MS = float(os.environ.get('FURIOUS_ADVISORY_BUDGET_MS', 250))
+DEFAULT_COURSE_SPAN = 60
+DEFAULT_COURSE_STEP = 10
+DEFAULT_SPEED_SPAN = 5
+DEFAULT_SPEED_STEP = 1
+DEFAULT_TOP_N = 5
+# The V region's radius grows with log(SOG), so there is none at or below 1 knot
+MIN_SPEED_KN = 1.0
+MAX_CANDIDATES = 10000
+BATCH_CANDIDATES = 32
+
+
+def candidate_grid(cog, sog, course_span=DEFAULT_COURSE_SPAN, course_step=DEFAULT_COURSE_STEP,
+                   speed_span=DEFAULT_SPEED_SPAN, speed_step=DEFAULT_SPEED_STEP):
+    """(course_change, speed_change) of every candidate, smallest change first; (0, 0) always comes first."""
+    if course_step <= 0 or speed_step <= 0:
+        raise ValueError("Course and speed steps must be positive")
+    course_changes = np.arange(0, course_span + 1e-9, course_step)
+    course_changes = np.r_[-course_changes[:0:-1], course_changes]
+    speed_changes = np.arange(0, speed_span + 1e-9, speed_step)
+    speed_changes = np.r_[-speed_changes[:0:-1], speed_changes]
+    if len(course_changes) * len(speed_changes) > MAX_CANDIDATES:
+        raise ValueError(f"The grid holds {len(course_changes) * len(speed_changes)} candidates, more than the {MAX_CANDIDATES} allowed")
+
+    course_change, speed_change = (grid.ravel() for grid in np.meshgrid(course_changes, speed_changes))
+    keep = (sog + speed_change > MIN_SPEED_KN) | ((course_change == 0) & (speed_change == 0))
+    course_change, speed_change = course_change[keep], speed_change[keep]
+    # Each change is measured against its span, so a full turn and a full speed change weigh the same
+    size = np.hypot(course_change / max(course_span, course_step), speed_change / max(speed_span, speed_step))
+    order = np.lexsort((np.abs(speed_change), np.abs(course_change), size))
+    return course_change[order], speed_change[order]
+
+
+def candidate_tcr(vo_region, lon, lat, cog, sog, time_length=30, samples=DEFAULT_SAMPLES):
+    """Sampled TCR of the V regions for arrays of candidate courses and speeds against one VO region."""
+    cx, cy, rx, ry, rotation = v_half_ellipse(lon, lat, sog, cog, time_length)
+    x, y = unit_half_disc(samples)
+    rx, ry, cos, sin = (np.asarray(value)[:, np.newaxis] for value in (rx, ry, np.cos(rotation), np.sin(rotation)))
+    points_x = cx + rx * x * cos - ry * y * sin
+    points_y = cy + rx * x * sin + ry * y * cos
+    inside = shapely.contains_xy(vo_region, points_x.ravel(), points_y.ravel()).reshape(points_x.shape)
+    return inside.mean(axis=1)
+
+
+@stage('maneuver')
+def advise_maneuver(own_feature, target_features, vo_region, time_length=30, course_span=DEFAULT_COURSE_SPAN,
+                    course_step=DEFAULT_COURSE_STEP, speed_span=DEFAULT_SPEED_SPAN, speed_step=DEFAULT_SPEED_STEP,
+                    samples=DEFAULT_SAMPLES, budget_ms=ADVISORY_BUDGET_MS, top_n=DEFAULT_TOP_N):
+    """Lowest-CRI course/speed candidates for the own ship against the targets and their VO region.
+
+    The first batch, which holds the current course and speed, is always
+    evaluated; later batches only while budget_ms has not run out.
+    """
+    started = time.perf_counter()
+    lon, lat = own_feature['geometry']['coordinates'][:2]
+    cog, sog = own_feature['properties']['COG'], own_feature['properties']['SOG']
+    course_change, speed_change = candidate_grid(cog, sog, course_span, course_step, speed_span, speed_step)
+
+    target_lon = np.array([feature['geometry']['coordinates'][0] for feature in target_features], dtype=np.float64)
+    target_lat = np.array([feature['geometry']['coordinates'][1] for feature in target_features], dtype=np.float64)
+    target_sog = np.array([feature['properties']['SOG'] for feature in target_features], dtype=np.float64)
+    target_cog = np.array([feature['properties']['COG'] for feature in target_features], dtype=np.float64)
+    target_ids = [feature['properties']['SHIP_ID'] for feature in target_features]
+    if not len(target_ids):
+        raise ValueError("No target ships found.")
+
+    # Only the part of the VO region that some candidate's V region can reach is tested
+    _, _, rx, ry, _ = v_half_ellipse(lon, lat, np.max(sog + speed_change), cog, time_length)
+    reach = 1.01 * max(abs(rx), abs(ry))
+    vo_region = shapely.clip_by_rect(vo_region, lon - reach, lat - reach, lon + reach, lat + reach)
+    shapely.prepare(vo_region)
+    tcr, tcpa = np.empty(0), np.empty((0, len(target_ids)))
+    for lo in range(0, len(course_change), BATCH_CANDIDATES):
+        if lo and (time.perf_counter() - started) * 1000 >= budget_ms:
+            break
+        candidate_cog = np.mod(cog + course_change[lo:lo + BATCH_CANDIDATES], 360)
+        candidate_sog = sog + speed_change[lo:lo + BATCH_CANDIDATES]
+        # compute_v_region turns its half-disc counter-clockwise by COG - 90, so a turn to starboard
+        # (clockwise) is a V region at COG minus the change; the current course keeps its own V region
+        v_region_cog = np.mod(cog - course_change[lo:lo + BATCH_CANDIDATES], 360)
+        tcr = np.r_[tcr, candidate_tcr(vo_region, lon, lat, v_region_cog, candidate_sog, time_length, samples)]
+        # One row per candidate, one column per target
+        cpa = compute_cpa((lon, lat), candidate_sog[:, np.newaxis], candidate_cog[:, np.newaxis],
+                          target_lon, target_lat, target_sog, target_cog)
+        tcpa = np.r_[tcpa, cpa['tcpa']]
+
+    evaluated = len(tcr)
+    weights = tcpa_prime(tcpa, time_length)
+    cri = tcr * weights.max(axis=1)
+    governing = weights.argmax(axis=1)
+
+    def candidate(i):
+        return {
+            'cog': round(float(np.mod(cog + course_change[i], 360)), 1),
+            'sog': round(float(sog + speed_change[i]), 2),
+            'course_change': float(course_change[i]),
+            'speed_change': float(speed_change[i]),
+            'cri': round(float(cri[i]), 5),
+            'tcr': round(float(tcr[i]), 5),
+            'tcr_error': round(float(sampling_error(tcr[i], samples)), 5),
+            'tcpa': round(float(tcpa[i, governing[i]]), 5),
+            'governing_ship_id': target_ids[governing[i]],
+        }
+
+    # Candidates are in order of increasing change, so a stable sort prefers the smallest change among equal risks
+    ranked = np.argsort(cri, kind='stable')[:top_n]
+    return {
+        'current': candidate(0),
+        'candidates': [candidate(i) for i in ranked.tolist()],
+        'target_ship_ids': target_ids,
+        'evaluated': evaluated,
+        'total': len(course_change),
+        'complete': evaluated == len(course_change),
+        'samples': samples,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+    }
@@ -0,0 +1,138 @@
+import functools
+import threading
+import time
+from bisect import bisect_left
+
+from flask import has_request_context, request
+
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TIMINGS_KEY = 'furious.timings'
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """Latency histograms per (family, label), e.g. ('stage', 'tcr') or ('request', '/computation')."""
+
+    def __init__(self):
+        self._histograms = {}
+        self._statuses = {}
+        self._lock = threading.Lock()
+
+    def observe(self, family, label, seconds):
+        with self._lock:
+            histogram = self._histograms.get((family, label))
+            if histogram is None:
+                histogram = self._histograms[(family, label)] = Histogram()
+            histogram.observe(seconds)
+
+    def count_status(self, endpoint, status):
+        with self._lock:
+            self._statuses[(endpoint, status)] = self._statuses.get((endpoint, status), 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            histograms = {
+                key: {'buckets': list(h.buckets), 'counts': list(h.counts), 'sum': h.sum, 'count': h.count}
+                for key, h in self._histograms.items()
+            }
+            return histograms, dict(self._statuses)
+
+
+metrics = Metrics()
+
+
+class stage:
+    """Time a pipeline stage, as a context manager or decorator.
+
+    Every call feeds the stage histogram; inside a request the durations are
+    also summed per stage for that request's Server-Timing header.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __call__(self, function):
+        @functools.wraps(function)
+        def timed(*args, **kwargs):
+            with stage(self.name):
+                return function(*args, **kwargs)
+        return timed
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self._started
+        metrics.observe('stage', self.name, elapsed)
+        if has_request_context():
+            # environ is shared with copies of the request context (compute threads)
+            timings = request.environ.setdefault(TIMINGS_KEY, {})
+            total, calls = timings.get(self.name, (0.0, 0))
+            timings[self.name] = (total + elapsed, calls + 1)
+        return False
+
+
+def server_timing(total_seconds):
+    """Server-Timing header value for the current request."""
+    entries = [
+        f'{name};dur={total * 1000:.1f};desc="{calls} call{"s" if calls != 1 else ""}"'
+        for name, (total, calls) in request.environ.get(TIMINGS_KEY, {}).items()
+    ]
+    entries.append(f'total;dur={total_seconds * 1000:.1f}')
+    return ', '.join(entries)
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels.items()) + '}'
+
+
+def render_prometheus(cache_stats):
+    """Metrics in the Prometheus text exposition format."""
+    histograms, statuses = metrics.snapshot()
+    lines = []
+    for family, label_name in (('stage', 'stage'), ('request', 'endpoint')):
+        name = f'furious_{family}_seconds'
+        lines.append(f'# TYPE {name} histogram')
+        for (kind, label), h in sorted(histograms.items()):
+            if kind != family:
+                continue
+            cumulative = 0
+            for bound, count in zip([*h['buckets'], '+Inf'], h['counts']):
+                cumulative += count
+                lines.append(f'{name}_bucket{_labels(**{label_name: label, "le": bound})} {cumulative}')
+            lines.append(f'{name}_sum{_labels(**{label_name: label})} {h["sum"]:.6f}')
+            lines.append(f'{name}_count{_labels(**{label_name: label})} {h["count"]}')
+
+    lines.append('# TYPE furious_requests_total counter')
+    for (endpoint, status), count in sorted(statuses.items()):
+        lines.append(f'furious_requests_total{_labels(endpoint=endpoint, status=status)} {count}')
+
+    for cache, stats in cache_stats.items():
+        for key, value in stats.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                lines.append(f'furious_cache_{key}{_labels(cache=cache)} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_json(cache_stats):
+    histograms, statuses = metrics.snapshot()
+    return {
+        'stages': {label: h for (family, label), h in histograms.items() if family == 'stage'},
+        'requests': {label: h for (family, label), h in histograms.items() if family == 'request'},
+        'statuses': [{'endpoint': endpoint, 'status': status, 'count': count} for (endpoint, status), count in statuses.items()],
+        'caches': cache_stats,
+    }
@@ -0,0 +1,35 @@
+import argparse
+import time
+
+from ais_store import DATA_DIR, get_dataset
+from logs import configure_logging
+from partitions import DEFAULT_TILE_DEG, parts_path, write_partitions
+
+
+def partition(sources, name=None, data_dir=DATA_DIR, tile_deg=DEFAULT_TILE_DEG, float32=False):
+    name = name or sources[0]
+    path = parts_path(name, data_dir)
+    for source in sources:
+        started = time.perf_counter()
+        dataset = get_dataset(source, data_dir)
+        manifest = write_partitions(dataset, path, tile_deg, float32)
+        print(f"{source}: {len(dataset)} rows -> {path} "
+              f"({len(manifest['partitions'])} partitions, {manifest['rows']} rows in total, {time.perf_counter() - started:.1f}s)")
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Split AIS files into a store partitioned by UTC day and geographic tile.")
+    parser.add_argument('files', nargs='+', help="Source file names without extension, added to the store in order")
+    parser.add_argument('--name', help="Store name, i.e. the file name the server asks for (default: the first source)")
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    parser.add_argument('--tile-deg', type=float, default=DEFAULT_TILE_DEG, help="Tile side in degrees")
+    parser.add_argument('--float32', action='store_true', help="Store SOG/COG/LEN_PRED as float32 (coordinates stay float64)")
+    args = parser.parse_args()
+
+    configure_logging()
+    partition(args.files, args.name, args.data_dir, args.tile_deg, args.float32)
+
+
+if __name__ == "__main__":
+    main()
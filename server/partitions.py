@@ -0,0 +1,260 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from ais_store import DATA_DIR, AISDataset, concat_datasets, format_epoch
+from metrics import stage
+
+log = logging.getLogger(__name__)
+
+PARTS_SUFFIX = '.parts'
+# Source kind in the version of a partitioned file and of its views
+PARTITIONED = 'partitioned'
+MANIFEST = 'manifest.json'
+PARTITION_FORMAT_VERSION = 1
+DAY_SECONDS = 86400
+DEFAULT_TILE_DEG = 1.0
+# Bytes of partition views kept loaded across all partitioned files
+MEMORY_BUDGET = int(float(os.environ.get('FURIOUS_DATASET_MEMORY_MB', 2048)) * 1024 * 1024)
+
+
+def parts_path(filename, data_dir=DATA_DIR):
+    return os.path.join(data_dir, filename + PARTS_SUFFIX)
+
+
+def _tile_key(day, tile_x, tile_y):
+    return f"{format_epoch(day * DAY_SECONDS)[:10]}/{tile_x}_{tile_y}"
+
+
+def _read_manifest(path):
+    with open(os.path.join(path, MANIFEST), 'r') as file:
+        manifest = json.load(file)
+    if manifest.get('format_version') != PARTITION_FORMAT_VERSION:
+        raise ValueError(f"Unsupported partitioned AIS format version in {path}: {manifest.get('format_version')}")
+    return manifest
+
+
+def write_partitions(dataset, path, tile_deg=DEFAULT_TILE_DEG, float32=False):
+    """Split a dataset into one binary partition per (UTC day, tile_deg x tile_deg tile) under path.
+
+    Partitions already in the store are merged with the new rows of the same
+    day and tile, so several source files (e.g. one per day or month) can be
+    added to one store. The manifest is rewritten last.
+    """
+    manifest = {'format_version': PARTITION_FORMAT_VERSION, 'name': dataset.name, 'tile_deg': tile_deg, 'partitions': {}}
+    if os.path.exists(os.path.join(path, MANIFEST)):
+        manifest = _read_manifest(path)
+        if manifest['tile_deg'] != tile_deg:
+            raise ValueError(f"{path} uses {manifest['tile_deg']} degree tiles, not {tile_deg}")
+    os.makedirs(path, exist_ok=True)
+
+    timestamp = np.asarray(dataset.timestamp, dtype=np.int64)
+    day = timestamp // DAY_SECONDS
+    tile_x = np.floor(np.asarray(dataset.lon) / tile_deg).astype(np.int64)
+    tile_y = np.floor(np.asarray(dataset.lat) / tile_deg).astype(np.int64)
+    # Stable sort keeps each group's rows in (ship, timestamp) order
+    order = np.lexsort((tile_y, tile_x, day))
+    groups = np.column_stack((day, tile_x, tile_y))[order]
+    starts = np.flatnonzero(np.r_[True, np.any(groups[1:] != groups[:-1], axis=1)])
+
+    for lo, hi in zip(starts, np.r_[starts[1:], len(order)]):
+        key = _tile_key(*groups[lo].tolist())
+        part = dataset.take(np.sort(order[lo:hi]), name=dataset.name)
+        part_path = os.path.join(path, key.replace('/', os.sep) + '.aisb')
+        if key in manifest['partitions']:
+            part = concat_datasets([AISDataset.open(part_path, mmap=False), part], dataset.name)
+        os.makedirs(os.path.dirname(part_path), exist_ok=True)
+        part.save(part_path, float32=float32)
+
+        manifest['partitions'][key] = {
+            'path': os.path.relpath(part_path, path),
+            'start': int(part.timestamp.min()),
+            'end': int(part.timestamp.max()),
+            'bbox': [float(part.lon.min()), float(part.lat.min()), float(part.lon.max()), float(part.lat.max())],
+            'rows': len(part),
+            'ships': len(part.ship_table),
+        }
+
+    manifest['ship_table'] = sorted(set(manifest.get('ship_table', [])) | set(dataset.ship_ids()))
+    manifest['rows'] = sum(entry['rows'] for entry in manifest['partitions'].values())
+
+    tmp_path = os.path.join(path, f"{MANIFEST}.tmp-{os.getpid()}")
+    with open(tmp_path, 'w') as file:
+        json.dump(manifest, file)
+    os.replace(tmp_path, os.path.join(path, MANIFEST))
+    return manifest
+
+
+def _view_bytes(dataset):
+    columns = [dataset.ship_code, dataset.timestamp, dataset.lon, dataset.lat, dataset.sog, dataset.cog, dataset.len_pred]
+    columns += [getattr(column, 'codes', column) for column in dataset.extra.values()]
+    return sum(np.asarray(column).nbytes for column in columns)
+
+
+class PartitionedStore:
+    """A partitioned file: its manifest, and views over the partitions a query touches."""
+
+    def __init__(self, filename, data_dir, path, mtime):
+        self.name = filename
+        self.data_dir = data_dir
+        self.path = path
+        self.version = (filename, PARTITIONED, mtime)
+        self.manifest = _read_manifest(path)
+        self.ship_table = self.manifest['ship_table']
+        self._keys = sorted(self.manifest['partitions'])
+
+    def __len__(self):
+        return self.manifest['rows']
+
+    def ship_ids(self):
+        return list(self.ship_table)
+
+    def partition_keys(self, start=None, end=None, bbox=None):
+        """Partitions of the whole UTC days overlapping [start, end], so queries within a day share one view."""
+        if start is not None and end is None:
+            end = start
+        keys = []
+        for key in self._keys:
+            entry = self.manifest['partitions'][key]
+            if start is not None and not start // DAY_SECONDS <= entry['start'] // DAY_SECONDS <= end // DAY_SECONDS:
+                continue
+            if bbox is not None:
+                min_lon, min_lat, max_lon, max_lat = entry['bbox']
+                if max_lon < bbox[0] or min_lon > bbox[2] or max_lat < bbox[1] or min_lat > bbox[3]:
+                    continue
+            keys.append(key)
+        return tuple(keys)
+
+    def view(self, start=None, end=None, bbox=None):
+        return registry.view(self, self.partition_keys(start, end, bbox))
+
+    @stage('load')
+    def load(self, keys, version):
+        paths = [os.path.join(self.path, self.manifest['partitions'][key]['path']) for key in keys]
+        if len(paths) == 1:
+            # A single partition is served straight from its memory map
+            return AISDataset.open(paths[0], version=version)
+        # Partitions that get concatenated are read outright: a memory map holds a file descriptor per column
+        parts = [AISDataset.open(path, mmap=False) for path in paths]
+        if not parts:
+            return AISDataset(
+                self.name, np.empty(0, dtype=object), np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int64),
+                np.empty(0), np.empty(0), np.empty(0), np.empty(0), np.empty(0), version=version,
+            )
+        return concat_datasets(parts, self.name, version)
+
+
+class _Load:
+    def __init__(self):
+        self.done = threading.Event()
+        self.dataset = None
+        self.error = None
+
+
+class DatasetRegistry:
+    """LRU of loaded partition views, bounded by the bytes of their columns.
+
+    Each view has its own version (the partitions it holds), so row-keyed
+    caches such as the VO builder never mix rows of different views.
+    Partitions are read outside the registry lock: loads of different views
+    run concurrently, and concurrent requests for the view being loaded wait
+    for that one load (or its exception).
+    """
+
+    def __init__(self, max_bytes=MEMORY_BUDGET):
+        self.max_bytes = max_bytes
+        self._views = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._loading = {}
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'coalesced': 0}
+
+    def view(self, store, keys):
+        digest = hashlib.sha1('\n'.join(keys).encode('utf-8')).hexdigest()[:16]
+        version = (*store.version, digest)
+        with self._lock:
+            cached = self._views.get(version)
+            if cached is not None:
+                self._views.move_to_end(version)
+                self._stats['hits'] += 1
+                return cached[0]
+            load = self._loading.get(version)
+            leader = load is None
+            if leader:
+                load = self._loading[version] = _Load()
+                self._stats['misses'] += 1
+            else:
+                self._stats['coalesced'] += 1
+
+        if not leader:
+            load.done.wait()
+            if load.error is not None:
+                raise load.error
+            return load.dataset
+
+        try:
+            dataset = store.load(keys, version)
+            dataset.data_dir = store.data_dir
+        except BaseException as e:
+            load.error = e
+            with self._lock:
+                del self._loading[version]
+            load.done.set()
+            raise
+
+        load.dataset = dataset
+        size = _view_bytes(dataset)
+        with self._lock:
+            # Kept before the load is marked done, so no request in between misses both
+            del self._loading[version]
+            if size <= self.max_bytes:
+                self._views[version] = (dataset, size)
+                self._bytes += size
+                while self._bytes > self.max_bytes:
+                    _, (_, evicted) = self._views.popitem(last=False)
+                    self._bytes -= evicted
+                    self._stats['evictions'] += 1
+        load.done.set()
+
+        if size > self.max_bytes:
+            log.warning("View of %d partitions of %s (%d MB) exceeds the %d MB budget and is not kept",
+                        len(keys), store.name, size >> 20, self.max_bytes >> 20)
+        else:
+            log.info("Loaded %d partitions of %s: %d rows", len(keys), store.name, len(dataset))
+        return dataset
+
+    def clear(self):
+        with self._lock:
+            self._views.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, 'entries': len(self._views), 'in_flight': len(self._loading), 'bytes': self._bytes,
+                    'max_bytes': self.max_bytes}
+
+
+registry = DatasetRegistry()
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_partitioned_store(filename, data_dir=DATA_DIR):
+    """The partitioned store of a file, or None when it has none; reloaded when its manifest changes."""
+    path = parts_path(filename, data_dir)
+    try:
+        mtime = os.stat(os.path.join(path, MANIFEST)).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None or store.version[2] != mtime:
+            store = _stores[path] = PartitionedStore(filename, data_dir, path, mtime)
+    return store
@@ -0,0 +1,70 @@
+import numpy as np
+
+from ais_store import get_dataset, to_epoch, format_epoch
+from cri_series import tick_cri
+
+# Columns of a 'moved' entry in delta frames
+MOVED_FIELDS = ['SHIP_ID', 'lon', 'lat', 'SOG', 'COG']
+MAX_TICKS = 2000
+
+
+def playback_frames(filename, start_str, end_str, own_ship_id=None, time_length=30, target_ship_ids=None, precision=6):
+    """Successive traffic frames between start and end: a full snapshot, then deltas.
+
+    The first frame is {'type': 'snapshot', 'datetime', 'features'} with the
+    same features as /load_geojson_data_selected. Each later tick is a
+    {'type': 'delta', 'datetime', 'moved', 'appeared', 'disappeared'} frame:
+    moved rows follow MOVED_FIELDS (other properties keep the values of the
+    vessel's last full feature), appeared vessels are full features and
+    disappeared vessels are SHIP_IDs. Positions are compared after rounding
+    to precision decimals, so sub-precision jitter is not sent. With
+    own_ship_id, frames where the own ship is present carry its 'cri' entry.
+    """
+    start, end = to_epoch(start_str), to_epoch(end_str)
+    if end < start:
+        raise ValueError("End datetime must not be before start datetime")
+    dataset = get_dataset(filename, start=start, end=end)
+
+    ticks = dataset.timestamps()
+    ticks = ticks[(ticks >= start) & (ticks <= end)]
+    if len(ticks) > MAX_TICKS:
+        raise ValueError(f"Playback range covers {len(ticks)} ticks, more than the {MAX_TICKS} allowed")
+
+    own_code = dataset.code_of(own_ship_id) if own_ship_id is not None else None
+    num_ships = len(dataset.ship_table)
+    present = np.zeros(num_ships, dtype=bool)
+    state = np.full((num_ships, 4), np.nan)
+
+    for i, ts in enumerate(ticks.tolist()):
+        rows = dataset.rows_at(ts)
+        codes = np.asarray(dataset.ship_code[rows], dtype=np.int64)
+        values = np.column_stack((
+            np.round(dataset.lon[rows], precision), np.round(dataset.lat[rows], precision),
+            dataset.values('sog', rows), dataset.values('cog', rows),
+        )).astype(np.float64)
+
+        now_present = np.zeros(num_ships, dtype=bool)
+        now_present[codes] = True
+        frame = {'datetime': str(format_epoch(ts))}
+
+        if i == 0:
+            frame['type'] = 'snapshot'
+            frame['fields'] = MOVED_FIELDS
+            frame['features'] = dataset.features(rows)
+        else:
+            was_present = present[codes]
+            changed = was_present & np.any(state[codes] != values, axis=1)
+            frame['type'] = 'delta'
+            frame['moved'] = [
+                [dataset.ship_table[code], *row]
+                for code, row in zip(codes[changed].tolist(), values[changed].tolist())
+            ]
+            frame['appeared'] = dataset.features(rows[~was_present])
+            frame['disappeared'] = [dataset.ship_table[code] for code in np.flatnonzero(present & ~now_present).tolist()]
+
+        if own_code is not None and now_present[own_code]:
+            frame['cri'] = tick_cri(filename, own_ship_id, ts, time_length, target_ship_ids)
+
+        present = now_present
+        state[codes] = values
+        yield frame
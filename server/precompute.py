@@ -0,0 +1,113 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import shapely
+
+from ais_store import DATA_DIR, get_dataset
+from domain_store import DomainStore, store_path
+from encounters import ship_domain_rings
+from logs import configure_logging
+from partitions import PARTITIONED
+from ship_domain import NUM_POINTS
+from vo_builder import VORegionBuilder
+
+SHIPS_PER_PARTITION = 64
+
+
+def _concat(parts, shape, dtype):
+    return np.concatenate(parts) if parts else np.empty(shape, dtype=dtype)
+
+
+def _precompute_partition(filename, data_dir, ship_codes, time_lengths):
+    dataset = get_dataset(filename, data_dir)
+    # A store left from earlier data must not leak into the one being built
+    builder = VORegionBuilder(use_store=False)
+    rows, rings, modes = [], [], []
+    vo = {time_length: ([], []) for time_length in time_lengths}
+    failed = []
+
+    for code in ship_codes:
+        ship_id = dataset.ship_table[code]
+        lo, hi = int(dataset.ship_offsets[code]), int(dataset.ship_offsets[code + 1])
+        track = np.asarray(dataset.timestamp[lo:hi], dtype=np.int64)
+        try:
+            encounters, ship_rings = ship_domain_rings(dataset, ship_id, int(track[0]), int(track[-1]))
+        except ValueError as e:
+            # e.g. a step with no other ship around; these fall back to live computation
+            failed.append((ship_id, str(e)))
+            continue
+
+        rows.append(encounters['own_rows'])
+        rings.append(ship_rings)
+        modes.append(encounters['mode'])
+
+        for time_length in time_lengths:
+            piece_rows, pieces = vo[time_length]
+            for row, ts in zip(range(lo, hi), track.tolist()):
+                piece_rows.append(row)
+                pieces.append(shapely.to_wkb(builder.ship_piece(dataset, ship_id, ts, ts + time_length * 60)))
+        builder.clear()
+
+    return (
+        _concat(rows, (0,), np.int64),
+        _concat(rings, (0, NUM_POINTS + 1, 2), np.float64),
+        _concat(modes, (0,), np.int8),
+        {time_length: (np.asarray(piece_rows, dtype=np.int64), pieces) for time_length, (piece_rows, pieces) in vo.items()},
+        failed,
+    )
+
+
+def precompute(filename, data_dir=DATA_DIR, time_lengths=(30,), workers=None, float32=False):
+    started = time.perf_counter()
+    dataset = get_dataset(filename, data_dir)
+    if dataset.version[1] == PARTITIONED:
+        raise ValueError(f"{filename} is partitioned; precomputed domains are only used with monolithic files")
+    codes = np.arange(len(dataset.ship_table))
+    partitions = [part.tolist() for part in np.array_split(codes, max(1, len(codes) // SHIPS_PER_PARTITION)) if len(part)]
+
+    has_ellipse = np.zeros(len(dataset), dtype=bool)
+    rings = np.full((len(dataset), NUM_POINTS + 1, 2), np.nan, dtype=np.float32 if float32 else np.float64)
+    modes = np.full(len(dataset), -1, dtype=np.int8)
+    vo = {time_length: [b''] * len(dataset) for time_length in time_lengths}
+    failed = []
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_precompute_partition, filename, data_dir, part, tuple(time_lengths)) for part in partitions]
+        for done, future in enumerate(futures, 1):
+            rows, part_rings, part_modes, part_vo, part_failed = future.result()
+            has_ellipse[rows] = True
+            rings[rows] = part_rings
+            modes[rows] = part_modes
+            for time_length, (piece_rows, pieces) in part_vo.items():
+                for row, piece in zip(piece_rows.tolist(), pieces):
+                    vo[time_length][row] = piece
+            failed.extend(part_failed)
+            print(f"{filename}: partition {done}/{len(partitions)} done")
+
+    path = store_path(filename, data_dir)
+    DomainStore.write(path, dataset, has_ellipse, rings, modes, vo, NUM_POINTS)
+    print(f"{filename}: {int(has_ellipse.sum())}/{len(dataset)} domains, {len(failed)} ships left to live computation "
+          f"({time.perf_counter() - started:.1f}s) -> {path}")
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute ship domains, encounter modes and per-ship VO pieces for a dataset.")
+    parser.add_argument('files', nargs='+', help="File names without extension, e.g. cargo_resample10T_ver04")
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    parser.add_argument('--time-length', type=int, action='append', dest='time_lengths',
+                        help="Window length in minutes to precompute VO pieces for (repeatable, default 30)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--float32', action='store_true', help="Store ellipse coordinates as float32")
+    args = parser.parse_args()
+    configure_logging()
+
+    for filename in args.files:
+        precompute(filename, args.data_dir, args.time_lengths or [30], args.workers, args.float32)
+
+
+if __name__ == "__main__":
+    main()
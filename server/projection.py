@@ -0,0 +1,43 @@
+import threading
+from functools import lru_cache
+
+import numpy as np
+import shapely
+from pyproj import Transformer
+
+from metrics import stage
+
+# Origins are snapped to this grid (degrees) so nearby ships share a transformer;
+# Lambert azimuthal equal-area keeps areas exact whatever the centre, only shapes drift.
+ORIGIN_GRID = 0.05
+
+
+@lru_cache(maxsize=256)
+def _local_transformer(lon0, lat0, thread_id):
+    return Transformer.from_crs(
+        "EPSG:4326",
+        f"+proj=laea +lat_0={lat0} +lon_0={lon0} +datum=WGS84 +units=m +no_defs",
+        always_xy=True,
+    )
+
+
+def local_transformer(lon, lat):
+    """Cached WGS84 -> local equal-area transformer centred near (lon, lat).
+
+    pyproj transformers are not thread-safe, so each thread gets its own.
+    """
+    lon0 = round(round(float(lon) / ORIGIN_GRID) * ORIGIN_GRID, 6)
+    lat0 = round(round(float(lat) / ORIGIN_GRID) * ORIGIN_GRID, 6)
+    return _local_transformer(lon0, lat0, threading.get_ident())
+
+
+@stage('projection')
+def project(geometries, lon, lat):
+    """Project an array of lon/lat geometries into the local equal-area CRS in one vectorized call."""
+    transformer = local_transformer(lon, lat)
+
+    def to_local(coords):
+        x, y = transformer.transform(coords[:, 0], coords[:, 1])
+        return np.column_stack((x, y))
+
+    return shapely.transform(np.asarray(geometries, dtype=object), to_local)
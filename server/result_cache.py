@@ -0,0 +1,266 @@
+import hashlib
+import logging
+import os
+import pickle
+import stat
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import shapely
+from shapely.geometry.base import BaseGeometry
+
+from ais_store import canonical_datetime
+
+log = logging.getLogger(__name__)
+
+CACHE_MAX_BYTES = int(os.environ.get('FURIOUS_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+CACHE_DIR = os.environ.get('FURIOUS_CACHE_DIR')
+CACHE_DISK_MAX_BYTES = int(os.environ.get('FURIOUS_CACHE_DISK_MAX_BYTES', 2 * 1024 * 1024 * 1024))
+# Eviction trims the disk tier to this fraction of its budget, so it does not rescan on every write
+DISK_EVICTION_TARGET = 0.9
+# Lists and dicts longer than this are sized from an even sample of their items
+SIZE_SAMPLE = 4
+# Values estimated above this fraction of the memory budget are pickled to check they fit
+EXACT_SIZE_FRACTION = 0.5
+
+
+def canonical_ids(ship_ids):
+    return tuple(sorted(str(ship_id) for ship_id in ship_ids or ()))
+
+
+def cache_key(namespace, file_name, dataset_version, date_time=None, *parts):
+    """Key with the datetime normalized, so '...T10:00:00.000Z' and '...T10:00:00' share an entry."""
+    return (namespace, file_name, dataset_version, canonical_datetime(date_time) if date_time else None, *parts)
+
+
+def estimate_size(value):
+    """Approximate size of a value in bytes, in the spirit of its pickled size but without pickling it.
+
+    Bytes and strings count their length, arrays their buffer, geometries 16
+    bytes per coordinate; long lists and dicts are extrapolated from a sample,
+    so the cost stays bounded however large the value is.
+    """
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value) + 2
+    if value is None or isinstance(value, (bool, int, float)):
+        return 9
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, BaseGeometry):
+        return 16 * int(shapely.get_num_coordinates(value)) + 32
+    if isinstance(value, dict):
+        # Keys repeat across the dicts of a collection and pickle stores each text once
+        return 2 * len(value) + _sampled_size(list(value.values()))
+    if isinstance(value, (list, tuple)):
+        return _sampled_size(value)
+    return sys.getsizeof(value)
+
+
+def _sampled_size(values):
+    if len(values) <= SIZE_SAMPLE:
+        return sum(estimate_size(value) for value in values) + 2
+    step = len(values) / SIZE_SAMPLE
+    sample = [values[int(i * step)] for i in range(SIZE_SAMPLE)]
+    return int(sum(estimate_size(value) for value in sample) * len(values) / SIZE_SAMPLE) + 2
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ResultCache:
+    """LRU result cache bounded by the size of its values (see estimate_size).
+
+    With disk_dir set, entries are also written there as pickles named by a
+    hash of their key, so worker processes and restarts share results. Keys
+    carry the dataset version, so entries of a reloaded file are never hit.
+    The directory is bounded by disk_max_bytes: once a write takes it over,
+    the least recently used files (by mtime, which hits refresh) are removed.
+    Loading a pickle can run arbitrary code, so disk_dir must be private to
+    the service.
+    Concurrent get_or_compute calls for the same missing key are coalesced:
+    one thread computes, the others wait for its result (or its exception).
+    """
+
+    def __init__(self, max_bytes=CACHE_MAX_BYTES, disk_dir=CACHE_DIR, disk_max_bytes=CACHE_DISK_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self._inflight = {}
+        self._stats = {'hits': 0, 'misses': 0, 'disk_hits': 0, 'evictions': 0, 'disk_evictions': 0, 'coalesced': 0}
+        if disk_dir:
+            os.makedirs(disk_dir, mode=0o700, exist_ok=True)
+            if os.stat(disk_dir).st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+                log.warning("Cache directory %s is writable by other users; its pickles are loaded as trusted", disk_dir)
+            self._disk_bytes = sum(size for _, _, size in self._disk_files())
+
+    def _disk_path(self, key):
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.disk_dir, key[0], digest + '.pkl')
+
+    def _disk_files(self):
+        """(mtime, path, size) of every entry in the disk tier."""
+        files = []
+        for namespace in os.scandir(self.disk_dir):
+            if not namespace.is_dir():
+                continue
+            for entry in os.scandir(namespace.path):
+                if entry.name.endswith('.pkl'):
+                    try:
+                        info = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    files.append((info.st_mtime_ns, entry.path, info.st_size))
+        return files
+
+    def _evict_disk(self):
+        """Remove the least recently used files until the disk tier is back under DISK_EVICTION_TARGET of its budget.
+
+        Other worker processes write to the same directory, so the total is
+        recounted from the files rather than trusted from this process.
+        """
+        with self._disk_lock:
+            files = sorted(self._disk_files())
+            total = sum(size for _, _, size in files)
+            evicted = 0
+            for _, path, size in files:
+                if total <= self.disk_max_bytes * DISK_EVICTION_TARGET:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                evicted += 1
+            with self._lock:
+                self._disk_bytes = total
+                self._stats['disk_evictions'] += evicted
+
+    def _store(self, key, value, size):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self._stats['evictions'] += 1
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                return entry[0]
+
+        if self.disk_dir:
+            path = self._disk_path(key)
+            try:
+                with open(path, 'rb') as file:
+                    payload = file.read()
+                value = pickle.loads(payload)
+                # A hit makes the file the most recently used for eviction
+                os.utime(path)
+            except (OSError, pickle.UnpicklingError, EOFError):
+                pass
+            else:
+                self._store(key, value, len(payload))
+                with self._lock:
+                    self._stats['disk_hits'] += 1
+                return value
+
+        with self._lock:
+            self._stats['misses'] += 1
+        return default
+
+    def set(self, key, value):
+        # Pickling is only worth it for the disk tier, or to size a value that may not fit
+        size = estimate_size(value)
+        payload = None
+        if self.disk_dir or size > self.max_bytes * EXACT_SIZE_FRACTION:
+            payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            size = len(payload)
+        self._store(key, value, size)
+
+        if self.disk_dir and len(payload) <= self.disk_max_bytes:
+            path = self._disk_path(key)
+            os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'wb') as file:
+                file.write(payload)
+            os.replace(tmp_path, path)
+            with self._lock:
+                self._disk_bytes += len(payload)
+                over = self._disk_bytes > self.disk_max_bytes
+            if over:
+                self._evict_disk()
+
+    def get_or_compute(self, key, compute):
+        missing = object()
+        value = self.get(key, missing)
+        if value is not missing:
+            return value
+
+        with self._lock:
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _Call()
+            else:
+                self._stats['coalesced'] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = compute()
+            self.set(key, call.value)
+            return call.value
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            call.done.set()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['disk_hits'] + self._stats['misses']
+            return {
+                **self._stats,
+                'entries': len(self._entries),
+                'in_flight': len(self._inflight),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hit_ratio': (self._stats['hits'] + self._stats['disk_hits']) / lookups if lookups else None,
+                'disk_dir': self.disk_dir,
+                'disk_bytes': self._disk_bytes,
+                'disk_max_bytes': self.disk_max_bytes,
+            }
+
+
+result_cache = ResultCache()
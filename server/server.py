@@ -1,29 +1,75 @@
-from flask import Flask, jsonify, request, make_response
+from flask import Flask, jsonify, request
 from flask_cors import CORS
 
-import pandas as pd
-from datetime import datetime, timedelta
-import json
-from functools import lru_cache
-
-from calculation_cri import ship_ids, load_geojson_selected, ownship_ellipses, find_three_closest_ships, compute_vo_region, compute_v_region, compute_tcr, compute_tcpa, compute_vo_cri
+import itertools
+import logging
+import time
+
+from ais_store import get_dataset, get_catalog, to_epoch, canonical_datetime
+from calculation_cri import ship_ids, load_geojson_selected, load_geojson_selected_time, ownship_ellipses, find_three_closest_ships, compute_vo_region, compute_v_region, compute_tcr, compute_target_cpa, compute_vo_cri
+from cpa import governing_target
+from cri_series import cri_series
+from fleet_cri import fleet_cri, DEFAULT_RANGE_M, DEFAULT_MAX_TARGETS, DEFAULT_TOP_N
+from approx_tcr import DEFAULT_SAMPLES, MAX_TCR_SAMPLES
+from maneuver import (advise_maneuver, ADVISORY_BUDGET_MS, DEFAULT_COURSE_SPAN, DEFAULT_COURSE_STEP, DEFAULT_SPEED_SPAN,
+                      DEFAULT_SPEED_STEP, DEFAULT_TOP_N as DEFAULT_MANEUVER_TOP_N)
+from result_cache import result_cache, cache_key, canonical_ids
+from geojson_response import encode_geojson, geojson_response, json_response, packed_response, request_precision, wants_packed, frame_stream_response, wants_event_stream
+from playback import playback_frames
+from trajectory import MAX_GAP_SECONDS, resample_track, track_cache
+from partitions import registry
+from viewport import parse_bbox, viewport_snapshot, simplify_geojson
+from metrics import metrics, server_timing, render_prometheus, metrics_json
+from logs import configure_logging
+from vo_builder import vo_builder
+from binary_geometry import pack_geojson
+from serving import compute_deadline, with_compute_timeout, preload_datasets, readiness
+
+configure_logging()
+log = logging.getLogger(__name__)
 
 # app instance
 app = Flask(__name__)
 CORS(app) # allows port 8080 in use
 
+@app.before_request
+def start_timer():
+    request.environ['furious.started'] = time.perf_counter()
+
+@app.after_request
+def record_timing(response):
+    started = request.environ.get('furious.started')
+    if started is not None:
+        elapsed = time.perf_counter() - started
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.observe('request', endpoint, elapsed)
+        metrics.count_status(endpoint, response.status_code)
+        response.headers['Server-Timing'] = server_timing(elapsed)
+        response.headers['Timing-Allow-Origin'] = '*'
+    return response
+
 
 file_mapping = {
     'passenger': 'passenger_resample10T_ver03',
     'cargo': 'cargo_resample10T_ver04',
 }
-    
+
+# Every cached result is keyed by dataset version so a reloaded file never serves stale data
+def encoded_snapshot(file_name, date_time, precision):
+    key = cache_key('snapshot', file_name, get_catalog(file_name).version, date_time, precision)
+    return result_cache.get_or_compute(
+        key, lambda: ''.join(encode_geojson(load_geojson_selected(file_name, date_time), precision)).encode('utf-8')
+    )
+
+def packed_snapshot(file_name, date_time):
+    key = cache_key('snapshot_packed', file_name, get_catalog(file_name).version, date_time)
+    return result_cache.get_or_compute(key, lambda: pack_geojson(load_geojson_selected(file_name, date_time)))
+
 @app.route('/load_geojson_data_selected', methods=['GET'])
 def load_geojson_data_selected():
     ship_type = request.args.get('shipType')
     datetime_str = request.args.get('datetime')
-    print(f"Received ship_type: {ship_type}")
-    print(f"Received datetime: {datetime_str}")
+    log.debug("Received ship_type: %s, datetime: %s", ship_type, datetime_str)
     
     if not ship_type:
         return jsonify({"error": "shipType parameter is missing"}), 400
@@ -33,23 +79,35 @@ def load_geojson_data_selected():
         return jsonify({"error": f"No file mapping found for ship_type: {ship_type}"}), 400
 
     try:
-        print(f"Loading file for getting data: {file_name}")
-        result = load_geojson_selected(file_name, datetime_str)
-        print(f"Filtered data loaded successfully!")
-        return make_response(json.dumps(result, indent=2), 200, {'Content-Type': 'application/json'})
+        bbox, zoom = request.args.get('bbox'), request.args.get('zoom', type=float)
+        if bbox or zoom is not None:
+            # Viewport queries are cheap index lookups, so they are not cached
+            bbox = parse_bbox(bbox) if bbox else (-180.0, -90.0, 180.0, 90.0)
+            return geojson_response(viewport_snapshot(file_name, datetime_str, bbox, zoom))
+
+        if wants_packed():
+            body = packed_snapshot(file_name, datetime_str)
+            return packed_response(body)
+
+        body = encoded_snapshot(file_name, datetime_str, request_precision())
+        return json_response(body)
     
-    except ValueError as e:
-        print(e)
+    except (OSError, ValueError) as e:
+        log.warning("%s failed: %s", request.path, e)
         return jsonify({"error": str(e)}), 500
 
-@lru_cache(maxsize=128)
+def simplified(obj, zoom):
+    # Region geometries are simplified to about a pixel when the client sends its map zoom
+    return obj if zoom is None else simplify_geojson(obj, float(zoom))
+
 def cached_ship_ids(file_name):
-    return ship_ids(file_name)
+    key = cache_key('ship_ids', file_name, get_catalog(file_name).version)
+    return result_cache.get_or_compute(key, lambda: ship_ids(file_name))
 
 @app.route('/get_ship_ids', methods=['GET'])
 def get_ship_ids():
     ship_type = request.args.get('shipType')
-    print(f"Received ship_type: {ship_type}")
+    log.debug("Received ship_type: %s", ship_type)
     
     if not ship_type:
         return jsonify({"error": "shipType parameter is missing"}), 400
@@ -59,28 +117,54 @@ def get_ship_ids():
         return jsonify({"error": f"No file mapping found for ship_type: {ship_type}"}), 400
 
     try:
-        print(f"Loading file for getting ship ids: {file_name}")
         result = cached_ship_ids(file_name)
-        print(f"Getting ship ids Success!")
         return jsonify(result)
     
     except ValueError as e:
-        print(e)
+        log.warning("%s failed: %s", request.path, e)
         return jsonify({"error": str(e)}), 500
 
-@lru_cache(maxsize=256)
 def cached_compute_vo_region(file_name, target_ship_ids, date_time, time_length):
-    return compute_vo_region(file_name, target_ship_ids, date_time, time_length)
+    key = cache_key('vo_region', file_name, get_catalog(file_name).version, date_time, canonical_ids(target_ship_ids), time_length)
+    return result_cache.get_or_compute(key, lambda: compute_vo_region(file_name, target_ship_ids, date_time, time_length))
 
-@lru_cache(maxsize=256)
 def cached_compute_v_region(file_name, ship_id, date_time, time_length):
-    return compute_v_region(file_name, ship_id, date_time, time_length)
+    key = cache_key('v_region', file_name, get_catalog(file_name).version, date_time, str(ship_id), time_length)
+    return result_cache.get_or_compute(key, lambda: compute_v_region(file_name, ship_id, date_time, time_length))
+
+def cached_ownship_ellipses(file_name, ship_id, date_time, time_length):
+    key = cache_key('os_domain', file_name, get_catalog(file_name).version, date_time, str(ship_id), time_length)
+    return result_cache.get_or_compute(key, lambda: ownship_ellipses(file_name, ship_id, date_time, time_length))
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    return jsonify({"status": "ok"})
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    ready, details = readiness(file_mapping.values())
+    return jsonify(details), 200 if ready else 503
+
+def cache_stats_by_name():
+    return {'result_cache': result_cache.stats(), 'vo_builder': vo_builder.stats(), 'track_cache': track_cache.stats(), 'partitions': registry.stats()}
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    # Per worker process; a multi-worker deployment is aggregated by the scraper
+    if request.args.get('format') == 'json':
+        return jsonify(metrics_json(cache_stats_by_name()))
+    return app.response_class(render_prometheus(cache_stats_by_name()), mimetype='text/plain; version=0.0.4')
+
+@app.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    return jsonify(result_cache.stats())
 
 @app.route("/os_domain", methods=['POST'])
+@with_compute_timeout
 def os_domain():
     try:
         data = request.json
-        print("Received data:", data)
+        log.debug("Received data: %s", data)
 
         ship_type = data.get('shipType')
         file_name = file_mapping.get(ship_type)
@@ -88,61 +172,113 @@ def os_domain():
         ship_id = data.get('shipId')
         date_time = data.get('datetime')
         time_length = int(data.get('timeLength', 30))
-        print(file_name, ship_id, date_time, time_length)
         
-        result = ownship_ellipses(file_name, ship_id, date_time, time_length)
-        return make_response(json.dumps(result, indent=2), 200, {'Content-Type': 'application/json'})
+        result = cached_ownship_ellipses(file_name, ship_id, date_time, time_length)
+        return geojson_response(simplified(result, data.get('zoom')))
     
     except Exception as e:
-        print(e)
+        log.warning("%s failed: %s", request.path, e)
         return jsonify({"error": str(e)}), 400
 
-@app.route("/computation", methods=['POST'])
-def computation():
-
-    data = request.json
-    print("Received data:", data)
-
-    ship_type = data.get('shipType')
-    file_name = file_mapping.get(ship_type)
-
-    ship_id = data.get('shipId')
-    date_time = data.get('datetime')
-    time_length = int(data.get('timeLength', 30))
-
-    target_ship_ids = data.get('selectedTsIds')
-
+def resolve_target_ship_ids(file_name, ship_id, date_time, target_ship_ids):
     # If no target ships are selected, find the 3 closest ships
     if not target_ship_ids:
-        print("No target ships selected. Finding the three closest ships...")
+        log.debug("No target ships selected. Finding the three closest ships...")
         closest_ships = find_three_closest_ships(file_name, ship_id, date_time)
         target_ship_ids = [ship['properties']['SHIP_ID'] for ship in closest_ships]
-        print("Closest ships selected as targets:", target_ship_ids)
-    target_ship_ids = tuple(target_ship_ids)
+        log.debug("Closest ships selected as targets: %s", target_ship_ids)
+    return tuple(target_ship_ids)
+
+def assess_risk(file_name, ship_id, date_time, time_length, target_ship_ids):
+    target_ship_ids = resolve_target_ship_ids(file_name, ship_id, date_time, target_ship_ids)
 
-    print("==== computing vo region =====")
     vo_region, vo_geojson = cached_compute_vo_region(file_name, target_ship_ids, date_time, time_length)
-    print("===== computing v region =====")
     v_region, v_geojson = cached_compute_v_region(file_name, ship_id, date_time, time_length)
 
-    print("===== computing tcr =====")
     tcr, vo_area, v_area = compute_tcr(vo_region, v_region, vo_geojson, v_geojson)
-    print("===== computing tcpa =====")
-    tcpa = compute_tcpa(file_name, ship_id, date_time, target_ship_ids)
+    cpa = compute_target_cpa(file_name, ship_id, date_time, target_ship_ids)
+    governing = governing_target(cpa['tcpa'], time_length)
+    tcpa, dcpa = float(cpa['tcpa'][governing]), float(cpa['dcpa'][governing])
+
+    cri = compute_vo_cri(tcr, cpa['tcpa'], date_time, time_length)
+
+    return {
+        'vo_area': round(vo_area, 5),
+        'v_area': round(v_area, 5),
+        'cri': round(cri, 5),
+        'tcr': round(tcr, 7),
+        'tcpa': round(tcpa, 5),
+        'dcpa': round(dcpa, 2),
+        'target_ship_ids': list(target_ship_ids),
+        'governing_ship_id': cpa['ship_ids'][governing],
+        'vo': vo_geojson,
+        'v': v_geojson,
+    }
+
+# Identical concurrent requests share one computation (see ResultCache.get_or_compute)
+def cached_assess_risk(file_name, ship_id, date_time, time_length, target_ship_ids):
+    targets = canonical_ids(target_ship_ids) if target_ship_ids else None
+    key = cache_key('risk', file_name, get_catalog(file_name).version, date_time, str(ship_id), time_length, targets)
+    return result_cache.get_or_compute(key, lambda: assess_risk(file_name, ship_id, date_time, time_length, target_ship_ids))
+
+@app.route("/computation", methods=['POST'])
+@with_compute_timeout
+def computation():
+    try:
+        data = request.json
+        log.debug("Received data: %s", data)
+
+        ship_type = data.get('shipType')
+        file_name = file_mapping.get(ship_type)
+
+        ship_id = data.get('shipId')
+        date_time = data.get('datetime')
+        time_length = int(data.get('timeLength', 30))
+
+        target_ship_ids = data.get('selectedTsIds')
+
+        risk = cached_assess_risk(file_name, ship_id, date_time, time_length, target_ship_ids)
 
-    print("===== computing cri =====")
-    cri = compute_vo_cri(tcr, tcpa, date_time, time_length)
+        result = [risk['vo_area'], risk['v_area'], risk['cri'], risk['tcr'], risk['tcpa'], risk['dcpa']]
+        log.info("computation result: %s", result)
 
-    result = [round(vo_area, 5), round(v_area, 5), round(cri, 5), round(tcr, 7), round(tcpa, 5)]
-    print("computation result: ", result)
+        return jsonify(result)
+
+    except Exception as e:
+        log.warning("%s failed: %s", request.path, e)
+        return jsonify({"error": str(e)}), 400
 
-    return jsonify(result)
+@app.route("/risk_assessment", methods=['POST'])
+@with_compute_timeout
+def risk_assessment():
+    try:
+        data = request.json
+        log.debug("Received data: %s", data)
+
+        ship_type = data.get('shipType')
+        file_name = file_mapping.get(ship_type)
+        if not file_name:
+            return jsonify({"error": f"No file mapping found for ship_type: {ship_type}"}), 400
+
+        ship_id = data.get('shipId')
+        date_time = data.get('datetime')
+        time_length = int(data.get('timeLength', 30))
+        target_ship_ids = data.get('selectedTsIds')
+
+        risk = cached_assess_risk(file_name, ship_id, date_time, time_length, target_ship_ids)
+        log.info("Risk assessment: cri=%s, targets=%s", risk['cri'], risk['target_ship_ids'])
+        return json_response(encode_geojson(simplified(risk, data.get('zoom')), request_precision()))
+
+    except Exception as e:
+        log.warning("%s failed: %s", request.path, e)
+        return jsonify({"error": str(e)}), 400
 
 @app.route("/computation_vo", methods=['POST'])
+@with_compute_timeout
 def computation_vo():
     try:
         data = request.json
-        print("Received data:", data) 
+        log.debug("Received data: %s", data)
         ship_id = data.get('shipId')
         ship_type = data.get('shipType')
         file_name = file_mapping.get(ship_type)
@@ -150,29 +286,23 @@ def computation_vo():
         date_time = data.get('datetime')
         time_length = int(data.get('timeLength', 30))
 
-        target_ship_ids = data.get('selectedTsIds')
-        # If no target ships are selected, find the 3 closest ships
-        if not target_ship_ids:
-            print("No target ships selected. Finding the three closest ships...")
-            closest_ships = find_three_closest_ships(file_name, ship_id, date_time)
-            target_ship_ids = [ship['properties']['SHIP_ID'] for ship in closest_ships]
-            print("Closest ships selected as targets:", target_ship_ids)
-        target_ship_ids = tuple(target_ship_ids)
+        target_ship_ids = resolve_target_ship_ids(file_name, ship_id, date_time, data.get('selectedTsIds'))
 
         vo_region, vo_geojson = cached_compute_vo_region(file_name, target_ship_ids, date_time, time_length)
-        print("Velocity Obstacle region Geojson calculated", vo_geojson)
+        log.debug("Velocity Obstacle region Geojson calculated: %d features", len(vo_geojson['features']))
 
-        return make_response(json.dumps(vo_geojson, indent=2), 200, {'Content-Type': 'application/json'})
+        return geojson_response(simplified(vo_geojson, data.get('zoom')))
 
     except Exception as e:
-        print(e)
+        log.warning("%s failed: %s", request.path, e)
         return jsonify({"error": str(e)}), 400
 
 @app.route("/computation_v", methods=['POST'])
+@with_compute_timeout
 def computation_v():
     try:
         data = request.json
-        print("Received data:", data)
+        log.debug("Received data: %s", data)
 
         ship_type = data.get('shipType')
         file_name = file_mapping.get(ship_type)
@@ -182,14 +312,171 @@ def computation_v():
         time_length = int(data.get('timeLength', 30))
 
         v_region, v_geojson = cached_compute_v_region(file_name, ship_id, date_time, time_length)
-        print("Velocity region Geojson calculated", v_geojson)
 
-        return make_response(json.dumps(v_geojson, indent=2), 200, {'Content-Type': 'application/json'})
+        return geojson_response(simplified(v_geojson, data.get('zoom')))
     
     except Exception as e:
-        print(e)
+        log.warning("%s failed: %s", request.path, e)
         return jsonify({"error": str(e)}), 400
 
+@app.route("/cri_batch", methods=['POST'])
+@with_compute_timeout
+def cri_batch():
+    try:
+        data = request.json
+        log.debug("Received data: %s", data)
+
+        ship_type = data.get('shipType')
+        file_name = file_mapping.get(ship_type)
+        if not file_name:
+            return jsonify({"error": f"No file mapping found for ship_type: {ship_type}"}), 400
+
+        date_time = data.get('datetime')
+        time_length = int(data.get('timeLength', 30))
+        range_m = float(data.get('rangeM', DEFAULT_RANGE_M))
+        max_targets = int(data.get('maxTargets', DEFAULT_MAX_TARGETS))
+        top_n = int(data.get('topN', DEFAULT_TOP_N))
+        approximate = data.get('approximate', False)
+        if not isinstance(approximate, bool):
+            return jsonify({"error": "approximate must be true or false"}), 400
+        samples = int(data.get('samples', DEFAULT_SAMPLES))
+        if samples <= 0 or samples > MAX_TCR_SAMPLES:
+            return jsonify({"error": f"samples must be between 1 and {MAX_TCR_SAMPLES}"}), 400
+
+        result = fleet_cri(file_name, date_time, time_length, range_m, max_targets, top_n, approximate=approximate, samples=samples)
+        log.info("Fleet CRI: %d pairs evaluated, %d skipped", result['pairs_evaluated'], result['pairs_skipped'])
+        return jsonify(result)
+
+    except Exception as e:
+        log.warning("%s failed: %s", request.path, e)
+        return jsonify({"error": str(e)}), 400
+
+@app.route("/maneuver_advisory", methods=['POST'])
+@with_compute_timeout
+def maneuver_advisory():
+    try:
+        data = request.json
+        log.debug("Received data: %s", data)
+
+        ship_type = data.get('shipType')
+        file_name = file_mapping.get(ship_type)
+        if not file_name:
+            return jsonify({"error": f"No file mapping found for ship_type: {ship_type}"}), 400
+
+        ship_id = data.get('shipId')
+        date_time = data.get('datetime')
+        time_length = int(data.get('timeLength', 30))
+        samples = int(data.get('samples', DEFAULT_SAMPLES))
+        if samples <= 0 or samples > MAX_TCR_SAMPLES:
+            return jsonify({"error": f"samples must be between 1 and {MAX_TCR_SAMPLES}"}), 400
+
+        target_ship_ids = resolve_target_ship_ids(file_name, ship_id, date_time, data.get('selectedTsIds'))
+        vo_region, _ = cached_compute_vo_region(file_name, target_ship_ids, date_time, time_length)
+        own_features = load_geojson_selected_time(file_name, ship_id, date_time, 0)['features']
+        target_features = [feature for target_ship_id in target_ship_ids
+                           for feature in load_geojson_selected_time(file_name, target_ship_id, date_time, 0)['features'][:1]]
+        if not own_features:
+            raise ValueError("Own ship not found at the given datetime")
+
+        advisory = advise_maneuver(
+            own_features[0], target_features, vo_region, time_length,
+            course_span=float(data.get('courseSpan', DEFAULT_COURSE_SPAN)),
+            course_step=float(data.get('courseStep', DEFAULT_COURSE_STEP)),
+            speed_span=float(data.get('speedSpan', DEFAULT_SPEED_SPAN)),
+            speed_step=float(data.get('speedStep', DEFAULT_SPEED_STEP)),
+            samples=samples,
+            budget_ms=float(data.get('budgetMs', ADVISORY_BUDGET_MS)),
+            top_n=int(data.get('topN', DEFAULT_MANEUVER_TOP_N)),
+        )
+        log.info("Maneuver advisory: %d of %d candidates in %.1f ms", advisory['evaluated'], advisory['total'], advisory['elapsed_ms'])
+        return jsonify(advisory)
+
+    except Exception as e:
+        log.warning("%s failed: %s", request.path, e)
+        return jsonify({"error": str(e)}), 400
+
+@app.route("/cri_series", methods=['POST'])
+@with_compute_timeout
+def computation_series():
+    try:
+        data = request.json
+        log.debug("Received data: %s", data)
+
+        ship_type = data.get('shipType')
+        file_name = file_mapping.get(ship_type)
+        if not file_name:
+            return jsonify({"error": f"No file mapping found for ship_type: {ship_type}"}), 400
+
+        ship_id = data.get('shipId')
+        start_time = data.get('startDatetime')
+        end_time = data.get('endDatetime')
+        time_length = int(data.get('timeLength', 30))
+        target_ship_ids = data.get('selectedTsIds')
+
+        result = cri_series(file_name, ship_id, start_time, end_time, time_length, target_ship_ids)
+        return jsonify(result)
+
+    except Exception as e:
+        log.warning("%s failed: %s", request.path, e)
+        return jsonify({"error": str(e)}), 400
+
+
+def cached_resample_track(file_name, ship_id, start_time, end_time, step_seconds):
+    key = cache_key('trajectory', file_name, get_catalog(file_name).version, start_time, str(ship_id), canonical_datetime(end_time), step_seconds)
+    start, end = to_epoch(start_time), to_epoch(end_time)
+
+    def compute():
+        # The reports just outside the range are needed to interpolate its ends
+        dataset = get_dataset(file_name, start=start - MAX_GAP_SECONDS, end=end + MAX_GAP_SECONDS)
+        return resample_track(dataset, ship_id, start, end, step_seconds)
+    return result_cache.get_or_compute(key, compute)
+
+@app.route("/trajectory", methods=['GET'])
+def trajectory():
+    ship_type = request.args.get('shipType')
+    file_name = file_mapping.get(ship_type)
+    if not file_name:
+        return jsonify({"error": f"No file mapping found for ship_type: {ship_type}"}), 400
+
+    try:
+        ship_id = request.args.get('shipId')
+        start_time = request.args.get('startDatetime')
+        end_time = request.args.get('endDatetime')
+        step_seconds = int(request.args.get('stepSeconds', 60))
+        features = cached_resample_track(file_name, ship_id, start_time, end_time, step_seconds)
+    except Exception as e:
+        log.warning("%s failed: %s", request.path, e)
+        return jsonify({"error": str(e)}), 400
+
+    return geojson_response({"type": "FeatureCollection", "features": features})
+
+
+@app.route("/playback", methods=['GET'])
+def playback():
+    ship_type = request.args.get('shipType')
+    file_name = file_mapping.get(ship_type)
+    if not file_name:
+        return jsonify({"error": f"No file mapping found for ship_type: {ship_type}"}), 400
+
+    try:
+        start_time = request.args.get('startDatetime')
+        end_time = request.args.get('endDatetime')
+        own_ship_id = request.args.get('ownShipId')
+        time_length = int(request.args.get('timeLength', 30))
+        target_ship_ids = [ship_id for ship_id in request.args.get('selectedTsIds', '').split(',') if ship_id]
+        precision = request_precision()
+
+        frames = playback_frames(file_name, start_time, end_time, own_ship_id, time_length, target_ship_ids, precision if precision is not None else 15)
+        # Pull the first frame here so bad ranges are reported as a 400, not a broken stream
+        first = next(frames, None)
+    except Exception as e:
+        log.warning("%s failed: %s", request.path, e)
+        return jsonify({"error": str(e)}), 400
+
+    log.info("Playback of %s from %s to %s", file_name, start_time, end_time)
+    frames = itertools.chain([first], frames) if first is not None else iter(())
+    return frame_stream_response(frames, precision, wants_event_stream(), compute_deadline())
+
 
 # app running
 if __name__ == "__main__":
@@ -0,0 +1,118 @@
+import functools
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from flask import copy_current_request_context, jsonify, request
+
+from ais_store import AISDataset, get_catalog
+from domain_store import get_domain_store
+
+log = logging.getLogger(__name__)
+
+# Seconds a request may spend computing before it gets a 504; 0 disables the limit.
+# A computation still queued at the deadline is cancelled. One already running cannot
+# be stopped from outside its thread: it runs to the end and still fills the result
+# cache, so a retry picks up its result.
+COMPUTE_TIMEOUT = float(os.environ.get('FURIOUS_COMPUTE_TIMEOUT', 60))
+COMPUTE_THREADS = int(os.environ.get('FURIOUS_COMPUTE_THREADS', 8))
+# Computations that may wait for a thread; past this a request gets a 503 at once
+COMPUTE_QUEUE = int(os.environ.get('FURIOUS_COMPUTE_QUEUE', COMPUTE_THREADS))
+OVERLOAD_RETRY_AFTER = 5
+
+_executor = None
+_executor_pid = None
+_slots = None
+_executor_lock = threading.Lock()
+
+_started = time.time()
+_preloaded = []
+
+
+def _compute_executor():
+    """(pool, slots): the worker's compute threads and the semaphore bounding running plus queued computations."""
+    # Threads do not survive fork, so each worker process starts its own pool
+    global _executor, _executor_pid, _slots
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=COMPUTE_THREADS, thread_name_prefix='compute')
+            _slots = threading.BoundedSemaphore(COMPUTE_THREADS + COMPUTE_QUEUE)
+            _executor_pid = os.getpid()
+        return _executor, _slots
+
+
+def with_compute_timeout(view):
+    """Run a Flask view in the compute pool and answer 504 if it takes longer than COMPUTE_TIMEOUT.
+
+    A computation holds its slot until it finishes, even after its request timed
+    out, so runaway computations fill the queue and further requests get a 503.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if COMPUTE_TIMEOUT <= 0:
+            return view(*args, **kwargs)
+        executor, slots = _compute_executor()
+        if not slots.acquire(blocking=False):
+            log.warning("%s: compute pool and queue are full", view.__name__)
+            response = jsonify({"error": "Server is busy, retry later"})
+            return response, 503, {'Retry-After': str(OVERLOAD_RETRY_AFTER)}
+        future = executor.submit(copy_current_request_context(view), *args, **kwargs)
+        future.add_done_callback(lambda _: slots.release())
+        try:
+            return future.result(timeout=COMPUTE_TIMEOUT)
+        except TimeoutError:
+            # Only succeeds while the computation is still queued; a running one finishes in the background
+            cancelled = future.cancel()
+            log.warning("%s: computation timed out after %gs (%s)", view.__name__, COMPUTE_TIMEOUT,
+                        'cancelled' if cancelled else 'still running')
+            return jsonify({"error": f"Computation timed out after {COMPUTE_TIMEOUT:g}s"}), 504
+    return wrapper
+
+
+def compute_deadline():
+    """perf_counter time at which the current request runs out of compute time, or None without a limit.
+
+    For work that runs after the view returns, such as a stream's generator,
+    which with_compute_timeout cannot cover.
+    """
+    if COMPUTE_TIMEOUT <= 0:
+        return None
+    return request.environ.get('furious.started', time.perf_counter()) + COMPUTE_TIMEOUT
+
+
+def preload_datasets(file_names):
+    """Load datasets and their derived indexes up front, e.g. in the gunicorn master before forking."""
+    for file_name in file_names:
+        try:
+            dataset = get_catalog(file_name)
+            # Partitioned stores only read their manifest; partitions load on first use
+            if isinstance(dataset, AISDataset):
+                dataset.time_index
+                dataset.fingerprint()
+                get_domain_store(dataset)
+        except (OSError, ValueError) as e:
+            log.error("Could not preload %s: %s", file_name, e)
+        else:
+            _preloaded.append(file_name)
+
+
+def readiness(file_names):
+    """(ready, details): ready when every dataset is loaded (loading any that is not yet)."""
+    datasets = {}
+    for file_name in file_names:
+        try:
+            dataset = get_catalog(file_name)
+            datasets[file_name] = {'rows': len(dataset), 'ships': len(dataset.ship_table), 'source': dataset.version[1]}
+        except (OSError, ValueError) as e:
+            datasets[file_name] = {'error': str(e)}
+
+    ready = all('error' not in status for status in datasets.values())
+    return ready, {
+        'ready': ready,
+        'pid': os.getpid(),
+        'uptime_s': round(time.time() - _started, 1),
+        'preloaded': _preloaded,
+        'datasets': datasets,
+    }
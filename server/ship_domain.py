@@ -0,0 +1,118 @@
+import numpy as np
+import shapely
+
+KNOTS_TO_MPS = 0.514444
+METER_TO_DEGREES = 1 / 111320
+NUM_POINTS = 100
+
+MODES = ('head_on', 'crossing', 'overtaking')
+HEAD_ON, CROSSING, OVERTAKING = range(len(MODES))
+
+
+def encounter_modes(own_cog, target_cog):
+    relative_bearing = np.mod(np.asarray(own_cog, dtype=np.float64) - target_cog, 360)
+
+    modes = np.full(relative_bearing.shape, HEAD_ON, dtype=np.int8)
+    modes[((5 <= relative_bearing) & (relative_bearing < 112.5)) | ((247.5 <= relative_bearing) & (relative_bearing < 355))] = CROSSING
+    modes[(112.5 <= relative_bearing) & (relative_bearing < 247.5)] = OVERTAKING
+    return modes
+
+
+def mode_names(modes):
+    return np.asarray(MODES, dtype=object)[np.asarray(modes)]
+
+
+def compute_k_factors(L, v):
+    k_AD = L * np.exp(0.3591 * np.log(v) + 0.0952)
+    k_DT = L * np.exp(0.5441 * np.log(v) - 0.0795)
+    return k_AD, k_DT
+
+
+def compute_R_factors(L, k_AD, k_DT, s):
+    R_fore = (L + (1 + s) * 0.67 * np.sqrt(k_AD**2 + (k_DT / 2)**2))
+    R_aft = (L + 0.67 * np.sqrt(k_AD**2 + (k_DT / 2)**2))
+    R_starb = (0.2 + k_DT) * L
+    R_port = (0.2 + 0.75 * k_DT) * L
+    return R_fore, R_aft, R_starb, R_port
+
+
+def calculate_alpha(own_ship_position, target_ship_position, own_ship_cog):
+    dx = target_ship_position[0] - own_ship_position[0]
+    dy = target_ship_position[1] - own_ship_position[1]
+    relative_bearing = np.arctan2(dy, dx)
+
+    own_ship_cog_rad = np.deg2rad(own_ship_cog)
+    alpha = relative_bearing - own_ship_cog_rad
+    return alpha
+
+
+def domain_axes(L, sog, lat, target_sog, alpha, modes):
+    """Semi-axes and centre offsets (degrees) of the ship domain, broadcast over any array shape."""
+    L, lat, alpha, modes = map(np.asarray, (L, lat, alpha, modes))
+    v = np.asarray(sog, dtype=np.float64) * KNOTS_TO_MPS
+    vt = np.asarray(target_sog, dtype=np.float64) * KNOTS_TO_MPS
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        k_AD, k_DT = compute_k_factors(L, v)
+        s = np.select(
+            [modes == HEAD_ON, modes == CROSSING, modes == OVERTAKING],
+            [2 - (v - vt) / v, 2 - alpha / np.pi, np.ones_like(v)],
+            np.nan,
+        )
+        R_fore, R_aft, R_starb, R_port = compute_R_factors(L, k_AD, k_DT, s)
+
+    a = (abs(R_fore) + abs(R_aft)) / 2
+    b = (abs(R_starb) + abs(R_port)) / 2
+
+    delta_a = abs(R_fore) - a
+    delta_b = abs(R_starb) - b
+
+    scale = METER_TO_DEGREES / np.cos(np.radians(lat))
+    return a * scale, b * scale, delta_a * scale, delta_b * scale
+
+
+def ellipse_rings(lon, lat, cog, a_deg, b_deg, delta_a_deg, delta_b_deg, num_points=NUM_POINTS):
+    """Closed domain rings as an array of shape (*batch, num_points + 1, 2)."""
+    lon, lat, cog, a_deg, b_deg, delta_a_deg, delta_b_deg = (
+        np.asarray(value, dtype=np.float64)[..., np.newaxis]
+        for value in (lon, lat, cog, a_deg, b_deg, delta_a_deg, delta_b_deg)
+    )
+    theta = 2.0 * np.pi * np.arange(num_points, dtype=np.float64) / float(num_points)
+    x = a_deg * np.cos(theta)
+    y = b_deg * np.sin(theta)
+
+    cog_rad = np.radians(cog)
+    x_rot = x * np.cos(cog_rad) - y * np.sin(cog_rad)
+    y_rot = x * np.sin(cog_rad) + y * np.cos(cog_rad)
+
+    rings = np.stack((lon + x_rot - delta_a_deg, lat + y_rot - delta_b_deg), axis=-1)
+    return np.concatenate((rings, rings[..., :1, :]), axis=-2)
+
+
+def build_ellipses(L, sog, cog, lon, lat, target_sog, alpha, modes, num_points=NUM_POINTS):
+    """Ship domain rings for whole windows at once.
+
+    Every argument is an array of the same (broadcastable) shape, e.g. (T,) for
+    one ship over a window or (S, T) for several ships. Returns coordinates of
+    shape (*shape, num_points + 1, 2).
+    """
+    a_deg, b_deg, delta_a_deg, delta_b_deg = domain_axes(L, sog, lat, target_sog, alpha, modes)
+    return ellipse_rings(lon, lat, cog, a_deg, b_deg, delta_a_deg, delta_b_deg, num_points)
+
+
+def ellipse_polygons(rings):
+    return shapely.polygons(rings)
+
+
+def ellipse_feature(ring, cog, mode):
+    return {
+        "type": "Feature",
+        "geometry": {
+            "type": "Polygon",
+            "coordinates": [ring.tolist()]
+        },
+        "properties": {
+            "angle": cog,
+            "mode": mode
+        }
+    }
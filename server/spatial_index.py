@@ -0,0 +1,121 @@
+"""Per-timestamp nearest-ship index.
+
+Ships are placed on a sphere (ECEF coordinates) and indexed with a KD-tree.
+Chord length is monotonic in great-circle distance, so the tree returns the
+same candidates as a haversine scan; distances are then refined with a
+vectorized haversine.
+
+Tolerance against the previous ``geopy.distance.geodesic`` (WGS84) path:
+spherical distances differ from ellipsoidal ones by at most ~0.56% (north-south
+near the equator), so the selected targets are identical unless two candidates
+lie within that of each other's distance, in which case their order may swap.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+EARTH_RADIUS_M = 6371008.8
+GEODESIC_TOLERANCE = 0.006
+MAX_INDEXES = 256
+
+
+def to_ecef(lon, lat):
+    lon, lat = np.radians(lon), np.radians(lat)
+    cos_lat = np.cos(lat)
+    return EARTH_RADIUS_M * np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
+
+
+def haversine_m(lon1, lat1, lon2, lat2):
+    lon1, lat1, lon2, lat2 = map(np.radians, (lon1, lat1, lon2, lat2))
+    h = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(h, 0, 1)))
+
+
+def chord_m(distance_m):
+    return 2 * EARTH_RADIUS_M * np.sin(np.minimum(distance_m, np.pi * EARTH_RADIUS_M) / (2 * EARTH_RADIUS_M))
+
+
+class SpatialIndex:
+    def __init__(self, rows, lon, lat):
+        self.rows = np.asarray(rows, dtype=np.int64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.tree = cKDTree(to_ecef(self.lon, self.lat)) if len(self.rows) else None
+        self._lonlat_tree = None
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _refine(self, positions, lon, lat, exclude_rows, max_range_m, k=None):
+        positions = np.asarray(positions, dtype=np.int64)
+        positions = positions[positions < len(self.rows)]
+        if exclude_rows is not None:
+            positions = positions[~np.isin(self.rows[positions], exclude_rows)]
+
+        distances = haversine_m(lon, lat, self.lon[positions], self.lat[positions])
+        order = np.argsort(distances, kind='stable')
+        if max_range_m is not None:
+            order = order[distances[order] <= max_range_m]
+        if k is not None:
+            order = order[:k]
+        return self.rows[positions[order]], distances[order]
+
+    def nearest(self, lon, lat, k=3, max_range_m=None, exclude_rows=None):
+        """Return (rows, distances_m) of the k nearest ships, closest first."""
+        if self.tree is None or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        excluded = 0 if exclude_rows is None else len(np.atleast_1d(exclude_rows))
+        query_k = min(k + excluded, len(self.rows))
+        upper = np.inf if max_range_m is None else chord_m(max_range_m) * (1 + 1e-9)
+        _, positions = self.tree.query(to_ecef(lon, lat)[0], k=[*range(1, query_k + 1)], distance_upper_bound=upper)
+        return self._refine(positions, lon, lat, exclude_rows, max_range_m, k)
+
+    def within(self, lon, lat, radius_m, exclude_rows=None):
+        """Return (rows, distances_m) of every ship within radius_m, closest first."""
+        if self.tree is None:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        positions = self.tree.query_ball_point(to_ecef(lon, lat)[0], chord_m(radius_m) * (1 + 1e-9))
+        return self._refine(positions, lon, lat, exclude_rows, radius_m)
+
+    def in_bbox(self, min_lon, min_lat, max_lon, max_lat):
+        """Rows of the ships inside a lon/lat box, in index order; min_lon > max_lon wraps across the antimeridian."""
+        if self.tree is None:
+            return np.empty(0, dtype=np.int64)
+        if min_lon > max_lon:
+            return np.concatenate((self.in_bbox(min_lon, min_lat, 180.0, max_lat), self.in_bbox(-180.0, min_lat, max_lon, max_lat)))
+
+        if self._lonlat_tree is None:
+            self._lonlat_tree = cKDTree(np.column_stack((self.lon, self.lat)))
+        # The square around the box's center holds the box; its corners are trimmed after
+        half = max(max_lon - min_lon, max_lat - min_lat) / 2
+        center = ((min_lon + max_lon) / 2, (min_lat + max_lat) / 2)
+        positions = np.sort(np.asarray(self._lonlat_tree.query_ball_point(center, half, p=np.inf), dtype=np.int64))
+        inside = (self.lon[positions] >= min_lon) & (self.lon[positions] <= max_lon) & \
+                 (self.lat[positions] >= min_lat) & (self.lat[positions] <= max_lat)
+        return self.rows[positions[inside]]
+
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def snapshot_index(dataset, ts):
+    key = (dataset.version, int(ts))
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is not None:
+            _indexes.move_to_end(key)
+            return index
+
+    rows = dataset.rows_at(ts)
+    index = SpatialIndex(rows, dataset.lon[rows], dataset.lat[rows])
+
+    with _indexes_lock:
+        _indexes[key] = index
+        while len(_indexes) > MAX_INDEXES:
+            _indexes.popitem(last=False)
+    return index
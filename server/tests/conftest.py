@@ -0,0 +1,38 @@
+import os
+import sys
+
+import pytest
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+os.environ.setdefault('FURIOUS_LOG_LEVEL', 'WARNING')
+
+FILE_NAME = 'synthetic_resample10T_test'
+NUM_SHIPS = 40
+HOURS = 6
+
+
+@pytest.fixture(scope='session')
+def workdir(tmp_path_factory):
+    """Working directory whose ./testdata holds a small seeded synthetic file (GeoJSON only)."""
+    from generate_ais import generate
+
+    path = tmp_path_factory.mktemp('furious')
+    generate(FILE_NAME, NUM_SHIPS, HOURS, str(path / 'testdata'), seed=1)
+    cwd = os.getcwd()
+    os.chdir(path)
+    yield path
+    os.chdir(cwd)
+
+
+@pytest.fixture(scope='session')
+def dataset(workdir):
+    from ais_store import get_dataset
+    return get_dataset(FILE_NAME)
+
+
+@pytest.fixture(scope='session')
+def client(workdir):
+    import server
+    server.file_mapping['synthetic'] = FILE_NAME
+    return server.app.test_client()
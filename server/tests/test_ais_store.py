@@ -0,0 +1,98 @@
+import json
+
+import numpy as np
+
+from ais_store import AISDataset, canonical_datetime, dataset_path, format_epoch, get_dataset, to_epoch
+from conftest import FILE_NAME
+
+
+def raw_features():
+    with open(dataset_path(FILE_NAME)) as file:
+        return json.load(file)['features']
+
+
+def test_rows_sorted_by_ship_then_time(dataset):
+    codes = np.asarray(dataset.ship_code)
+    timestamps = np.asarray(dataset.timestamp)
+    assert np.all(np.diff(codes) >= 0)
+    assert np.all((np.diff(codes) > 0) | (np.diff(timestamps) > 0))
+
+
+def test_features_match_geojson(dataset):
+    features = raw_features()
+    assert len(dataset) == len(features)
+    by_key = {(f['properties']['SHIP_ID'], canonical_datetime(f['properties']['RECPTN_DT'])): f for f in features}
+    for row in range(len(dataset)):
+        feature = dataset.feature(row)
+        source = by_key[(feature['properties']['SHIP_ID'], feature['properties']['RECPTN_DT'])]
+        assert feature['properties'] == {**source['properties'], 'RECPTN_DT': feature['properties']['RECPTN_DT']}
+        assert feature['geometry']['coordinates'] == source['geometry']['coordinates']
+
+
+def test_snapshot_rows_match_geojson(dataset):
+    features = raw_features()
+    for ts in dataset.timestamps()[::7].tolist():
+        expected = sorted(f['properties']['SHIP_ID'] for f in features if to_epoch(f['properties']['RECPTN_DT']) == ts)
+        rows = dataset.rows_at(ts)
+        assert sorted(dataset.ship_table[code] for code in dataset.ship_code[rows]) == expected
+
+
+def test_binary_round_trip(dataset, tmp_path):
+    path = str(tmp_path / 'copy.aisb')
+    dataset.save(path)
+    for mmap in (True, False):
+        copy = AISDataset.open(path, mmap=mmap)
+        assert copy.ship_ids() == dataset.ship_ids()
+        assert copy.features(range(len(copy))) == dataset.features(range(len(dataset)))
+        assert np.array_equal(copy.timestamps(), dataset.timestamps())
+
+
+def test_ship_rows_window(dataset):
+    ship_id = dataset.ship_table[0]
+    rows = dataset.ship_rows(ship_id)
+    start, end = int(dataset.timestamp[rows[2]]), int(dataset.timestamp[rows[5]])
+    window = dataset.ship_rows(ship_id, start, end)
+    assert window.tolist() == rows[2:6].tolist()
+    assert str(format_epoch(start)) == dataset.feature(window[0])['properties']['RECPTN_DT']
+
+
+def test_float32_round_trip_serves_source_values(dataset, tmp_path):
+    path = str(tmp_path / 'narrow.aisb')
+    dataset.save(path, float32=True)
+    copy = AISDataset.open(path)
+    assert copy.sog.dtype == np.float32 and copy.decimals == {'sog': 2, 'cog': 1, 'len_pred': 1}
+    assert copy.features(range(len(copy))) == dataset.features(range(len(dataset)))
+    assert np.array_equal(copy.values('sog'), np.asarray(dataset.sog))
+
+
+def test_float32_keeps_columns_it_cannot_narrow(dataset, tmp_path):
+    noisy = dataset.take(np.arange(len(dataset)))
+    noisy.sog = np.asarray(noisy.sog) * 1.234567e-5
+    path = str(tmp_path / 'noisy.aisb')
+    noisy.save(path, float32=True)
+    copy = AISDataset.open(path)
+    assert copy.sog.dtype == np.float64 and 'sog' not in copy.decimals
+    assert np.array_equal(copy.sog, noisy.sog)
+
+
+def test_float32_partitions_serve_source_values(dataset, tmp_path):
+    from partitions import parts_path, write_partitions
+
+    write_partitions(dataset, parts_path('narrow', str(tmp_path)), tile_deg=0.25, float32=True)
+    view = get_dataset('narrow', str(tmp_path))
+    assert view.decimals['sog'] == 2
+    key = lambda feature: (feature['properties']['SHIP_ID'], feature['properties']['RECPTN_DT'])
+    assert sorted(view.features(range(len(view))), key=key) == sorted(dataset.features(range(len(dataset))), key=key)
+
+
+def test_fingerprint_covers_positions_and_motion(dataset, tmp_path):
+    path = str(tmp_path / 'narrow.aisb')
+    dataset.save(path, float32=True)
+    assert AISDataset.open(path).fingerprint() == dataset.fingerprint()
+
+    for column in ('lon', 'lat', 'sog', 'cog', 'len_pred'):
+        moved = dataset.take(np.arange(len(dataset)))
+        values = np.array(getattr(moved, column), dtype=np.float64)
+        values[len(values) // 2] += 1
+        setattr(moved, column, values)
+        assert moved.fingerprint() != dataset.fingerprint(), column
@@ -0,0 +1,37 @@
+import shutil
+
+from ais_store import dataset_path, format_epoch
+from approx_tcr import approximate_tcr, validate
+from calculation_cri import compute_tcr, compute_v_region, compute_vo_region, find_three_closest_ships
+from conftest import FILE_NAME
+
+
+def test_validate_reads_only_its_data_dir(workdir, tmp_path):
+    # A name that exists only in data_dir: any lookup in ./testdata would fail
+    data_dir = tmp_path / 'elsewhere'
+    data_dir.mkdir()
+    shutil.copy(dataset_path(FILE_NAME), data_dir / 'relocated.geojson')
+    report = validate('relocated', str(data_dir), max_pairs=5)
+    assert report['pairs'] == 5
+    assert report['max_abs_error'] < 0.05
+
+
+def test_approximate_matches_exact_on_partial_overlaps(dataset):
+    # Only pairs whose V region is partly covered say anything about the sampling
+    checked = 0
+    for row in range(0, len(dataset), 7):
+        own_ship_id = dataset.ship_table[dataset.ship_code[row]]
+        recptn_dt_str = str(format_epoch(dataset.timestamp[row]))
+        try:
+            targets = tuple(ship['properties']['SHIP_ID'] for ship in find_three_closest_ships(FILE_NAME, own_ship_id, recptn_dt_str, k=1))
+            vo_region, vo_geojson = compute_vo_region(FILE_NAME, targets, recptn_dt_str)
+            v_region, v_geojson = compute_v_region(FILE_NAME, own_ship_id, recptn_dt_str)
+            exact, _, _ = compute_tcr(vo_region, v_region, vo_geojson, v_geojson)
+        except ValueError:
+            continue
+        if not 0.05 < exact < 0.95:
+            continue
+        approx = approximate_tcr(FILE_NAME, own_ship_id, targets, recptn_dt_str)
+        assert abs(approx['tcr'] - exact) < 0.02
+        checked += 1
+    assert checked
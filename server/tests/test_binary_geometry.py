@@ -0,0 +1,28 @@
+from binary_geometry import pack_geojson, unpack_geojson
+
+
+def point(lon, lat, **properties):
+    return {'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [lon, lat]}, 'properties': properties}
+
+
+def test_round_trip_keeps_property_types():
+    collection = {'type': 'FeatureCollection', 'features': [
+        point(126.5, 35.1, flag=True, count=1, speed=12.5, name='a', mixed=True, maybe=None),
+        point(126.6, 35.2, flag=False, count=2, speed=3.0, name='1', mixed=1),
+        point(126.7, 35.3, count=None, speed=0.25, name='b', mixed='1', maybe=4),
+        point(126.8, 35.4, flag=None, mixed=[1, 'x'], maybe=None),
+    ]}
+    decoded = unpack_geojson(pack_geojson(collection))
+
+    expected = [{key: value for key, value in feature['properties'].items() if value is not None}
+                for feature in collection['features']]
+    properties = [feature['properties'] for feature in decoded['features']]
+    assert properties == expected
+    # == alone would let True pass for 1 and 1.0 for 1
+    for got, want in zip(properties, expected):
+        assert {key: type(value) for key, value in got.items()} == {key: type(value) for key, value in want.items()}
+
+    for got, want in zip(decoded['features'], collection['features']):
+        assert got['geometry']['type'] == 'Point'
+        assert abs(got['geometry']['coordinates'][0] - want['geometry']['coordinates'][0]) < 1e-6
+        assert abs(got['geometry']['coordinates'][1] - want['geometry']['coordinates'][1]) < 1e-6
@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+
+from cpa import DEGREES_TO_METERS, compute_cpa, governing_target, tcpa_prime
+from ship_domain import KNOTS_TO_MPS
+
+OWN = (126.0, 35.0)
+EAST_M_PER_DEG = DEGREES_TO_METERS * np.cos(np.radians(OWN[1]))
+
+
+def cpa(own_sog, own_cog, target_lon, target_lat, target_sog, target_cog):
+    result = compute_cpa(OWN, own_sog, own_cog, [target_lon], [target_lat], [target_sog], [target_cog])
+    return {key: float(np.ravel(value)[0]) for key, value in result.items()}
+
+
+def test_head_on():
+    # Target 0.1 degrees dead ahead, both at 10 knots towards each other
+    result = cpa(10, 0, OWN[0], OWN[1] + 0.1, 10, 180)
+    closing_speed = 20 * KNOTS_TO_MPS
+    assert result['dcpa'] == pytest.approx(0, abs=1e-6)
+    assert result['tcpa'] == pytest.approx(0.1 * DEGREES_TO_METERS / closing_speed / 60)
+    assert result['range_m'] == pytest.approx(0.1 * DEGREES_TO_METERS)
+
+
+def test_abeam_target_is_at_its_closest():
+    # Target 0.02 degrees to starboard on a parallel course that is slower: the range only opens from here
+    result = cpa(10, 0, OWN[0] + 0.02, OWN[1], 5, 0)
+    assert result['tcpa'] == pytest.approx(0, abs=1e-9)
+    assert result['dcpa'] == pytest.approx(0.02 * EAST_M_PER_DEG)
+    assert result['bearing'] == pytest.approx(90, abs=0.5)
+
+
+def test_crossing_passes_ahead():
+    # Target 1000 m east heading west at the own speed, own ship heading north: they meet at 45 degrees
+    result = cpa(10, 0, OWN[0] + 1000 / EAST_M_PER_DEG, OWN[1], 10, 270)
+    speed = 10 * KNOTS_TO_MPS
+    assert result['tcpa'] == pytest.approx(1000 / (2 * speed) / 60)
+    assert result['dcpa'] == pytest.approx(1000 / np.sqrt(2))
+
+
+def test_parallel_same_velocity_keeps_range():
+    result = cpa(12, 45, OWN[0] + 0.01, OWN[1] + 0.01, 12, 45)
+    assert result['tcpa'] == 0
+    assert result['dcpa'] == pytest.approx(result['range_m'])
+
+
+def test_both_stationary():
+    result = cpa(0, 0, OWN[0] + 0.01, OWN[1], 0, 123)
+    assert result['tcpa'] == 0
+    assert result['dcpa'] == pytest.approx(0.01 * EAST_M_PER_DEG)
+
+
+def test_receding_target_has_negative_tcpa():
+    result = cpa(10, 0, OWN[0], OWN[1] - 0.05, 5, 180)
+    assert result['tcpa'] < 0
+    assert result['dcpa'] == pytest.approx(0, abs=1e-6)
+
+
+def test_broadcasts_candidates_against_targets():
+    courses = np.array([0.0, 90.0, 180.0])[:, np.newaxis]
+    result = compute_cpa(OWN, 10, courses, [OWN[0], OWN[0] + 0.05], [OWN[1] + 0.05, OWN[1]], [0, 0], [0, 0])
+    assert result['tcpa'].shape == (3, 2)
+    assert result['dcpa'][0, 0] == pytest.approx(0, abs=1e-6)
+    assert result['dcpa'][1, 1] == pytest.approx(0, abs=1e-6)
+    assert result['tcpa'][2, 0] < 0
+
+
+def test_tcpa_prime_and_governing_target():
+    assert tcpa_prime([-1, 0, 15, 30, 45]).tolist() == [0.0, 1.0, 0.5, 0.0, 0.0]
+    assert governing_target([20, 5, -3]) == 1
+
+
+def test_approaching_target_outranks_receding_one():
+    # Target A 0.05 degrees ahead closing head-on; target B 0.05 degrees astern and falling behind
+    result = compute_cpa(OWN, 10, 0, [OWN[0], OWN[0]], [OWN[1] + 0.05, OWN[1] - 0.05], [5, 5], [180, 180])
+    approaching, receding = result['tcpa']
+    assert approaching > 0 > receding
+    weights = tcpa_prime(result['tcpa'])
+    assert weights[0] > weights[1] == 0
+    assert governing_target(result['tcpa']) == 0
+    assert governing_target([-1.5, 6.0]) == 1
@@ -0,0 +1,34 @@
+import threading
+
+import fleet_cri
+from ais_store import format_epoch
+from conftest import FILE_NAME
+
+
+def test_concurrent_scans_share_one_pool(workdir, dataset, monkeypatch):
+    monkeypatch.setattr(fleet_cri, 'FLEET_WORKERS', 2)
+    date_time = str(format_epoch(int(dataset.timestamps()[10])))
+    serial = fleet_cri.fleet_cri(FILE_NAME, date_time, approximate=True, samples=256, workers=1)
+    assert serial['pairs_evaluated'] > 0
+
+    results, errors = [], []
+
+    def scan(workers):
+        try:
+            results.append(fleet_cri.fleet_cri(FILE_NAME, date_time, approximate=True, samples=256, workers=workers))
+        except Exception as e:
+            errors.append(e)
+
+    # Different worker counts used to replace the shared pool while another scan was still submitting to it
+    threads = [threading.Thread(target=scan, args=(workers,)) for workers in (2, 3, None, 2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    executor = fleet_cri.get_executor()
+    assert executor._max_workers == 2
+    for result in results:
+        assert [(pair['own_ship_id'], pair['target_ship_id'], pair['cri']) for pair in result['pairs']] == \
+            [(pair['own_ship_id'], pair['target_ship_id'], pair['cri']) for pair in serial['pairs']]
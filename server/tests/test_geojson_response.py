@@ -0,0 +1,32 @@
+import gzip
+import json
+
+from ais_store import format_epoch
+from calculation_cri import load_geojson_selected
+from conftest import FILE_NAME
+
+
+def snapshot_url(dataset, **params):
+    ts = int(dataset.timestamps()[5])
+    query = '&'.join(f'{key}={value}' for key, value in {'shipType': 'synthetic', 'datetime': str(format_epoch(ts)), **params}.items())
+    return f'/load_geojson_data_selected?{query}', ts
+
+
+def test_gzip_and_plain_bodies_decode_to_the_same_json(client, dataset):
+    url, ts = snapshot_url(dataset, precision='full')
+    plain = client.get(url, headers={'Accept-Encoding': 'identity'})
+    zipped = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in plain.headers
+    assert zipped.headers['Content-Encoding'] == 'gzip'
+
+    expected = json.loads(json.dumps(load_geojson_selected(FILE_NAME, str(format_epoch(ts)))))
+    assert json.loads(plain.get_data()) == expected
+    assert json.loads(gzip.decompress(zipped.get_data())) == expected
+
+
+def test_encoding_is_timed_inside_the_request(client, dataset):
+    url, _ = snapshot_url(dataset, precision=3)
+    response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert 'encode;dur=' in response.headers['Server-Timing']
+    features = json.loads(gzip.decompress(response.get_data()))['features']
+    assert all(round(value, 3) == value for feature in features for value in feature['geometry']['coordinates'])
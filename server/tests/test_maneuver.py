@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+import shapely
+
+from maneuver import advise_maneuver
+
+OWN = np.array([126.0, 35.0])
+OWN_COG = 45.0
+# At a course of 45 the V region of compute_v_region lies along the heading
+AHEAD = np.array([1.0, 1.0]) / np.sqrt(2)
+PORT = np.array([-1.0, 1.0]) / np.sqrt(2)
+# A positive course change is a turn to starboard, so turning away from the port side is positive
+
+
+def feature(ship_id, position, sog, cog):
+    return {
+        "type": "Feature",
+        "geometry": {"type": "Point", "coordinates": [float(position[0]), float(position[1])]},
+        "properties": {"SHIP_ID": ship_id, "SOG": sog, "COG": cog},
+    }
+
+
+def advise(target, track):
+    own = feature('own', OWN, 12.0, OWN_COG)
+    vo_region = shapely.LineString(track).buffer(0.005)
+    return advise_maneuver(own, [target], vo_region, speed_span=0, budget_ms=float('inf'))
+
+
+@pytest.mark.parametrize('side', [1, -1], ids=['port', 'starboard'])
+def test_head_on_turns_away_from_the_target_track(side):
+    # Reciprocal course, its track passing just off the own ship's port (or starboard) side
+    start, end = OWN + 0.03 * AHEAD + side * 0.004 * PORT, OWN - 0.03 * AHEAD + side * 0.004 * PORT
+    advisory = advise(feature('target', start, 10.0, OWN_COG + 180), [start, end])
+
+    best = advisory['candidates'][0]
+    assert advisory['complete'] and advisory['current']['cri'] > 0
+    assert best['cri'] < advisory['current']['cri']
+    assert np.sign(best['course_change']) == side
+
+
+@pytest.mark.parametrize('side', [1, -1], ids=['port', 'starboard'])
+def test_crossing_turns_away_from_the_approaching_target(side):
+    # Target on the port (or starboard) bow, crossing towards the own ship's track
+    start, end = OWN + 0.02 * AHEAD + side * 0.03 * PORT, OWN + 0.02 * AHEAD + side * 0.002 * PORT
+    advisory = advise(feature('target', start, 10.0, OWN_COG + side * 90), [start, end])
+
+    best = advisory['candidates'][0]
+    assert advisory['current']['cri'] > 0 and advisory['current']['tcpa'] > 0
+    assert best['cri'] < advisory['current']['cri']
+    assert np.sign(best['course_change']) == side
+    assert best['governing_ship_id'] == 'target'
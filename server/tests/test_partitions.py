@@ -0,0 +1,94 @@
+import logging
+import threading
+import time
+
+import numpy as np
+
+from ais_store import get_dataset
+from domain_store import DomainStore, get_domain_store, store_path
+from partitions import DatasetRegistry, parts_path, write_partitions
+from ship_domain import NUM_POINTS
+
+
+def test_view_matches_monolithic_file(dataset, tmp_path):
+    write_partitions(dataset, parts_path('parted', str(tmp_path)), tile_deg=0.5)
+    for ts in dataset.timestamps()[::9].tolist():
+        view = get_dataset('parted', str(tmp_path), start=ts)
+        assert view.version[1] == 'partitioned'
+        expected = sorted(dataset.features(dataset.rows_at(ts)), key=lambda f: f['properties']['SHIP_ID'])
+        assert sorted(view.features(view.rows_at(ts)), key=lambda f: f['properties']['SHIP_ID']) == expected
+
+
+def test_views_skip_precomputed_store_quietly(dataset, tmp_path, caplog):
+    source = dataset.take(np.arange(len(dataset)), name='parted', version=('parted', 'binary', 0))
+    DomainStore.write(store_path('parted', str(tmp_path)), source, np.zeros(len(source), dtype=bool),
+                      np.zeros((len(source), NUM_POINTS + 1, 2)), np.zeros(len(source), dtype=np.int8), {}, NUM_POINTS)
+    source.data_dir = str(tmp_path)
+    assert get_domain_store(source) is not None
+
+    write_partitions(dataset, parts_path('parted', str(tmp_path)))
+    with caplog.at_level(logging.WARNING):
+        view = get_dataset('parted', str(tmp_path), start=int(dataset.timestamps()[0]))
+        assert get_domain_store(view) is None
+    assert not caplog.records
+
+
+class SlowStore:
+    name = 'slow'
+    data_dir = None
+    version = ('slow', 'partitioned', 0)
+
+    def __init__(self, dataset, fail=False):
+        self.dataset = dataset
+        self.fail = fail
+        self.loads = []
+
+    def load(self, keys, version):
+        self.loads.append(keys)
+        time.sleep(0.2 if keys == ('slow',) else 0)
+        if self.fail:
+            raise OSError("unreadable partition")
+        return self.dataset.take(np.arange(10), version=version)
+
+
+def test_loads_run_outside_the_lock(dataset):
+    registry = DatasetRegistry()
+    store = SlowStore(dataset)
+    views = {}
+
+    thread = threading.Thread(target=lambda: views.update(slow=registry.view(store, ('slow',))))
+    waiter = threading.Thread(target=lambda: views.update(waiter=registry.view(store, ('slow',))))
+    thread.start()
+    time.sleep(0.05)
+    waiter.start()
+    started = time.perf_counter()
+    registry.view(store, ('fast',))
+    assert time.perf_counter() - started < 0.1
+    thread.join()
+    waiter.join()
+
+    assert views['slow'] is views['waiter']
+    assert store.loads.count(('slow',)) == 1
+    stats = registry.stats()
+    assert stats['misses'] == 2 and stats['coalesced'] == 1 and stats['in_flight'] == 0
+    assert registry.view(store, ('slow',)) is views['slow']
+
+
+def test_load_errors_reach_waiters(dataset):
+    registry = DatasetRegistry()
+    store = SlowStore(dataset, fail=True)
+    errors = []
+
+    def view():
+        try:
+            registry.view(store, ('slow',))
+        except OSError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=view) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(errors) == 3
+    assert registry.stats()['entries'] == 0 and registry.stats()['in_flight'] == 0
@@ -0,0 +1,51 @@
+import json
+
+import pytest
+
+import serving
+from ais_store import format_epoch
+
+
+def playback(client, dataset, first_tick, last_tick):
+    ticks = dataset.timestamps()
+    url = (f'/playback?shipType=synthetic&format=ndjson&precision=full'
+           f'&startDatetime={format_epoch(ticks[first_tick])}&endDatetime={format_epoch(ticks[last_tick])}')
+    response = client.get(url)
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines() if line]
+
+
+def state(feature):
+    properties = feature['properties']
+    return (*feature['geometry']['coordinates'], properties['SOG'], properties['COG'])
+
+
+def test_deltas_rebuild_every_snapshot(client, dataset):
+    frames = playback(client, dataset, 3, 15)
+    assert any(frame.get('moved') for frame in frames)
+    assert frames[0]['type'] == 'snapshot' and all(frame['type'] == 'delta' for frame in frames[1:])
+
+    ships = {}
+    for tick, frame in enumerate(frames, 3):
+        if frame['type'] == 'snapshot':
+            ships = {feature['properties']['SHIP_ID']: state(feature) for feature in frame['features']}
+        else:
+            for ship_id in frame['disappeared']:
+                del ships[ship_id]
+            for feature in frame['appeared']:
+                ships[feature['properties']['SHIP_ID']] = state(feature)
+            for ship_id, *values in frame['moved']:
+                ships[ship_id] = tuple(values)
+
+        rows = dataset.rows_at(int(dataset.timestamps()[tick]))
+        expected = {feature['properties']['SHIP_ID']: state(feature) for feature in dataset.features(rows)}
+        assert ships.keys() == expected.keys()
+        for ship_id, values in expected.items():
+            assert ships[ship_id] == pytest.approx(values, abs=1e-12)
+
+
+def test_stream_stops_at_the_compute_deadline(client, dataset, monkeypatch):
+    monkeypatch.setattr(serving, 'COMPUTE_TIMEOUT', 1e-9)
+    frames = playback(client, dataset, 3, 15)
+    assert [frame['type'] for frame in frames] == ['snapshot', 'timeout']
+    assert frames[1]['datetime'] == frames[0]['datetime']
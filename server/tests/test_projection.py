@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+import shapely
+from pyproj import Geod
+
+from projection import ORIGIN_GRID, local_transformer, project
+
+GEOD = Geod(ellps='WGS84')
+
+
+def domain_like_polygon(lon, lat, radius_deg=0.02, num_points=100):
+    theta = 2 * np.pi * np.arange(num_points) / num_points
+    return shapely.Polygon(np.column_stack((lon + 1.5 * radius_deg * np.cos(theta), lat + radius_deg * np.sin(theta))))
+
+
+def geodesic_area(polygon):
+    area, _ = GEOD.geometry_area_perimeter(polygon)
+    return abs(area)
+
+
+@pytest.mark.parametrize('lon, lat', [(126.0, 0.0), (126.02, 35.03), (129.5, 60.0)])
+def test_projected_area_matches_geodesic_area(lon, lat):
+    polygons = [domain_like_polygon(lon, lat), domain_like_polygon(lon + 0.3, lat - 0.2, radius_deg=0.05)]
+
+    projected = project(polygons, lon, lat)
+
+    for polygon, local in zip(polygons, projected):
+        assert shapely.area(local) == pytest.approx(geodesic_area(polygon), rel=1e-6)
+
+
+def test_nearby_origins_share_a_transformer():
+    assert local_transformer(126.0, 35.0) is local_transformer(126.0 + ORIGIN_GRID / 3, 35.0 - ORIGIN_GRID / 3)
+    assert local_transformer(126.0, 35.0) is not local_transformer(126.0 + ORIGIN_GRID, 35.0)
+
+
+def test_origin_lies_at_the_snapped_centre():
+    x, y = local_transformer(126.01, 35.01).transform(126.0, 35.0)
+    assert (x, y) == pytest.approx((0, 0), abs=1e-6)
@@ -0,0 +1,147 @@
+import os
+import pickle
+import threading
+import time
+
+import numpy as np
+import pytest
+from shapely.geometry import Point
+
+import result_cache
+from result_cache import ResultCache, cache_key, estimate_size
+
+
+def test_cache_key_normalizes_datetime():
+    assert cache_key('vo', 'f', 1, '2023-05-01T10:00:00.000Z') == cache_key('vo', 'f', 1, '2023-05-01T10:00:00')
+
+
+def test_lru_eviction_by_bytes():
+    cache = ResultCache(max_bytes=2500)
+    for i in range(5):
+        cache.set(i, b'x' * 1000)
+    assert cache.get(0) is None
+    assert cache.get(4) == b'x' * 1000
+    assert cache.stats()['evictions'] >= 3
+
+
+def test_concurrent_misses_are_coalesced():
+    cache = ResultCache()
+    calls = []
+    started = threading.Event()
+
+    def compute():
+        calls.append(1)
+        started.set()
+        time.sleep(0.2)
+        return 42
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute('key', compute))) for _ in range(4)]
+    threads[0].start()
+    started.wait()
+    for thread in threads[1:]:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [42] * 4
+    assert len(calls) == 1
+    assert cache.stats()['coalesced'] == 3
+
+
+def test_waiters_see_the_leader_error():
+    cache = ResultCache()
+    started = threading.Event()
+
+    def compute():
+        started.set()
+        time.sleep(0.1)
+        raise ValueError("boom")
+
+    errors = []
+
+    def call():
+        try:
+            cache.get_or_compute('key', compute)
+        except ValueError as e:
+            errors.append(str(e))
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait()
+    waiter = threading.Thread(target=call)
+    waiter.start()
+    leader.join()
+    waiter.join()
+    assert errors == ["boom", "boom"]
+    with pytest.raises(ValueError):
+        cache.get_or_compute('key', compute)
+
+
+def test_disk_tier_is_shared_and_bounded(tmp_path):
+    disk_dir = str(tmp_path / 'cache')
+    cache = ResultCache(disk_dir=disk_dir, disk_max_bytes=5000)
+    payload = b'x' * 900
+    for i in range(4):
+        cache.set(('vo', i), payload)
+        time.sleep(0.01)
+
+    # Another process (here a fresh cache) finds the entries on disk, and the hit refreshes entry 0
+    other = ResultCache(disk_dir=disk_dir, disk_max_bytes=5000)
+    assert other.get(('vo', 0)) == payload
+    assert other.stats()['disk_hits'] == 1
+    assert oct(os.stat(disk_dir).st_mode & 0o777) == '0o700'
+
+    for i in range(4, 7):
+        time.sleep(0.01)
+        cache.set(('vo', i), payload)
+
+    stats = cache.stats()
+    assert stats['disk_evictions'] >= 2
+    assert stats['disk_bytes'] <= 5000
+    fresh = ResultCache(disk_dir=disk_dir, disk_max_bytes=5000)
+    assert fresh.get(('vo', 0)) == payload
+    assert fresh.get(('vo', 1)) is None
+    assert fresh.get(('vo', 6)) == payload
+
+
+def test_entries_over_the_disk_budget_stay_in_memory(tmp_path):
+    cache = ResultCache(disk_dir=str(tmp_path), disk_max_bytes=100)
+    cache.set(('vo', 1), b'x' * 1000)
+    assert cache.get(('vo', 1)) == b'x' * 1000
+    assert cache.stats()['disk_bytes'] == 0
+
+
+def feature_collection(count):
+    return {'type': 'FeatureCollection', 'features': [
+        {'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [126.0 + i * 1e-3, 35.0]},
+         'properties': {'SHIP_ID': 100000 + i, 'SOG': 12.3, 'COG': 45.6, 'RECPTN_DT': '2023-05-01 00:00:00'}}
+        for i in range(count)
+    ]}
+
+
+@pytest.mark.parametrize('value', [
+    b'x' * 5000, feature_collection(2000), (Point(126, 35).buffer(0.01), feature_collection(10)), np.zeros(1000),
+])
+def test_estimate_is_close_to_the_pickled_size(value):
+    pickled = len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    assert pickled / 2 <= estimate_size(value) <= pickled * 2
+
+
+def test_memory_only_cache_does_not_pickle(monkeypatch):
+    def no_pickle(*args, **kwargs):
+        raise AssertionError("pickled without a disk tier")
+
+    cache = ResultCache(max_bytes=10 * 1024 * 1024)
+    monkeypatch.setattr(result_cache.pickle, 'dumps', no_pickle)
+    value = feature_collection(500)
+    cache.set('key', value)
+    assert cache.get('key') is value
+    assert 0 < cache.stats()['bytes'] < 1024 * 1024
+
+
+def test_values_near_the_budget_are_sized_exactly():
+    value = b'x' * 900
+    cache = ResultCache(max_bytes=1000)
+    cache.set('key', value)
+    assert cache.stats()['bytes'] == len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
@@ -0,0 +1,65 @@
+import pytest
+
+from ais_store import format_epoch
+
+
+def on_tick(dataset, tick=10):
+    ts = int(dataset.timestamps()[tick])
+    rows = dataset.rows_at(ts)
+    # A ship that also reports on the next tick, so the half-tick between them is covered
+    for row in rows.tolist():
+        ship_id = dataset.ship_table[dataset.ship_code[row]]
+        if dataset.row_of(ship_id, ts + 600) is not None:
+            return ship_id, ts
+    pytest.skip("No ship reports on two consecutive ticks")
+
+
+def body(ship_id, ts, **extra):
+    return {'shipType': 'synthetic', 'shipId': ship_id, 'datetime': str(format_epoch(ts)), 'timeLength': 30, **extra}
+
+
+def test_computation_on_tick(client, dataset):
+    ship_id, ts = on_tick(dataset)
+    response = client.post('/computation', json=body(ship_id, ts))
+    assert response.status_code == 200
+    vo_area, v_area, cri, tcr, tcpa, dcpa = response.get_json()
+    assert v_area > 0 and 0 <= tcr <= 1 and 0 <= cri <= 1
+
+
+def test_computation_off_grid_is_interpolated(client, dataset):
+    ship_id, ts = on_tick(dataset)
+    response = client.post('/computation', json=body(ship_id, ts + 180))
+    assert response.status_code == 200
+    assert len(response.get_json()) == 6
+
+    risk = client.post('/risk_assessment', json=body(ship_id, ts + 180)).get_json()
+    assert len(risk['target_ship_ids']) == 3
+
+
+def test_computation_unknown_ship_is_json_400(client, dataset):
+    _, ts = on_tick(dataset)
+    response = client.post('/computation', json=body(-1, ts))
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+def test_target_search_off_grid(workdir, dataset):
+    from calculation_cri import find_closest_ship, find_three_closest_ships
+    from conftest import FILE_NAME
+
+    ship_id, ts = on_tick(dataset)
+    off_grid = str(format_epoch(ts + 300))
+    own, target = find_closest_ship(FILE_NAME, ship_id, off_grid)
+    assert own['properties']['SHIP_ID'] == ship_id
+    assert own['properties']['RECPTN_DT'] == off_grid
+    assert target['properties']['SHIP_ID'] != ship_id
+    closest = find_three_closest_ships(FILE_NAME, ship_id, off_grid)
+    assert closest[0]['properties']['SHIP_ID'] == target['properties']['SHIP_ID']
+
+
+@pytest.mark.parametrize('approximate', ['false', 'true', 0, 1, None])
+def test_cri_batch_rejects_non_boolean_approximate(client, dataset, approximate):
+    _, ts = on_tick(dataset)
+    response = client.post('/cri_batch', json={'shipType': 'synthetic', 'datetime': str(format_epoch(ts)), 'approximate': approximate})
+    assert response.status_code == 400
+    assert 'approximate' in response.get_json()['error']
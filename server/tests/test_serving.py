@@ -0,0 +1,56 @@
+import threading
+import time
+
+import pytest
+from flask import Flask
+
+import serving
+
+
+@pytest.fixture
+def slow_app(monkeypatch):
+    # One thread and one queue slot, so the second and third computations queue and overflow
+    monkeypatch.setattr(serving, 'COMPUTE_TIMEOUT', 0.2)
+    monkeypatch.setattr(serving, 'COMPUTE_THREADS', 1)
+    monkeypatch.setattr(serving, 'COMPUTE_QUEUE', 1)
+    monkeypatch.setattr(serving, '_executor', None)
+    release = threading.Event()
+    ran = []
+
+    app = Flask(__name__)
+
+    @app.route('/slow/<name>')
+    @serving.with_compute_timeout
+    def slow(name):
+        ran.append(name)
+        release.wait(5)
+        return {'name': name}
+
+    yield app.test_client(), release, ran
+    release.set()
+    serving._executor.shutdown(wait=True)
+
+
+def test_timed_out_queued_computation_is_cancelled(slow_app):
+    client, release, ran = slow_app
+    # The first computation takes the only thread and outlives its request
+    assert client.get('/slow/a').status_code == 504
+    # The second waits for that thread past its deadline and never runs
+    assert client.get('/slow/b').status_code == 504
+    release.set()
+    serving._executor.submit(lambda: None).result()
+    assert ran == ['a']
+
+
+def test_full_queue_answers_503(slow_app):
+    client, release, ran = slow_app
+    assert client.get('/slow/a').status_code == 504
+    queued = threading.Thread(target=client.get, args=('/slow/b',))
+    queued.start()
+    # 'a' still runs and 'b' waits, so there is no slot left
+    while serving._slots._value:
+        time.sleep(0.01)
+    response = client.get('/slow/c')
+    assert response.status_code == 503
+    assert response.headers['Retry-After']
+    queued.join()
@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+from ship_domain import MODES, build_ellipses, encounter_modes
+
+KNOTS_TO_MPS = 0.514444
+METER_TO_DEGREES = 1 / 111320
+
+# (own lon, lat, cog, sog, len_pred) and (target lon, lat, cog, sog)
+CASES = [
+    ((126.0, 35.0, 0.0, 12.0, 150.0), (126.0, 35.1, 180.0, 10.0)),
+    ((126.2, 34.8, 45.0, 8.5, 90.0), (126.3, 34.8, 315.0, 14.0)),
+    ((125.9, 35.3, 270.0, 15.0, 220.0), (125.8, 35.31, 280.0, 6.0)),
+    ((126.5, 36.1, 90.0, 20.0, 60.0), (126.6, 36.1, 91.0, 4.0)),
+    ((127.0, 37.5, 350.0, 3.2, 40.0), (127.0, 37.6, 10.0, 3.0)),
+]
+
+
+def scalar_ellipse(own, target, num_points=100):
+    """The original per-pair create_ellipse, point by point."""
+    lon, lat, cog, sog, L = own
+    target_lon, target_lat, target_cog, target_sog = target
+    v, vt = sog * KNOTS_TO_MPS, target_sog * KNOTS_TO_MPS
+
+    k_AD = L * np.exp(0.3591 * np.log(v) + 0.0952)
+    k_DT = L * np.exp(0.5441 * np.log(v) - 0.0795)
+    alpha = np.arctan2(target_lat - lat, target_lon - lon) - np.deg2rad(cog)
+
+    relative_bearing = (cog - target_cog) % 360
+    if 112.5 <= relative_bearing < 247.5:
+        s = 1
+    elif 5 <= relative_bearing < 112.5 or 247.5 <= relative_bearing < 355:
+        s = 2 - alpha / np.pi
+    else:
+        s = 2 - (v - vt) / v
+
+    R_fore = L + (1 + s) * 0.67 * np.sqrt(k_AD**2 + (k_DT / 2)**2)
+    R_aft = L + 0.67 * np.sqrt(k_AD**2 + (k_DT / 2)**2)
+    R_starb = (0.2 + k_DT) * L
+    R_port = (0.2 + 0.75 * k_DT) * L
+    a = (abs(R_fore) + abs(R_aft)) / 2
+    b = (abs(R_starb) + abs(R_port)) / 2
+    delta_a, delta_b = abs(R_fore) - a, abs(R_starb) - b
+
+    scale = METER_TO_DEGREES / np.cos(np.radians(lat))
+    a_deg, b_deg, delta_a_deg, delta_b_deg = a * scale, b * scale, delta_a * scale, delta_b * scale
+    cog_rad = np.radians(cog)
+    points = []
+    for i in range(num_points):
+        theta = 2 * np.pi * i / num_points
+        x, y = a_deg * np.cos(theta), b_deg * np.sin(theta)
+        x_rot = x * np.cos(cog_rad) - y * np.sin(cog_rad)
+        y_rot = x * np.sin(cog_rad) + y * np.cos(cog_rad)
+        points.append([lon + x_rot - delta_a_deg, lat + y_rot - delta_b_deg])
+    points.append(points[0])
+    return np.array(points)
+
+
+def test_cases_cover_every_mode():
+    own_cog = [own[2] for own, _ in CASES]
+    target_cog = [target[2] for _, target in CASES]
+    assert set(MODES[mode] for mode in encounter_modes(own_cog, target_cog)) == set(MODES)
+
+
+def test_vectorized_ellipses_match_scalar_create_ellipse():
+    own, target = (np.array(column, dtype=np.float64).T for column in zip(*CASES))
+    lon, lat, cog, sog, L = own
+    target_lon, target_lat, target_cog, target_sog = target
+    alpha = np.arctan2(target_lat - lat, target_lon - lon) - np.deg2rad(cog)
+
+    rings = build_ellipses(L, sog, cog, lon, lat, target_sog, alpha, encounter_modes(cog, target_cog))
+
+    assert rings.shape == (len(CASES), 101, 2)
+    for ring, (own_case, target_case) in zip(rings, CASES):
+        np.testing.assert_allclose(ring, scalar_ellipse(own_case, target_case), rtol=0, atol=1e-12)
+
+
+@pytest.mark.parametrize('shape', [(2, 3), (6,)])
+def test_batch_shape_does_not_change_rings(shape):
+    own, target = CASES[1]
+    size = int(np.prod(shape))
+    lon, lat, cog, sog, L = (np.full(shape, value) for value in own)
+    target_lon, target_lat, target_cog, target_sog = (np.full(shape, value) for value in target)
+    alpha = np.arctan2(target_lat - lat, target_lon - lon) - np.deg2rad(cog)
+
+    rings = build_ellipses(L, sog, cog, lon, lat, target_sog, alpha, encounter_modes(cog, target_cog))
+
+    assert rings.shape == (*shape, 101, 2)
+    np.testing.assert_allclose(rings.reshape(size, 101, 2), np.broadcast_to(scalar_ellipse(own, target), (size, 101, 2)),
+                               rtol=0, atol=1e-12)
@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+
+from spatial_index import GEODESIC_TOLERANCE, SpatialIndex
+
+geodesic = pytest.importorskip('geopy.distance').geodesic
+
+
+def ring_of_ships(lon, lat, distance_m, count=36):
+    """Ships at one WGS84 geodesic distance from (lon, lat), every 10 degrees of bearing."""
+    points = [geodesic(meters=distance_m).destination((lat, lon), bearing) for bearing in np.linspace(0, 360, count, endpoint=False)]
+    return np.array([point.longitude for point in points]), np.array([point.latitude for point in points])
+
+
+@pytest.mark.parametrize('lat', [0.0, 35.0, 60.0])
+@pytest.mark.parametrize('distance_m', [500.0, 20000.0])
+def test_radius_query_matches_geodesic_within_tolerance(lat, distance_m):
+    lon = 126.0
+    ring_lon, ring_lat = ring_of_ships(lon, lat, distance_m)
+    index = SpatialIndex(np.arange(len(ring_lon)), ring_lon, ring_lat)
+
+    # Every ship is found once the radius allows for the sphere/ellipsoid difference, none before it does
+    inside, distances = index.within(lon, lat, distance_m * (1 + GEODESIC_TOLERANCE))
+    assert sorted(inside.tolist()) == list(range(len(ring_lon)))
+    assert np.all(np.abs(distances - distance_m) <= distance_m * GEODESIC_TOLERANCE)
+    assert not len(index.within(lon, lat, distance_m * (1 - GEODESIC_TOLERANCE))[0])
+
+    rows, _ = index.nearest(lon, lat, k=3, max_range_m=distance_m * (1 + GEODESIC_TOLERANCE))
+    assert len(rows) == 3
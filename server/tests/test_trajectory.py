@@ -0,0 +1,42 @@
+import numpy as np
+
+from ais_store import format_epoch
+from trajectory import bracket, interpolated_ship, interpolated_snapshot, resample_track
+
+
+def test_bracket_exact_and_between():
+    timestamps = np.array([0, 600, 1200, 4800])
+    lo, hi, weight, valid = bracket(timestamps, [600, 900, -1, 3000, 4800])
+    assert lo.tolist()[:2] == [1, 1] and hi.tolist()[:2] == [1, 2]
+    assert weight.tolist()[:2] == [0.0, 0.5]
+    assert valid.tolist() == [True, True, False, False, True]
+
+
+def test_on_tick_matches_stored_rows(dataset):
+    ts = int(dataset.timestamps()[len(dataset.timestamps()) // 2])
+    expected = {f['properties']['SHIP_ID']: f for f in dataset.features(dataset.rows_at(ts))}
+    features = interpolated_snapshot(dataset, ts)
+    assert {f['properties']['SHIP_ID'] for f in features} == set(expected)
+    for feature in features:
+        source = expected[feature['properties']['SHIP_ID']]
+        assert np.allclose(feature['geometry']['coordinates'], source['geometry']['coordinates'])
+        assert feature['properties']['SOG'] == source['properties']['SOG']
+
+
+def test_between_ticks_is_interpolated(dataset):
+    ship_id = dataset.ship_table[0]
+    rows = dataset.ship_rows(ship_id)
+    before, after = dataset.features(rows[:2])
+    ts = (int(dataset.timestamp[rows[0]]) + int(dataset.timestamp[rows[1]])) // 2
+    feature = interpolated_ship(dataset, ship_id, ts)
+    midpoint = (np.array(before['geometry']['coordinates']) + np.array(after['geometry']['coordinates'])) / 2
+    assert np.allclose(feature['geometry']['coordinates'], midpoint)
+    assert feature['properties']['RECPTN_DT'] == str(format_epoch(ts))
+
+
+def test_resample_skips_outside_track(dataset):
+    ship_id = dataset.ship_table[0]
+    rows = dataset.ship_rows(ship_id)
+    start, end = int(dataset.timestamp[rows[0]]), int(dataset.timestamp[rows[-1]])
+    features = resample_track(dataset, ship_id, start - 600, end + 600, 60)
+    assert len(features) == (end - start) // 60 + 1
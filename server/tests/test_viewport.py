@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+from ais_store import format_epoch
+from conftest import FILE_NAME
+from viewport import bbox_mask, grid_clusters, parse_bbox, viewport_snapshot
+
+
+def midpoint_bbox(dataset, rows):
+    lon, lat = dataset.lon[rows], dataset.lat[rows]
+    mid_lon, mid_lat = float(np.median(lon)), float(np.median(lat))
+    return float(lon.min()) - 0.01, float(lat.min()) - 0.01, mid_lon, mid_lat
+
+
+def ship_ids(features):
+    return sorted(f['properties']['SHIP_ID'] for f in features if not f['properties'].get('cluster'))
+
+
+def test_parse_bbox_rejects_malformed_boxes():
+    assert parse_bbox('125,34,127,36') == (125.0, 34.0, 127.0, 36.0)
+    for value in ('125,34,127', '125,36,127,34', '125,34,nan,36'):
+        with pytest.raises(ValueError):
+            parse_bbox(value)
+
+
+def test_bbox_mask_wraps_the_antimeridian():
+    lon = np.array([179.5, -179.5, 0.0, 170.0])
+    lat = np.zeros(4)
+    assert bbox_mask(lon, lat, (179.0, -1.0, -179.0, 1.0)).tolist() == [True, True, False, False]
+
+
+def test_grid_clusters_counts_cells():
+    # Three vessels share cell (0, 0), two share cell (1, 0) and one is alone in (0, 1)
+    lon = np.array([0.1, 0.2, 0.3, 1.4, 1.6, 0.5])
+    lat = np.array([0.1, 0.5, 0.9, 0.2, 0.3, 1.5])
+    clusters, alone = grid_clusters(lon, lat, 1.0)
+    assert alone.tolist() == [False, False, False, False, False, True]
+    by_count = {c['properties']['count']: c['geometry']['coordinates'] for c in clusters}
+    assert sorted(by_count) == [2, 3]
+    assert by_count[3] == pytest.approx([0.2, 0.5])
+    assert by_count[2] == pytest.approx([1.5, 0.25])
+
+
+def test_viewport_on_tick_matches_brute_force_filter(dataset, workdir):
+    ts = int(dataset.timestamps()[len(dataset.timestamps()) // 2])
+    rows = dataset.rows_at(ts)
+    bbox = midpoint_bbox(dataset, rows)
+    inside = rows[bbox_mask(dataset.lon[rows].astype(np.float64), dataset.lat[rows].astype(np.float64), bbox)]
+    assert 0 < len(inside) < len(rows)
+
+    result = viewport_snapshot(FILE_NAME, str(format_epoch(ts)), bbox)
+
+    assert ship_ids(result['features']) == sorted(dataset.ship_table[dataset.ship_code[inside]].tolist())
+
+
+def test_viewport_between_ticks_interpolates_inside_bbox(dataset, workdir):
+    timestamps = dataset.timestamps()
+    ts = (int(timestamps[1]) + int(timestamps[2])) // 2
+    bbox = midpoint_bbox(dataset, dataset.rows_at(int(timestamps[1])))
+
+    result = viewport_snapshot(FILE_NAME, str(format_epoch(ts)), bbox)
+
+    assert result['features']
+    for feature in result['features']:
+        lon, lat = feature['geometry']['coordinates']
+        assert bbox[0] <= lon <= bbox[2] and bbox[1] <= lat <= bbox[3]
+        assert feature['properties']['RECPTN_DT'] == str(format_epoch(ts))
+
+
+def test_clusters_account_for_every_vessel(dataset, workdir):
+    ts = int(dataset.timestamps()[0])
+    rows = dataset.rows_at(ts)
+    bbox = (float(dataset.lon[rows].min()) - 0.01, float(dataset.lat[rows].min()) - 0.01,
+            float(dataset.lon[rows].max()) + 0.01, float(dataset.lat[rows].max()) + 0.01)
+
+    detailed = viewport_snapshot(FILE_NAME, str(format_epoch(ts)), bbox)
+    clustered = viewport_snapshot(FILE_NAME, str(format_epoch(ts)), bbox, zoom=3)
+
+    clusters = [f for f in clustered['features'] if f['properties'].get('cluster')]
+    assert clusters
+    alone = len(clustered['features']) - len(clusters)
+    assert alone + sum(c['properties']['count'] for c in clusters) == len(detailed['features']) == len(rows)
@@ -0,0 +1,87 @@
+import numpy as np
+from shapely.ops import unary_union
+
+import vo_builder
+from encounters import ship_domain_rings
+from ship_domain import ellipse_polygons
+from vo_builder import VORegionBuilder, merge_vo_piece
+
+
+def busy_window(dataset, length=6):
+    """A ship and a window of its track with other ships around at every step."""
+    for code in range(len(dataset.ship_table)):
+        lo, hi = int(dataset.ship_offsets[code]), int(dataset.ship_offsets[code + 1])
+        if hi - lo >= length:
+            return dataset.ship_table[code], int(dataset.timestamp[lo]), int(dataset.timestamp[lo + length - 1])
+
+
+def test_prefetch_leaves_stats_and_order_alone(dataset):
+    builder = VORegionBuilder()
+    ship_id, start, end = busy_window(dataset)
+    builder.ship_piece(dataset, ship_id, start, end)
+    stats, order = builder.stats(), list(builder._entries)
+
+    code = dataset.code_of(ship_id)
+    rows = dataset.ship_rows(ship_id, start, end)
+    first_row = int(dataset.ship_offsets[code])
+    builder._prefetch_ellipses(dataset, ship_id, first_row, int(rows[0]) - first_row, int(rows[-1]) + 1 - first_row)
+
+    assert builder.stats() == stats
+    assert list(builder._entries) == order
+
+
+def test_repeated_window_is_one_hit(dataset):
+    builder = VORegionBuilder()
+    ship_id, start, end = busy_window(dataset)
+    piece = builder.ship_piece(dataset, ship_id, start, end)
+    before = builder.stats()
+    assert builder.ship_piece(dataset, ship_id, start, end) is piece
+    after = builder.stats()
+    assert (after['hits'] - before['hits'], after['misses'] - before['misses']) == (1, 0)
+
+
+def test_builder_without_store_never_reads_it(dataset, monkeypatch):
+    def no_store(dataset):
+        raise AssertionError("the domain store was read")
+
+    monkeypatch.setattr(vo_builder, 'get_domain_store', no_store)
+    ship_id, start, end = busy_window(dataset)
+    piece = VORegionBuilder(use_store=False).ship_piece(dataset, ship_id, start, end)
+    assert piece.area > 0
+
+
+def test_pieces_match_direct_union_on_disconnected_tracks(dataset):
+    # The direct path: one unary_union of every ellipse in the window, hulled once if it falls apart
+    builder = VORegionBuilder(use_store=False)
+    window = 60 * 60
+    disconnected = 0
+    for code in range(0, len(dataset.ship_table), 4):
+        ship_id = dataset.ship_table[code]
+        lo, hi = int(dataset.ship_offsets[code]), int(dataset.ship_offsets[code + 1])
+        for start in np.asarray(dataset.timestamp[lo:hi], dtype=np.int64)[::2].tolist():
+            try:
+                _, rings = ship_domain_rings(dataset, ship_id, start, start + window)
+            except ValueError:
+                continue
+            ellipses = list(ellipse_polygons(rings))
+            disconnected += unary_union(ellipses).geom_type == 'MultiPolygon'
+            direct = merge_vo_piece(ellipses)
+            piece = builder.ship_piece(dataset, ship_id, start, start + window)
+            assert direct.symmetric_difference(piece).area <= 1e-9 * direct.area
+    assert disconnected
+
+
+class EvictingBuilder(VORegionBuilder):
+    """Loses every ellipse as soon as it is cached, as when other threads fill the cache in between."""
+
+    def _put(self, key, value):
+        if key[0] != 'ellipse':
+            super()._put(key, value)
+
+
+def test_block_survives_immediate_eviction(dataset):
+    ship_id, start, end = busy_window(dataset)
+    piece = EvictingBuilder(use_store=False).ship_piece(dataset, ship_id, start, end)
+    _, rings = ship_domain_rings(dataset, ship_id, start, end)
+    direct = merge_vo_piece(list(ellipse_polygons(rings)))
+    assert direct.symmetric_difference(piece).area <= 1e-9 * direct.area
@@ -0,0 +1,241 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from ais_store import format_epoch
+from metrics import stage
+
+# Reports further apart than this are treated as a gap in the track, not interpolated across
+MAX_GAP_SECONDS = int(os.environ.get('FURIOUS_INTERP_MAX_GAP', 1800))
+TRACK_CACHE_SIZE = int(os.environ.get('FURIOUS_TRACK_CACHE_SIZE', 2048))
+MAX_TRACK_POINTS = 10000
+
+
+def bracket(timestamps, ts, max_gap=MAX_GAP_SECONDS):
+    """Reports around each of ts in the sorted timestamps: (lo, hi, weight, valid).
+
+    The state at ts[i] is the value at lo[i] moved weight[i] of the way to the
+    value at hi[i]. A time exactly on a report is valid with weight 0; one
+    before the first or after the last report, or inside a gap longer than
+    max_gap, is not.
+    """
+    ts = np.asarray(ts, dtype=np.int64)
+    if not len(timestamps):
+        empty = np.zeros(len(ts), dtype=np.int64)
+        return empty, empty, np.zeros(len(ts)), np.zeros(len(ts), dtype=bool)
+
+    last = len(timestamps) - 1
+    after = np.searchsorted(timestamps, ts, side='right')
+    lo = after - 1
+    exact = (lo >= 0) & (timestamps[np.maximum(lo, 0)] == ts)
+    hi = np.where(exact, lo, after)
+    inside = (lo >= 0) & (hi <= last)
+
+    lo, hi = np.clip(lo, 0, last), np.clip(hi, 0, last)
+    span = (timestamps[hi] - timestamps[lo]).astype(np.float64)
+    valid = exact | (inside & (span <= max_gap))
+    weight = np.divide(ts - timestamps[lo], span, out=np.zeros(len(ts)), where=span > 0)
+    return lo, hi, weight, valid
+
+
+def blend(values, lo, hi, weight):
+    return values[lo] + (values[hi] - values[lo]) * weight
+
+
+def blend_course(cog, lo, hi, weight):
+    """Course interpolated along the shorter turn, so 350 -> 10 passes through 0 and not 180."""
+    turn = (cog[hi] - cog[lo] + 180.0) % 360.0 - 180.0
+    return (cog[lo] + turn * weight) % 360.0
+
+
+class Track:
+    """One ship's reports as contiguous sorted arrays, ready for interpolation."""
+
+    def __init__(self, dataset, code):
+        lo, hi = int(dataset.ship_offsets[code]), int(dataset.ship_offsets[code + 1])
+        self.ship_id = dataset.ship_table[code]
+        self.first_row = lo
+        self.timestamp = np.ascontiguousarray(dataset.timestamp[lo:hi], dtype=np.int64)
+        self.lon = np.ascontiguousarray(dataset.lon[lo:hi], dtype=np.float64)
+        self.lat = np.ascontiguousarray(dataset.lat[lo:hi], dtype=np.float64)
+        self.sog = np.ascontiguousarray(dataset.sog[lo:hi], dtype=np.float64)
+        self.cog = np.ascontiguousarray(dataset.cog[lo:hi], dtype=np.float64)
+
+    def __len__(self):
+        return len(self.timestamp)
+
+    @property
+    def nbytes(self):
+        return sum(column.nbytes for column in (self.timestamp, self.lon, self.lat, self.sog, self.cog))
+
+    def state_at(self, ts, max_gap=MAX_GAP_SECONDS):
+        """Interpolated state at each of ts; times the track does not cover are dropped.
+
+        Returns a dict of equally long arrays: ts, lon, lat, sog, cog and row,
+        the dataset row of the report at or before each time.
+        """
+        ts = np.atleast_1d(np.asarray(ts, dtype=np.int64))
+        lo, hi, weight, valid = bracket(self.timestamp, ts, max_gap)
+        lo, hi, weight = lo[valid], hi[valid], weight[valid]
+        return {
+            'ts': ts[valid],
+            'lon': blend(self.lon, lo, hi, weight),
+            'lat': blend(self.lat, lo, hi, weight),
+            'sog': blend(self.sog, lo, hi, weight),
+            'cog': blend_course(self.cog, lo, hi, weight),
+            'row': lo + self.first_row,
+        }
+
+
+class TrackCache:
+    """LRU of the most recently queried ships' tracks, plus one composite key array per dataset."""
+
+    def __init__(self, max_entries=TRACK_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._tracks = OrderedDict()
+        self._keys = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def track(self, dataset, ship_id):
+        code = dataset.code_of(ship_id)
+        if code is None:
+            return None
+        key = (dataset.version, code)
+        with self._lock:
+            track = self._tracks.get(key)
+            if track is not None:
+                self._tracks.move_to_end(key)
+                self.hits += 1
+                return track
+            self.misses += 1
+
+        track = Track(dataset, code)
+        with self._lock:
+            self._tracks[key] = track
+            while len(self._tracks) > self.max_entries:
+                self._tracks.popitem(last=False)
+        return track
+
+    def composite_keys(self, dataset):
+        """(ship_code, timestamp) folded into one sorted int64 per row, with the fold's origin and span.
+
+        Rows are sorted by ship then time, so a single searchsorted over these
+        keys brackets a time in every ship's track at once.
+        """
+        with self._lock:
+            cached = self._keys.get(dataset.version)
+        if cached is not None:
+            return cached
+
+        timestamp = np.asarray(dataset.timestamp, dtype=np.int64)
+        origin = int(timestamp.min()) if len(timestamp) else 0
+        span = (int(timestamp.max()) - origin + 1) if len(timestamp) else 1
+        keys = np.asarray(dataset.ship_code, dtype=np.int64) * span + (timestamp - origin)
+        cached = (keys, origin, span)
+        with self._lock:
+            # Only the current version of each file is kept
+            self._keys = {version: value for version, value in self._keys.items() if version[0] != dataset.version[0]}
+            self._keys[dataset.version] = cached
+        return cached
+
+    def clear(self):
+        with self._lock:
+            self._tracks.clear()
+            self._keys.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._tracks), 'max_entries': self.max_entries, 'hits': self.hits, 'misses': self.misses,
+                'bytes': sum(track.nbytes for track in self._tracks.values()) + sum(keys.nbytes for keys, _, _ in self._keys.values()),
+            }
+
+
+track_cache = TrackCache()
+
+
+@stage('interpolate')
+def snapshot_state(dataset, ts, max_gap=MAX_GAP_SECONDS):
+    """Interpolated state of every ship whose track covers ts, as in Track.state_at (one entry per ship)."""
+    keys, origin, span = track_cache.composite_keys(dataset)
+    num_ships = len(dataset.ship_table)
+    empty = {name: np.empty(0) for name in ('lon', 'lat', 'sog', 'cog')}
+    if not len(keys) or not origin <= ts < origin + span:
+        return {**empty, 'row': np.empty(0, dtype=np.int64), 'code': np.empty(0, dtype=np.int64)}
+
+    codes = np.arange(num_ships, dtype=np.int64)
+    lo, hi, weight, valid = bracket(keys, codes * span + (ts - origin), max_gap)
+    # A bracket is only valid when both reports belong to the ship it was searched for
+    first, last = dataset.ship_offsets[:-1], dataset.ship_offsets[1:]
+    valid &= (lo >= first) & (lo < last) & (hi < last)
+    lo, hi, weight, codes = lo[valid], hi[valid], weight[valid], codes[valid]
+
+    return {
+        'lon': blend(dataset.lon, lo, hi, weight),
+        'lat': blend(dataset.lat, lo, hi, weight),
+        'sog': blend(dataset.sog, lo, hi, weight),
+        'cog': blend_course(dataset.cog, lo, hi, weight),
+        'row': lo,
+        'code': codes,
+    }
+
+
+def state_features(dataset, state, timestamps):
+    """Features for interpolated states; properties other than the state come from the report before."""
+    features = []
+    for row, ts, lon, lat, sog, cog in zip(state['row'].tolist(), timestamps, state['lon'].tolist(),
+                                           state['lat'].tolist(), state['sog'].tolist(), state['cog'].tolist()):
+        feature = dataset.feature(row)
+        feature['properties'].update(RECPTN_DT=str(format_epoch(ts)), SOG=round(sog, 2), COG=round(cog, 1))
+        feature['geometry']['coordinates'] = [lon, lat]
+        features.append(feature)
+    return features
+
+
+def interpolated_snapshot(dataset, ts, max_gap=MAX_GAP_SECONDS):
+    """Features of every ship at ts, interpolated between the reports around it."""
+    state = snapshot_state(dataset, ts, max_gap)
+    return state_features(dataset, state, [ts] * len(state['row']))
+
+
+def interpolated_dataset(dataset, ts, max_gap=MAX_GAP_SECONDS):
+    """One-tick dataset of every ship at ts, so row-based snapshot code runs unchanged between ticks."""
+    state = snapshot_state(dataset, ts, max_gap)
+    tick = dataset.take(state['row'], version=('interpolated', dataset.version, int(ts)))
+    tick.timestamp = np.full(len(tick), ts, dtype=np.int64)
+    tick.lon, tick.lat = state['lon'], state['lat']
+    # Rounded as in state_features, to the precision of the source data
+    tick.sog, tick.cog = np.round(state['sog'], 2), np.round(state['cog'], 1)
+    return tick
+
+
+def interpolated_ship(dataset, ship_id, ts, max_gap=MAX_GAP_SECONDS):
+    """Feature of one ship at ts, or None when its track does not cover ts."""
+    track = track_cache.track(dataset, ship_id)
+    if track is None:
+        return None
+    state = track.state_at(ts, max_gap)
+    features = state_features(dataset, state, state['ts'].tolist())
+    return features[0] if features else None
+
+
+@stage('interpolate')
+def resample_track(dataset, ship_id, start, end, step_seconds, max_gap=MAX_GAP_SECONDS):
+    """Features of one ship every step_seconds over [start, end], skipping times its track does not cover."""
+    if step_seconds <= 0:
+        raise ValueError("Step must be a positive number of seconds")
+    if end < start:
+        raise ValueError("End datetime must not be before start datetime")
+    num_points = (end - start) // step_seconds + 1
+    if num_points > MAX_TRACK_POINTS:
+        raise ValueError(f"Resampling covers {num_points} points, more than the {MAX_TRACK_POINTS} allowed")
+
+    track = track_cache.track(dataset, ship_id)
+    if track is None:
+        raise ValueError(f"Ship ID {ship_id} not found")
+    state = track.state_at(np.arange(start, end + 1, step_seconds, dtype=np.int64), max_gap)
+    return state_features(dataset, state, state['ts'].tolist())
@@ -0,0 +1,115 @@
+import os
+
+import numpy as np
+import shapely
+from shapely.geometry import mapping, shape
+
+from ais_store import get_dataset, to_epoch
+from metrics import stage
+from spatial_index import snapshot_index
+from trajectory import MAX_GAP_SECONDS, snapshot_state, state_features
+
+# At this web-map zoom level and below, vessels are aggregated into grid clusters
+CLUSTER_MAX_ZOOM = int(os.environ.get('FURIOUS_CLUSTER_MAX_ZOOM', 9))
+# Cluster cell side and geometry simplification tolerance, in screen pixels
+CLUSTER_CELL_PX = 64
+SIMPLIFY_PX = 1.0
+TILE_PX = 256
+SIMPLIFIED_TYPES = ('LineString', 'MultiLineString', 'Polygon', 'MultiPolygon')
+
+
+def parse_bbox(value):
+    """(min_lon, min_lat, max_lon, max_lat) from 'minLon,minLat,maxLon,maxLat'."""
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(part) for part in value.split(','))
+    except ValueError:
+        raise ValueError(f"Invalid bbox {value!r}: expected minLon,minLat,maxLon,maxLat")
+    if min_lat > max_lat or not all(np.isfinite((min_lon, min_lat, max_lon, max_lat))):
+        raise ValueError(f"Invalid bbox {value!r}")
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def degrees_per_pixel(zoom):
+    return 360.0 / (TILE_PX * 2 ** zoom)
+
+
+def simplify_tolerance(zoom):
+    return SIMPLIFY_PX * degrees_per_pixel(zoom)
+
+
+def bbox_mask(lon, lat, bbox):
+    min_lon, min_lat, max_lon, max_lat = bbox
+    in_lon = (lon >= min_lon) & (lon <= max_lon) if min_lon <= max_lon else (lon >= min_lon) | (lon <= max_lon)
+    return in_lon & (lat >= min_lat) & (lat <= max_lat)
+
+
+def grid_clusters(lon, lat, cell_deg):
+    """Group positions by grid cell: (cluster features of cells with 2+ vessels, mask of the vessels left alone).
+
+    The grid is anchored at (0, 0), so a vessel stays in the same cluster
+    while the map pans. A cluster sits at the mean position of its vessels.
+    """
+    cells = np.column_stack((np.floor(lon / cell_deg), np.floor(lat / cell_deg)))
+    _, cell_of, counts = np.unique(cells, axis=0, return_inverse=True, return_counts=True)
+    cell_of = cell_of.reshape(-1)
+    mean_lon = np.bincount(cell_of, weights=lon) / counts
+    mean_lat = np.bincount(cell_of, weights=lat) / counts
+
+    clustered = np.flatnonzero(counts > 1)
+    clusters = [
+        {
+            "type": "Feature",
+            "properties": {"cluster": True, "count": count},
+            "geometry": {"type": "Point", "coordinates": [cluster_lon, cluster_lat]},
+        }
+        for count, cluster_lon, cluster_lat in zip(counts[clustered].tolist(), mean_lon[clustered].tolist(), mean_lat[clustered].tolist())
+    ]
+    return clusters, counts[cell_of] == 1
+
+
+@stage('viewport')
+def viewport_snapshot(filename, recptn_dt_str, bbox, zoom=None):
+    """Vessels inside bbox at the datetime; at zoom <= CLUSTER_MAX_ZOOM, crowded grid cells become clusters."""
+    ts = to_epoch(recptn_dt_str)
+    # Partition tiles are only filtered for boxes that do not wrap the antimeridian
+    tile_bbox = bbox if bbox[0] <= bbox[2] else None
+    dataset = get_dataset(filename, start=ts, bbox=tile_bbox)
+
+    if len(dataset.rows_at(ts)):
+        rows = snapshot_index(dataset, ts).in_bbox(*bbox)
+        lon, lat = np.asarray(dataset.lon[rows], dtype=np.float64), np.asarray(dataset.lat[rows], dtype=np.float64)
+
+        def vessels(selected):
+            return dataset.features(rows[selected])
+    else:
+        # Between ticks; whole days are loaded since a vessel's previous report may lie in another tile
+        dataset = get_dataset(filename, start=ts - MAX_GAP_SECONDS, end=ts + MAX_GAP_SECONDS)
+        state = snapshot_state(dataset, ts)
+        inside = bbox_mask(state['lon'], state['lat'], bbox)
+        state = {key: values[inside] for key, values in state.items()}
+        lon, lat = state['lon'], state['lat']
+
+        def vessels(selected):
+            return state_features(dataset, {key: values[selected] for key, values in state.items()}, [ts] * int(np.count_nonzero(selected)))
+
+    clusters = []
+    alone = np.ones(len(lon), dtype=bool)
+    if zoom is not None and zoom <= CLUSTER_MAX_ZOOM and len(lon):
+        clusters, alone = grid_clusters(lon, lat, CLUSTER_CELL_PX * degrees_per_pixel(zoom))
+    return {**dataset.collection, "features": vessels(alone) + clusters}
+
+
+def simplify_geojson(obj, zoom):
+    """Copy of a GeoJSON object (or a dict holding some) with lines and polygons simplified to about a pixel at zoom."""
+    tolerance = simplify_tolerance(zoom)
+
+    def simplify(value):
+        if isinstance(value, dict):
+            if value.get('type') in SIMPLIFIED_TYPES and 'coordinates' in value:
+                return mapping(shapely.simplify(shape(value), tolerance, preserve_topology=True))
+            return {key: simplify(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [simplify(item) for item in value]
+        return value
+
+    return simplify(obj)
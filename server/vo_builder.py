@@ -0,0 +1,176 @@
+import logging
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from shapely.ops import unary_union
+
+from ais_store import from_epoch
+from domain_store import get_domain_store
+from encounters import ship_domain_rings
+from ship_domain import ellipse_polygons
+from metrics import stage
+
+log = logging.getLogger(__name__)
+
+MAX_ENTRIES = 8192
+
+
+@stage('union')
+def merge_vo_piece(ellipses):
+    """VO piece of one ship's window from the raw union of its ellipses (or of block unions of them).
+
+    The convex hull and buffer must run once on the whole window's union; a
+    hull of each part first would cover a different area.
+    """
+    merged_shape = unary_union(ellipses)
+
+    if merged_shape.geom_type == 'MultiPolygon':
+        merged_shape = merged_shape.convex_hull
+        log.debug("Convex Hull: Make single ship VO region")
+
+    return merged_shape.buffer(0.005).buffer(-0.001)
+
+
+def dyadic_blocks(lo, hi):
+    """Split the track positions [lo, hi) into aligned (level, index) blocks of 2**level steps."""
+    blocks = []
+    while lo < hi:
+        level = (lo & -lo).bit_length() - 1 if lo else (hi - lo).bit_length() - 1
+        while lo + (1 << level) > hi:
+            level -= 1
+        blocks.append((level, lo >> level))
+        lo += 1 << level
+    return blocks
+
+
+class VORegionBuilder:
+    """Bounded cache of per-step ellipses, segment-tree unions and per-window VO pieces.
+
+    A ship's track is treated as a segment tree: the block (level, index)
+    holds the union of the ellipses at track positions
+    [index * 2**level, (index + 1) * 2**level). Any window is the union of the
+    O(log n) aligned blocks covering it. Cached ellipses and block unions are
+    never buffered; the convex hull and buffer run once on each ship's merged
+    window shape.
+
+    With use_store=False the precomputed domain store is never read, so
+    everything is built from the dataset itself (as precompute.py must).
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES, use_store=True):
+        self.max_entries = max_entries
+        self.use_store = use_store
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def _put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'max_entries': self.max_entries, 'hits': self.hits, 'misses': self.misses}
+
+    def _store(self, dataset):
+        return get_domain_store(dataset) if self.use_store else None
+
+    def _prefetch_ellipses(self, dataset, ship_id, first_row, lo, hi):
+        with self._lock:
+            missing = [pos for pos in range(lo, hi) if ('ellipse', dataset.version, first_row + pos) not in self._entries]
+        if missing:
+            self._compute_ellipses(dataset, ship_id, first_row + missing[0], first_row + missing[-1])
+
+    def _compute_ellipses(self, dataset, ship_id, first, last):
+        """Compute and cache the ellipses of rows [first, last]; returns them by row."""
+        with stage('ellipse'):
+            rows = np.arange(first, last + 1)
+            store = self._store(dataset)
+            precomputed = store.ellipses(rows) if store is not None else None
+            if precomputed is not None:
+                rings = precomputed[0]
+            else:
+                encounters, rings = ship_domain_rings(dataset, ship_id, int(dataset.timestamp[first]), int(dataset.timestamp[last]))
+                rows = encounters['own_rows']
+            ellipses = dict(zip(rows.tolist(), ellipse_polygons(rings)))
+            for row, polygon in ellipses.items():
+                self._put(('ellipse', dataset.version, row), polygon)
+        return ellipses
+
+    def _block(self, dataset, ship_id, first_row, track_length, level, index):
+        if level == 0:
+            row = first_row + index
+            ellipse = self._get(('ellipse', dataset.version, row))
+            if ellipse is None:
+                # Use what was just computed: the cache may already have evicted it again
+                ellipse = self._compute_ellipses(dataset, ship_id, row, row).get(row)
+            return ellipse
+
+        key = ('block', dataset.version, first_row, level, index)
+        union = self._get(key)
+        if union is None:
+            children = [
+                self._block(dataset, ship_id, first_row, track_length, level - 1, child)
+                for child in (2 * index, 2 * index + 1)
+                if child << (level - 1) < track_length
+            ]
+            # Plain unions only: a disconnected block stays a MultiPolygon until the whole window is merged
+            union = unary_union(children)
+            self._put(key, union)
+        return union
+
+    def ship_piece(self, dataset, ship_id, start, end):
+        """Buffered VO piece of one ship over the window [start, end] (epoch seconds)."""
+        rows = dataset.ship_rows(ship_id, start, end)
+        if not len(rows):
+            raise ValueError(f"No data found for Ship ID {ship_id} within the time window {from_epoch(start)} to {from_epoch(end)}.")
+
+        key = ('piece', dataset.version, int(rows[0]), int(rows[-1]))
+        piece = self._get(key)
+        if piece is not None:
+            return piece
+
+        # Windows that start on a reported tick may have been precomputed offline
+        store = self._store(dataset)
+        if store is not None and start == dataset.timestamp[rows[0]] and (end - start) % 60 == 0:
+            piece = store.vo_piece(int(rows[0]), (end - start) // 60)
+            if piece is not None:
+                self._put(key, piece)
+                return piece
+
+        code = dataset.code_of(ship_id)
+        first_row = int(dataset.ship_offsets[code])
+        track_length = int(dataset.ship_offsets[code + 1]) - first_row
+        lo, hi = int(rows[0]) - first_row, int(rows[-1]) + 1 - first_row
+
+        self._prefetch_ellipses(dataset, ship_id, first_row, lo, hi)
+        blocks = [
+            self._block(dataset, ship_id, first_row, track_length, level, index)
+            for level, index in dyadic_blocks(lo, hi)
+        ]
+
+        piece = merge_vo_piece(blocks)
+        self._put(key, piece)
+        return piece
+
+
+vo_builder = VORegionBuilder()
@@ -0,0 +1,7 @@
+# Production entry point: gunicorn -c gunicorn.conf.py
+# With preload_app the master imports this module once, so the datasets below are
+# loaded before the workers fork and shared with them (copy-on-write, or through
+# the page cache for memory-mapped .aisb files).
+from server import app, file_mapping, preload_datasets
+
+preload_datasets(file_mapping.values())